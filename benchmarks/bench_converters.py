@@ -0,0 +1,55 @@
+"""Times the converters the pipelines run on every input file, at several file sizes.
+
+Run from the repository root:
+
+    python -m benchmarks.run --suite converters
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Callable, Dict, Sequence
+
+from pipelines.awaken_sonic.sonic_converter import from_csv_to_csv
+from utils.converters import from_netcdf_to_csv
+
+from .synthetic import write_met_netcdf, write_sonic_csv
+
+# rows per file: one hour, six hours and one day of 1 Hz met data, and an hour, a
+# day and a month of 1 minute sonic data
+NETCDF_SIZES = (3_600, 21_600, 86_400)
+SONIC_SIZES = (60, 1_440, 43_200)
+
+MET_VARIABLES = ["wind_speed", "wind_direction"]
+SONIC_VARIABLES = ["time", "wind speed", "wind direction"]
+
+
+def cases(
+    workdir: Path,
+    netcdf_sizes: Sequence[int] = NETCDF_SIZES,
+    sonic_sizes: Sequence[int] = SONIC_SIZES,
+) -> Dict[str, Callable[[], object]]:
+    """Writes the synthetic inputs under ``workdir`` and returns the timed calls."""
+    inputs = Path(workdir) / "inputs"
+    outputs = Path(workdir) / "outputs"
+    inputs.mkdir(parents=True, exist_ok=True)
+    outputs.mkdir(parents=True, exist_ok=True)
+
+    def netcdf(path):
+        return lambda: from_netcdf_to_csv(
+            path, MET_VARIABLES, location="sa1", directory=outputs
+        )
+
+    def sonic(path):
+        return lambda: from_csv_to_csv(
+            path, SONIC_VARIABLES, location="sa1", directory=outputs
+        )
+
+    timed = {}
+    for rows in netcdf_sizes:
+        path = write_met_netcdf(inputs / f"sa1.met_z01.b0.{rows}.nc", rows)
+        timed[f"from_netcdf_to_csv[{rows}]"] = netcdf(path)
+    for rows in sonic_sizes:
+        path = write_sonic_csv(inputs / f"sa1.sonic_z01.b0.{rows}.csv", rows)
+        timed[f"sonic from_csv_to_csv[{rows}]"] = sonic(path)
+    return timed
@@ -0,0 +1,41 @@
+"""Times decoding of Timestream query pages into DataFrames.
+
+Run from the repository root:
+
+    python -m benchmarks.run --suite query
+"""
+
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+from typing import Callable, Dict, Sequence
+
+from .synthetic import timestream_pages
+
+# timestream_query imports its sibling modules the way the scripts do
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "scripts"))
+
+from timestream_query import ColumnarDecoder, decode_page  # noqa: E402
+
+ROWS = (10_000, 100_000)
+PAGE_SIZE = 1_000
+
+
+def cases(rows: Sequence[int] = ROWS) -> Dict[str, Callable[[], object]]:
+    timed = {}
+    for count in rows:
+        pages = timestream_pages(count, PAGE_SIZE)
+
+        def columnar(pages=pages):
+            decoder = ColumnarDecoder()
+            for page in pages:
+                decoder.add_page(page)
+            return decoder.to_frame()
+
+        def per_page(pages=pages):
+            return [decode_page(page) for page in pages]
+
+        timed[f"ColumnarDecoder[{count} rows]"] = columnar
+        timed[f"decode_page[{count} rows, {PAGE_SIZE}/page]"] = per_page
+    return timed
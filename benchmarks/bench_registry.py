@@ -0,0 +1,69 @@
+"""Times pipeline dispatch lookups: `PipelineRegistry._match_input_key` against many
+triggers and keys, and `Template.substitute` on storage roots.
+
+Run from the repository root:
+
+    python -m benchmarks.run --suite registry
+"""
+
+from __future__ import annotations
+
+import re
+from pathlib import Path
+from typing import Callable, Dict, Sequence
+
+from utils.registry import PipelineRegistry
+from utils.timestream import Template
+
+from .synthetic import input_keys, template_mapping, trigger_patterns
+
+# (pipeline configs, triggers per config)
+REGISTRY_SIZES = ((2, 1), (50, 2), (200, 4))
+KEYS = 5_000
+SUBSTITUTIONS = 10_000
+
+TEMPLATES = {
+    "plain": "timestream/jobs/{date}.{time}/awaken/{dataset}/",
+    "optional": "timestream/jobs/{date}.{time}/awaken/{dataset}[/{location}][.{missing}]",
+}
+
+
+def _registry(configs: int, triggers_per_config: int) -> PipelineRegistry:
+    # skip __init__ so the lookup runs against synthetic triggers rather than the
+    # configs under pipelines/
+    registry = PipelineRegistry.__new__(PipelineRegistry)
+    registry._modules = []
+    patterns = iter(trigger_patterns(configs * triggers_per_config))
+    registry._cache = {
+        Path(f"pipelines/bench_{i:03d}/pipeline.yaml"): [
+            re.compile(next(patterns)) for _ in range(triggers_per_config)
+        ]
+        for i in range(configs)
+    }
+    return registry
+
+
+def cases(
+    registry_sizes: Sequence[tuple] = REGISTRY_SIZES,
+    keys: int = KEYS,
+    substitutions: int = SUBSTITUTIONS,
+) -> Dict[str, Callable[[], object]]:
+    timed = {}
+    input_key_list = input_keys(keys)
+    for configs, per_config in registry_sizes:
+        registry = _registry(configs, per_config)
+
+        def match(registry=registry):
+            return [registry._match_input_key(key) for key in input_key_list]
+
+        timed[f"_match_input_key[{configs}x{per_config} triggers, {keys} keys]"] = match
+
+    mapping = template_mapping()
+    for name, template_str in TEMPLATES.items():
+        template = Template(template_str)
+
+        def substitute(template=template):
+            return [template.substitute(mapping) for _ in range(substitutions)]
+
+        timed[f"Template.substitute[{name}, {substitutions}x]"] = substitute
+    return timed
@@ -0,0 +1,110 @@
+"""Compares the per-row time conversions the scripts used to do with the vectorized
+versions in `utils.timestamps`.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_timestamps [--rows N]
+"""
+
+from __future__ import annotations
+
+import argparse
+import timeit
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from utils.timestamps import (
+    components_to_epoch,
+    datetime64_to_epoch_ms,
+    iso_to_epoch,
+    local_to_utc,
+    to_epoch,
+)
+
+
+def _best_of(func, repeat=3):
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def cases(rows: int):
+    times = pd.Series(pd.date_range("2020-01-01", periods=rows, freq="5min"))
+    iso = times.dt.tz_localize("UTC").astype(str)
+    components = pd.DataFrame(
+        {
+            "year": times.dt.year,
+            "month": times.dt.month,
+            "day": times.dt.day,
+            "hour": times.dt.hour,
+            "minute": times.dt.minute,
+        }
+    )
+    values = times.to_numpy()
+    # the range only passes through each fall-back hour once, so read it as standard
+    # time rather than inferring
+    standard = np.zeros(rows, dtype=bool)
+
+    def local_apply():
+        local = times.dt.tz_localize(
+            "US/Pacific", ambiguous=standard, nonexistent="shift_forward"
+        )
+        utc = local.dt.tz_convert("UTC")
+        return utc.apply(lambda x: x.timestamp())
+
+    def local_vectorized():
+        # the range also passes through each spring-forward hour
+        utc = local_to_utc(
+            times, "US/Pacific", ambiguous=standard, nonexistent="shift_forward"
+        )
+        return to_epoch(utc)
+
+    def iso_apply():
+        return iso.apply(lambda x: int(datetime.fromisoformat(x).timestamp()))
+
+    def iso_vectorized():
+        return iso_to_epoch(iso)
+
+    def components_before():
+        time = pd.to_datetime(components[["year", "month", "day", "hour", "minute"]])
+        return (time - pd.Timestamp("1970-01-01")) // pd.Timedelta("1ms")
+
+    def components_vectorized():
+        return components_to_epoch(components)
+
+    def datetime64_before():
+        return (
+            values.astype("datetime64[ms]") - np.datetime64("1970-01-01T00:00:00")
+        ).astype(np.int64)
+
+    def datetime64_vectorized():
+        return datetime64_to_epoch_ms(values)
+
+    return {
+        "local_to_utc (ba_to_utc.py)": (local_apply, local_vectorized),
+        "iso_to_epoch (update_date_to_epoch.py)": (iso_apply, iso_vectorized),
+        "components_to_epoch (sonic converter)": (
+            components_before,
+            components_vectorized,
+        ),
+        "datetime64_to_epoch_ms (netcdf converter)": (
+            datetime64_before,
+            datetime64_vectorized,
+        ),
+    }
+
+
+def main(rows: int = 100_000):
+    print(f"{'conversion':<44} {'before(s)':>10} {'after(s)':>10} {'speedup':>8}")
+    results = {}
+    for name, (before, after) in cases(rows).items():
+        old, new = _best_of(before), _best_of(after)
+        results[name] = {"before_s": old, "after_s": new}
+        print(f"{name:<44} {old:>10.4f} {new:>10.4f} {old / new:>7.1f}x")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    main(parser.parse_args().rows)
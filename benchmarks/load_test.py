@@ -0,0 +1,288 @@
+"""End-to-end load test of the ingest on synthetic AWAKEN data, without touching AWS.
+
+For each combination of the requested file counts and sizes it:
+
+1. writes ``sa1.met_z01.b0.*.nc`` NetCDF files and ``sa1.sonic_z01.b0.*.csv`` sonic
+   files (with their two-line header) under ``--workdir``;
+2. runs `runner.py` over them against an in-process S3 (moto);
+3. runs the `create_batch.py --plan` path over the staged job folders;
+
+and reports files/s, rows/s, bytes/s and the peak memory of the whole run.
+
+Run from the repository root (or with `make load-test`):
+
+    python -m benchmarks.load_test --met-files 10 100 --met-rows 3600 86400
+
+Needs moto (requirements-dev.txt).
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import logging
+import os
+import runpy
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+import boto3
+import pandas as pd
+from moto import mock_aws
+
+import runner
+from utils.memory import peak_memory
+from utils.timestream import TimestreamPipeline
+
+from .synthetic import START, write_met_netcdf, write_sonic_csv
+
+REPOSITORY = Path(__file__).resolve().parents[1]
+SCRIPTS = REPOSITORY / "scripts"
+BUCKET = "ingest-load-test"
+REGION = "us-west-2"
+MET_DATASET = "sa1.met_z01.b0"
+SONIC_DATASET = "sa1.sonic_z01.b0"
+
+
+def generate_inputs(
+    root: Path, met_files: int, met_rows: int, sonic_files: int, sonic_rows: int
+) -> List[Path]:
+    """Writes the synthetic inputs, one hour apart, and returns their paths."""
+    files = []
+    for dataset, count, rows, write, extension in (
+        (MET_DATASET, met_files, met_rows, write_met_netcdf, "nc"),
+        (SONIC_DATASET, sonic_files, sonic_rows, write_sonic_csv, "csv"),
+    ):
+        folder = Path(root) / "awaken" / dataset
+        folder.mkdir(parents=True, exist_ok=True)
+        for start in pd.date_range(START, periods=count, freq="1h"):
+            name = f"{dataset}.{start:%Y%m%d.%H%M%S}.{extension}"
+            files.append(write(folder / name, rows, start=start.isoformat()))
+    # TimestreamPipeline.run takes the dataset from the fifth part of the path
+    for path in files[:1]:
+        parts = path.resolve().parts
+        if len(parts) < 6 or parts[4] != path.parent.name:
+            raise ValueError(
+                f"Inputs under {root} are not at the depth the pipelines expect"
+                " (/<a>/<b>/awaken/<dataset>/<file>); pass a --workdir one level"
+                " below the filesystem root, e.g. /tmp"
+            )
+    return files
+
+
+def run_ingest(files: Sequence[Path], metrics_file: Path, verbose: bool = False):
+    """Runs runner.py's entry point over ``files``."""
+    runner.run_pipeline(
+        filepaths=list(files),
+        clump=False,
+        multidispatch=False,
+        metrics_file=metrics_file,
+        profile_memory=None,
+        verbose=verbose,
+    )
+
+
+class _PlanCapture(logging.Handler):
+    def __init__(self) -> None:
+        super().__init__(logging.INFO)
+        self.plan: Optional[Dict[str, Any]] = None
+        self.errors: List[str] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        message = record.getMessage()
+        if message.startswith("Batch load plan: "):
+            self.plan = json.loads(message[len("Batch load plan: ") :])
+        elif record.levelno >= logging.ERROR:
+            self.errors.append(message)
+
+
+def run_plan(date_folders: Sequence[str]) -> Dict[str, Any]:
+    """Runs `create_batch.py --plan` over the job folders and returns its plan."""
+    argv = [
+        str(SCRIPTS / "create_batch.py"),
+        BUCKET,
+        "test",
+        "--start",
+        min(date_folders),
+        "--end",
+        max(date_folders),
+        "--plan",
+    ]
+    capture = _PlanCapture()
+    logging.getLogger().addHandler(capture)
+    saved_argv, saved_path = sys.argv, list(sys.path)
+    sys.argv = argv
+    sys.path.insert(0, str(SCRIPTS))
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            runpy.run_path(argv[0], run_name="__main__")
+    except SystemExit as e:
+        if e.code not in (0, None):
+            raise
+    finally:
+        sys.argv, sys.path[:] = saved_argv, saved_path
+        logging.getLogger().removeHandler(capture)
+    if capture.plan is None:
+        raise RuntimeError(f"create_batch.py --plan failed: {capture.errors}")
+    return capture.plan
+
+
+def _date_folders(s3) -> List[str]:
+    response = s3.list_objects_v2(
+        Bucket=BUCKET, Prefix="timestream/manifests/", Delimiter="/"
+    )
+    return [
+        prefix["Prefix"].split("/")[2] for prefix in response.get("CommonPrefixes", [])
+    ]
+
+
+def run_case(
+    workdir: Path,
+    met_files: int,
+    met_rows: int,
+    sonic_files: int,
+    sonic_rows: int,
+    memory: str = "rss",
+    verbose: bool = False,
+) -> Dict[str, Any]:
+    """Generates one set of inputs, ingests and plans it, and returns the measurements."""
+    with tempfile.TemporaryDirectory(dir=workdir) as root:
+        files = generate_inputs(
+            Path(root), met_files, met_rows, sonic_files, sonic_rows
+        )
+        input_bytes = sum(path.stat().st_size for path in files)
+        metrics_file = Path(root) / "metrics.json"
+
+        with mock_aws():
+            s3 = boto3.client("s3", region_name=REGION)
+            s3.create_bucket(
+                Bucket=BUCKET, CreateBucketConfiguration={"LocationConstraint": REGION}
+            )
+            # sessions are cached for an hour; don't reuse one from a previous case
+            TimestreamPipeline._get_session.cache_clear()
+
+            peak = peak_memory(memory)
+            with peak:
+                start = time.perf_counter()
+                run_ingest(files, metrics_file, verbose)
+                ingest_s = time.perf_counter() - start
+
+                start = time.perf_counter()
+                plan = run_plan(_date_folders(s3))
+                plan_s = time.perf_counter() - start
+
+        with open(metrics_file, encoding="utf-8") as f:
+            totals = json.load(f)["totals"]
+
+    return {
+        "met_files": met_files,
+        "met_rows": met_rows,
+        "sonic_files": sonic_files,
+        "sonic_rows": sonic_rows,
+        "files": len(files),
+        "input_bytes": input_bytes,
+        "staged_rows": totals["rows"],
+        "staged_bytes": totals["bytes"],
+        "failed_stages": totals["failed"],
+        "ingest_s": round(ingest_s, 3),
+        "plan_s": round(plan_s, 3),
+        "files_per_s": round(len(files) / ingest_s, 1),
+        "rows_per_s": round((totals["rows"] or 0) / ingest_s, 1),
+        "bytes_per_s": round(input_bytes / ingest_s, 1),
+        "plan_tasks": plan["totals"]["tasks"],
+        "plan_records": plan["totals"]["records"],
+        "memory_method": memory,
+        "peak_memory_bytes": peak.peak,
+    }
+
+
+def report(results: Sequence[Dict[str, Any]]) -> None:
+    print(
+        f"{'met':>11} {'sonic':>11} {'files':>6} {'ingest(s)':>9} {'plan(s)':>8} "
+        f"{'files/s':>8} {'rows/s':>10} {'MB/s':>7} {'tasks':>6} {'peak(MiB)':>9}"
+    )
+    for result in results:
+        met = f"{result['met_files']}x{result['met_rows']}"
+        sonic = f"{result['sonic_files']}x{result['sonic_rows']}"
+        print(
+            f"{met:>11} {sonic:>11} {result['files']:>6} {result['ingest_s']:>9.2f} "
+            f"{result['plan_s']:>8.2f} {result['files_per_s']:>8.1f} "
+            f"{result['rows_per_s']:>10.0f} {result['bytes_per_s'] / 1e6:>7.2f} "
+            f"{result['plan_tasks']:>6} {(result['peak_memory_bytes'] or 0) / 2**20:>9.1f}"
+        )
+
+
+def main(
+    met_files: Sequence[int] = (10,),
+    met_rows: Sequence[int] = (3_600,),
+    sonic_files: Sequence[int] = (10,),
+    sonic_rows: Sequence[int] = (1_440,),
+    workdir: Path = Path(tempfile.gettempdir()),
+    memory: str = "rss",
+    output: Optional[Path] = None,
+    verbose: bool = False,
+) -> List[Dict[str, Any]]:
+    # stage and plan records go to the metrics file; only show warnings unless asked
+    handler = logging.StreamHandler()
+    handler.setLevel(logging.DEBUG if verbose else logging.WARNING)
+    logging.getLogger().addHandler(handler)
+    logging.getLogger().setLevel(logging.DEBUG if verbose else logging.INFO)
+    # fake credentials so boto3 never looks for real ones
+    for name in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY", "AWS_SESSION_TOKEN"):
+        os.environ[name] = "load-test"
+    os.environ["AWS_DEFAULT_REGION"] = REGION
+    os.environ["TSDAT_S3_BUCKET_NAME"] = BUCKET
+
+    results = []
+    for case in itertools.product(met_files, met_rows, sonic_files, sonic_rows):
+        results.append(run_case(Path(workdir), *case, memory=memory, verbose=verbose))
+        print(f"  finished {case}: {results[-1]['ingest_s']:.2f}s", file=sys.stderr)
+    report(results)
+    if output is not None:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--met-files", type=int, nargs="+", default=[10])
+    parser.add_argument(
+        "--met-rows", type=int, nargs="+", default=[3_600], help="1 Hz rows per file"
+    )
+    parser.add_argument("--sonic-files", type=int, nargs="+", default=[10])
+    parser.add_argument(
+        "--sonic-rows", type=int, nargs="+", default=[1_440], help="1 min rows per file"
+    )
+    parser.add_argument(
+        "--workdir",
+        type=Path,
+        default=Path(tempfile.gettempdir()),
+        help="Where to write the inputs; must be one level below the root",
+    )
+    parser.add_argument(
+        "--memory",
+        choices=["rss", "tracemalloc"],
+        default="rss",
+        help="How to measure peak memory (see utils/memory.py)",
+    )
+    parser.add_argument("--output", type=Path, help="Also write the results as JSON")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+    main(
+        args.met_files,
+        args.met_rows,
+        args.sonic_files,
+        args.sonic_rows,
+        args.workdir,
+        args.memory,
+        args.output,
+        args.verbose,
+    )
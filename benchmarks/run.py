@@ -0,0 +1,171 @@
+"""Runs the benchmark suites and compares the timings with a stored baseline.
+
+Run from the repository root (or with `make bench`):
+
+    python -m benchmarks.run [--suite NAME ...] [--save-baseline]
+
+Each case is timed as the best of ``--repeat`` runs. Cases that are slower than the
+baseline by more than ``--threshold`` are reported as regressions, and with
+``--strict`` make the run exit non-zero. Baselines are machine-specific: save one on
+the machine you compare on before making a change.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import timeit
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, Optional, Sequence
+
+from . import bench_converters, bench_query, bench_registry, bench_timestamps
+
+BASELINE = Path(__file__).with_name("baseline.json")
+DEFAULT_REPEAT = 5
+DEFAULT_THRESHOLD = 0.2
+
+
+def collect(suites: Sequence[str], workdir: Path) -> Dict[str, Callable[[], object]]:
+    """Returns the timed calls of ``suites``, keyed "suite/case"."""
+    builders = {
+        "converters": lambda: bench_converters.cases(workdir),
+        "registry": bench_registry.cases,
+        "query": bench_query.cases,
+        # only the current implementations; bench_timestamps compares them with the
+        # per-row versions they replaced
+        "timestamps": lambda: {
+            name: after for name, (_, after) in bench_timestamps.cases(100_000).items()
+        },
+    }
+    timed = {}
+    for suite in suites:
+        for name, func in builders[suite]().items():
+            timed[f"{suite}/{name}"] = func
+    return timed
+
+
+def time_cases(
+    timed: Dict[str, Callable[[], object]], repeat: int = DEFAULT_REPEAT
+) -> Dict[str, float]:
+    """Returns the best wall time in seconds of each call."""
+    results = {}
+    for name, func in timed.items():
+        func()  # warm up imports and caches
+        results[name] = min(timeit.repeat(func, number=1, repeat=repeat))
+        print(f"  {name:<64} {results[name]:>9.4f}s", file=sys.stderr)
+    return results
+
+
+def compare(
+    results: Dict[str, float],
+    baseline: Optional[Dict[str, float]],
+    threshold: float = DEFAULT_THRESHOLD,
+):
+    """Prints the results next to the baseline and returns the regressed case names."""
+    baseline = baseline or {}
+    regressions = []
+    print(f"{'case':<64} {'baseline(s)':>11} {'now(s)':>9} {'change':>8}")
+    for name, seconds in results.items():
+        before = baseline.get(name)
+        if before is None:
+            print(f"{name:<64} {'-':>11} {seconds:>9.4f} {'new':>8}")
+            continue
+        change = seconds / before - 1
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"{name:<64} {before:>11.4f} {seconds:>9.4f} {change:>+7.0%}{flag}")
+    suites = {name.split("/")[0] for name in results}
+    for name in sorted(set(baseline) - set(results)):
+        if name.split("/")[0] not in suites:
+            continue
+        print(f"{name:<64} {baseline[name]:>11.4f} {'-':>9} {'gone':>8}")
+    return regressions
+
+
+def load_baseline(path: Path) -> Optional[Dict[str, float]]:
+    if not path.exists():
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["results"]
+
+
+def save_results(path: Path, results: Dict[str, float], merge: bool = False):
+    """Writes ``results`` with the machine they were taken on.
+
+    With ``merge`` the cases of an existing file that were not re-run are kept.
+    """
+    if merge and path.exists():
+        results = {**(load_baseline(path) or {}), **results}
+    document = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": f"{platform.system()} {platform.machine()}",
+        "results": results,
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(document, f, indent=2)
+        f.write("\n")
+
+
+def main(
+    suites: Sequence[str] = ("converters", "registry", "query", "timestamps"),
+    repeat: int = DEFAULT_REPEAT,
+    baseline_path: Path = BASELINE,
+    threshold: float = DEFAULT_THRESHOLD,
+    save_baseline: bool = False,
+    output: Optional[Path] = None,
+):
+    with tempfile.TemporaryDirectory() as workdir:
+        results = time_cases(collect(suites, Path(workdir)), repeat)
+    regressions = compare(results, load_baseline(baseline_path), threshold)
+    if output is not None:
+        save_results(output, results)
+    if save_baseline:
+        save_results(baseline_path, results, merge=True)
+        print(f"Saved baseline to {baseline_path}")
+    elif regressions:
+        print(f"{len(regressions)} case(s) regressed by more than {threshold:.0%}")
+    return results, regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--suite",
+        nargs="+",
+        choices=["converters", "registry", "query", "timestamps"],
+        default=["converters", "registry", "query", "timestamps"],
+    )
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="Slowdown, as a fraction, reported as a regression",
+    )
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="Store these timings as the baseline",
+    )
+    parser.add_argument("--output", type=Path, help="Also write the timings here")
+    parser.add_argument(
+        "--strict", action="store_true", help="Exit non-zero on a regression"
+    )
+    args = parser.parse_args()
+    _, regressions = main(
+        args.suite,
+        args.repeat,
+        args.baseline,
+        args.threshold,
+        args.save_baseline,
+        args.output,
+    )
+    sys.exit(1 if args.strict and regressions else 0)
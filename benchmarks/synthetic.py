@@ -0,0 +1,149 @@
+"""Synthetic inputs for the benchmarks, shaped like the real data the pipelines see.
+
+Everything is generated from a fixed seed so repeated runs time identical inputs.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+SEED = 20221001
+START = "2022-10-01T19:00:00"
+
+
+def _rng() -> np.random.Generator:
+    return np.random.default_rng(SEED)
+
+
+def write_met_netcdf(path: Path, rows: int, start: str = START) -> Path:
+    """Writes a 1 Hz met NetCDF like `sa1.met_z01.b0` with ``rows`` time steps."""
+    rng = _rng()
+    time = pd.date_range(start, periods=rows, freq="1s")
+    ds = xr.Dataset(
+        {
+            "wind_speed": ("time", rng.uniform(0, 20, rows)),
+            "wind_direction": ("time", rng.uniform(0, 360, rows)),
+            "temperature": ("time", rng.normal(15, 5, rows)),
+            "qc_wind_speed": ("time", np.zeros(rows, dtype=np.int32)),
+        },
+        coords={"time": time},
+        attrs={"datastream": "sa1.met_z01.b0", "location_id": "sa1"},
+    )
+    ds.to_netcdf(path)
+    return Path(path)
+
+
+def write_sonic_csv(path: Path, rows: int, start: str = START) -> Path:
+    """Writes a sonic anemometer CSV with the two-line (names, units) header."""
+    rng = _rng()
+    time = pd.Series(pd.date_range(start, periods=rows, freq="1min"))
+    df = pd.DataFrame(
+        {
+            "year": time.dt.year,
+            "month": time.dt.month,
+            "day": time.dt.day,
+            "hour": time.dt.hour,
+            "minute": time.dt.minute,
+            "wind speed": rng.uniform(0, 20, rows).round(3),
+            "wind direction": rng.uniform(0, 360, rows).round(2),
+        }
+    )
+    with open(path, "w", newline="") as f:
+        f.write(",".join(df.columns) + "\n")
+        f.write("yyyy,mm,dd,hh,mm,m/s,deg\n")
+        df.to_csv(f, index=False, header=False)
+    return Path(path)
+
+
+def trigger_patterns(count: int) -> List[str]:
+    """Returns ``count`` pipeline trigger regexes in the style of the pipeline configs."""
+    sites = ["sa1", "sa2", "sb1", "sc1", "sh"]
+    instruments = ["met", "sonic", "lidar", "radar", "ceil", "aeri"]
+    patterns = []
+    for i in range(count):
+        site = sites[i % len(sites)]
+        instrument = instruments[(i // len(sites)) % len(instruments)]
+        patterns.append(rf".*/awaken/{site}\.{instrument}.*z{i:02d}.*\.(nc|csv)")
+    return patterns
+
+
+def input_keys(count: int) -> List[str]:
+    """Returns ``count`` S3-style input keys, only some of which match a trigger."""
+    rng = _rng()
+    sites = ["sa1", "sa2", "sb1", "sc1", "sh", "sx9"]
+    instruments = ["met", "sonic", "lidar", "radar", "ceil", "aeri", "unknown"]
+    keys = []
+    for i in range(count):
+        site = sites[rng.integers(len(sites))]
+        instrument = instruments[rng.integers(len(instruments))]
+        z = rng.integers(100)
+        keys.append(
+            f"s3://bucket/awaken/{site}.{instrument}_z{z:02d}.b0/"
+            f"{site}.{instrument}_z{z:02d}.b0.20221001.{i % 240000:06d}.nc"
+        )
+    return keys
+
+
+def template_mapping() -> Dict[str, str]:
+    """Returns a substitution mapping like the one `TimestreamPipeline` builds."""
+    return {
+        "date": "20221001",
+        "time": "190000",
+        "dataset": "sa1.met_z01.b0",
+        "location": "sa1",
+        "extension": "csv",
+    }
+
+
+def timestream_pages(
+    rows: int, page_size: int = 1000, with_nulls: bool = True
+) -> List[dict]:
+    """Returns Timestream `Query` response pages for a ``rows``-row result.
+
+    The columns mirror a typical dimension + time + multi-measure query: a VARCHAR
+    dimension, a TIMESTAMP, two DOUBLE measures and a BIGINT measure. With
+    ``with_nulls`` about 1% of the measure values are NULL.
+    """
+    rng = _rng()
+    column_info = [
+        {"Name": "location", "Type": {"ScalarType": "VARCHAR"}},
+        {"Name": "time", "Type": {"ScalarType": "TIMESTAMP"}},
+        {"Name": "wind_speed", "Type": {"ScalarType": "DOUBLE"}},
+        {"Name": "wind_direction", "Type": {"ScalarType": "DOUBLE"}},
+        {"Name": "qc_wind_speed", "Type": {"ScalarType": "BIGINT"}},
+    ]
+    times = (
+        pd.date_range(START, periods=rows, freq="1s")
+        .strftime("%Y-%m-%d %H:%M:%S.%f000")
+        .tolist()
+    )
+    speeds = rng.uniform(0, 20, rows).round(3).astype(str).tolist()
+    directions = rng.uniform(0, 360, rows).round(2).astype(str).tolist()
+    qc = rng.integers(0, 4, rows).astype(str).tolist()
+    nulls = (rng.random(rows) < 0.01) if with_nulls else np.zeros(rows, dtype=bool)
+
+    def measure(value, null):
+        return {"NullValue": True} if null else {"ScalarValue": value}
+
+    pages = []
+    for start in range(0, rows, page_size):
+        stop = min(start + page_size, rows)
+        page_rows = [
+            {
+                "Data": [
+                    {"ScalarValue": "sa1"},
+                    {"ScalarValue": times[i]},
+                    measure(speeds[i], nulls[i]),
+                    measure(directions[i], False),
+                    measure(qc[i], nulls[i]),
+                ]
+            }
+            for i in range(start, stop)
+        ]
+        pages.append({"ColumnInfo": column_info, "Rows": page_rows})
+    return pages
@@ -1,7 +1,11 @@
+import os
 from pathlib import Path
 from typing import Any, List, Optional, Union
 import pandas as pd
 
+from utils.metrics import stage_timer
+from utils.timestamps import components_to_epoch
+
 
 def from_csv_to_csv(
     filepath: Union[Path, str],
@@ -14,16 +18,22 @@ def from_csv_to_csv(
     if directory is not None:
         target = Path(directory) / Path(filepath).name
 
-    df = pd.read_csv(filepath, skiprows=[1])
+    timer = stage_timer(kwargs)
+
+    with timer("read", bytes=os.path.getsize(filepath)) as stage:
+        df = pd.read_csv(filepath, skiprows=[1])
+        stage.rows = len(df)
 
-    df["measure_name"] = "data"
-    df["location"] = location
+    with timer("transform", rows=len(df)):
+        df["measure_name"] = "data"
+        df["location"] = location
 
-    df["time"] = pd.to_datetime(df[["year", "month", "day", "hour", "minute"]])
-    df["time"] = (df["time"] - pd.Timestamp("1970-01-01")) // pd.Timedelta("1ms")
-    df = df[variables + ["measure_name", "location"]]
-    df.columns = df.columns.str.replace(" ", "_")
+        df["time"] = components_to_epoch(df, unit="ms")
+        df = df[variables + ["measure_name", "location"]]
+        df.columns = df.columns.str.replace(" ", "_")
 
-    df.to_csv(target, index=False)
+    with timer("write", rows=len(df)) as stage:
+        df.to_csv(target, index=False)
+        stage.bytes = os.path.getsize(target)
 
     return Path(target)
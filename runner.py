@@ -1,6 +1,6 @@
 import logging
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 
 import typer
 
@@ -35,6 +35,17 @@ def run_pipeline(
         "to process each input key. If True, any pipeline whose regex pattern matches an "
         "input key will be used to process the input key.",
     ),
+    metrics_file: Optional[Path] = typer.Option(
+        None,
+        help="Write the per-stage timings (config load, read, transform, write and "
+        "upload), totalled per pipeline and per input, to this JSON file.",
+    ),
+    profile_memory: Optional[str] = typer.Option(
+        None,
+        help="Record the peak memory of each converter call and report the inputs "
+        "with the highest peaks. Either 'rss' (Linux, includes C library allocations) "
+        "or 'tracemalloc' (Python and numpy allocations only, slows conversion).",
+    ),
     verbose: bool = typer.Option(False, help="Turn logging level up to DEBUG."),
 ):
     """Main entry point to the ingest controller. This script takes a path to an input
@@ -51,7 +62,13 @@ def run_pipeline(
 
     # Run the pipeline on the input files
     dispatcher = PipelineRegistry()
-    dispatcher.dispatch(files, clump=clump, multidispatch=multidispatch)
+    dispatcher.dispatch(
+        files,
+        clump=clump,
+        multidispatch=multidispatch,
+        metrics_file=metrics_file,
+        profile_memory=profile_memory,
+    )
 
 
 if __name__ == "__main__":
@@ -1,5 +1,9 @@
+import os
+import sys
 import pandas as pd
 import numpy as np
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from utils.timestamps import local_to_utc, to_epoch
 
 filepath = 'BPAT\BPA_2020.xlsx'
 original_time_name = 'Date/Time'
@@ -16,19 +20,10 @@ df = df.rename(columns={f'{original_time_name}': 'time'})
 df = df.rename(columns={f'{original_load_name}': 'load'})
 df = df.rename(columns={f'{original_wind_name}': 'wind'})
 
-# convert datetime column to datetime datatype
-df['time'] = pd.to_datetime(df['time'])
-
-# localize datetime column to Pacific time, handling ambiguous times with 'infer' option
-df['time'] = df['time'].dt.tz_localize('US/Pacific', ambiguous='infer')
-
-# convert to UTC timezone
-df['time'] = df['time'].dt.tz_convert('UTC')
-
-df['time'] = df['time'].apply(lambda x: x.timestamp())
+# localize to Pacific time (inferring the repeated hour when clocks fall back) and
+# convert to UTC epoch seconds
+df['time'] = to_epoch(local_to_utc(df['time'], 'US/Pacific', ambiguous='infer'), unit='s')
 
 df['ba_id'] = balancing_authority_name
 
-df['time'] = df['time'].astype(int)
-
 df.to_csv('{balancing_authority_name}.{year}.utc.csv', header=True, index=False)
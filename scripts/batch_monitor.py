@@ -0,0 +1,205 @@
+import json
+import logging
+import time
+
+TERMINAL_STATUSES = ("SUCCEEDED", "FAILED", "PROGRESS_STOPPED")
+
+
+class BatchLoadTask:
+    """Book-keeping for a single submitted batch load task."""
+
+    def __init__(self, task_id, database_name, table_name, prefix, attempt=1):
+        self.task_id = task_id
+        self.database_name = database_name
+        self.table_name = table_name
+        self.prefix = prefix
+        self.attempt = attempt
+        self.status = "CREATED"
+        self.error_message = None
+        self.records_processed = 0
+        self.records_ingested = 0
+        self.bytes_metered = 0
+        self.duration = 0.0
+
+    @property
+    def done(self):
+        return self.status in TERMINAL_STATUSES
+
+    def update(self, description):
+        report = description.get("ProgressReport", {})
+        self.status = description.get("TaskStatus", self.status)
+        self.error_message = description.get("ErrorMessage")
+        self.records_processed = report.get("RecordsProcessed", 0)
+        self.records_ingested = report.get("RecordsIngested", 0)
+        self.bytes_metered = report.get("BytesMetered", 0)
+        created = description.get("CreationTime")
+        updated = description.get("LastUpdatedTime")
+        if created is not None and updated is not None:
+            self.duration = (updated - created).total_seconds()
+
+    def to_dict(self):
+        return {
+            "task_id": self.task_id,
+            "database": self.database_name,
+            "table": self.table_name,
+            "prefix": self.prefix,
+            "attempt": self.attempt,
+            "status": self.status,
+            "error_message": self.error_message,
+            "records_processed": self.records_processed,
+            "records_ingested": self.records_ingested,
+            "bytes_metered": self.bytes_metered,
+            "duration_s": self.duration,
+        }
+
+
+class BatchLoadMonitor:
+    """Follows submitted batch load tasks until they finish.
+
+    Tasks are polled with ``describe_batch_load_task``. The polling interval starts at
+    ``initial_interval`` seconds and backs off by ``backoff`` each round (and again on
+    throttling) up to ``max_interval``. Failed tasks can optionally be resubmitted by
+    passing a ``resubmit`` callable that takes a ``BatchLoadTask`` and returns a new
+    task id (or None), up to ``max_resubmits`` times per prefix.
+
+    Args:
+        client: A boto3 ``timestream-write`` client.
+        resubmit (callable, optional): Used to resubmit failed tasks. Defaults to None.
+        max_resubmits (int): Maximum resubmissions per prefix. Defaults to 0.
+        initial_interval (float): First polling interval in seconds. Defaults to 15.
+        max_interval (float): Upper bound on the polling interval. Defaults to 300.
+        backoff (float): Multiplier applied to the interval each round. Defaults to 1.5.
+    """
+
+    def __init__(
+        self,
+        client,
+        resubmit=None,
+        max_resubmits=0,
+        initial_interval=15,
+        max_interval=300,
+        backoff=1.5,
+    ):
+        self.client = client
+        self.resubmit = resubmit
+        self.max_resubmits = max_resubmits
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.tasks = []
+
+    def track(self, task_id, database_name, table_name, prefix, attempt=1):
+        if task_id is None:
+            return None
+        task = BatchLoadTask(task_id, database_name, table_name, prefix, attempt)
+        self.tasks.append(task)
+        return task
+
+    @property
+    def pending(self):
+        return [task for task in self.tasks if not task.done]
+
+    def poll(self):
+        """Describes every pending task once and handles newly failed tasks.
+
+        Returns:
+            bool: True if the service throttled any of the requests.
+        """
+        throttled = False
+        for task in self.pending:
+            try:
+                response = self.client.describe_batch_load_task(TaskId=task.task_id)
+            except self.client.exceptions.ThrottlingException:
+                throttled = True
+                continue
+            task.update(response["BatchLoadTaskDescription"])
+            if task.done:
+                logging.info("Batch load task finished: %s", json.dumps(task.to_dict()))
+                if task.status != "SUCCEEDED":
+                    self._retry(task)
+        return throttled
+
+    def wait(self, timeout=None):
+        """Polls until every tracked task reaches a terminal status or times out."""
+        start = time.monotonic()
+        interval = self.initial_interval
+        while self.pending:
+            if timeout is not None and time.monotonic() - start > timeout:
+                logging.error("Timed out waiting for %s batch tasks", len(self.pending))
+                break
+            time.sleep(interval)
+            if self.poll():
+                interval *= self.backoff
+            interval = min(interval * self.backoff, self.max_interval)
+        return self.summary()
+
+    def _retry(self, task):
+        if self.resubmit is None or task.attempt > self.max_resubmits:
+            logging.error(
+                "Batch load task %s for %s ended with status %s: %s",
+                task.task_id,
+                task.prefix,
+                task.status,
+                task.error_message,
+            )
+            return
+        logging.info("Resubmitting %s (attempt %s)", task.prefix, task.attempt + 1)
+        task_id = self.resubmit(task)
+        self.track(
+            task_id, task.database_name, task.table_name, task.prefix, task.attempt + 1
+        )
+
+    def summary(self):
+        """Aggregates the tracked tasks per table.
+
+        Throughput is computed over the summed task durations, which is the rate a
+        single task slot on that table achieved and is the number to use when tuning
+        chunk sizes.
+
+        Returns:
+            dict: Table name to aggregated metrics.
+        """
+        tables = {}
+        for task in self.tasks:
+            stats = tables.setdefault(
+                task.table_name,
+                {
+                    "tasks": 0,
+                    "succeeded": 0,
+                    "failed": 0,
+                    "records_processed": 0,
+                    "records_ingested": 0,
+                    "bytes_metered": 0,
+                    "duration_s": 0.0,
+                },
+            )
+            stats["tasks"] += 1
+            stats["succeeded"] += task.status == "SUCCEEDED"
+            stats["failed"] += task.done and task.status != "SUCCEEDED"
+            stats["records_processed"] += task.records_processed
+            stats["records_ingested"] += task.records_ingested
+            stats["bytes_metered"] += task.bytes_metered
+            stats["duration_s"] += task.duration
+
+        for stats in tables.values():
+            duration = stats["duration_s"] or float("nan")
+            stats["records_per_s"] = stats["records_ingested"] / duration
+            stats["bytes_per_s"] = stats["bytes_metered"] / duration
+        return tables
+
+    def report(self):
+        """Logs the summary as a JSON line and prints it as a table."""
+        summary = self.summary()
+        logging.info("Batch load summary: %s", json.dumps(summary))
+        print(
+            f"{'table':<40} {'tasks':>5} {'ok':>4} {'fail':>4} "
+            f"{'records':>12} {'MB':>10} {'rec/s':>10} {'MB/s':>8}"
+        )
+        for table_name, stats in sorted(summary.items()):
+            print(
+                f"{table_name:<40} {stats['tasks']:>5} {stats['succeeded']:>4} "
+                f"{stats['failed']:>4} {stats['records_ingested']:>12} "
+                f"{stats['bytes_metered'] / 1e6:>10.2f} "
+                f"{stats['records_per_s']:>10.1f} {stats['bytes_per_s'] / 1e6:>8.3f}"
+            )
+        return summary
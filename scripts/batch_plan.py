@@ -0,0 +1,126 @@
+import heapq
+import json
+import logging
+import math
+
+MAX_CONCURRENT_ACCOUNT_TASKS = 10
+MAX_CONCURRENT_TABLE_TASKS = 5
+
+# Planning assumptions. Both can be overridden from the command line and should be
+# refreshed from the throughput reported by `create_batch.py --monitor`.
+DEFAULT_TASK_OVERHEAD_S = 120.0
+DEFAULT_TASK_BYTES_PER_S = 1_000_000.0
+# Writes are metered per 1KB record; AWAKEN rows are well under 1KB so each row is
+# billed as one write.
+DEFAULT_PRICE_PER_MILLION_WRITES = 0.50
+
+
+def estimate_task_seconds(
+    size, overhead=DEFAULT_TASK_OVERHEAD_S, bytes_per_s=DEFAULT_TASK_BYTES_PER_S
+):
+    return overhead + size / bytes_per_s
+
+
+def simulate_schedule(
+    tasks,
+    account_limit=MAX_CONCURRENT_ACCOUNT_TASKS,
+    table_limit=MAX_CONCURRENT_TABLE_TASKS,
+):
+    """Projects the wall-clock time to run tasks under the batch load limits.
+
+    Tasks start in the given order, as `check_and_create_batch_task` submits them, and
+    each waits for a free account slot and a free slot on its table.
+
+    Args:
+        tasks: An iterable of ``(table_name, duration_s)`` pairs.
+        account_limit (int): Concurrent tasks allowed per account.
+        table_limit (int): Concurrent tasks allowed per table.
+
+    Returns:
+        float: The projected seconds until the last task finishes.
+    """
+    now = 0.0
+    finish = 0.0
+    running = []
+    table_counts = {}
+    for table_name, duration in tasks:
+        while len(running) >= account_limit or (
+            table_counts.get(table_name, 0) >= table_limit
+        ):
+            now, done_table = heapq.heappop(running)
+            table_counts[done_table] -= 1
+        end = now + duration
+        heapq.heappush(running, (end, table_name))
+        table_counts[table_name] = table_counts.get(table_name, 0) + 1
+        finish = max(finish, end)
+    return finish
+
+
+def build_plan(
+    units,
+    overhead=DEFAULT_TASK_OVERHEAD_S,
+    bytes_per_s=DEFAULT_TASK_BYTES_PER_S,
+    price_per_million_writes=DEFAULT_PRICE_PER_MILLION_WRITES,
+):
+    """Summarizes the batch load units of a run without submitting anything.
+
+    Args:
+        units: An iterable of dicts with ``table``, ``prefix``, ``files``, ``bytes``
+            and ``records`` for each batch load task the run would submit.
+        overhead (float): Fixed seconds per task.
+        bytes_per_s (float): Per-task ingest rate.
+        price_per_million_writes (float): Price (USD) per million 1KB writes.
+
+    Returns:
+        dict: Per-table and total counts, projected duration and cost.
+    """
+    tables = {}
+    schedule = []
+    for unit in units:
+        stats = tables.setdefault(
+            unit["table"], {"tasks": 0, "files": 0, "bytes": 0, "records": 0}
+        )
+        stats["tasks"] += 1
+        stats["files"] += unit["files"]
+        stats["bytes"] += unit["bytes"]
+        stats["records"] += unit["records"]
+        duration = estimate_task_seconds(unit["bytes"], overhead, bytes_per_s)
+        schedule.append((unit["table"], duration))
+
+    for stats in tables.values():
+        stats["cost_usd"] = stats["records"] / 1e6 * price_per_million_writes
+
+    totals = {
+        key: sum(stats[key] for stats in tables.values())
+        for key in ("tasks", "files", "bytes", "records", "cost_usd")
+    }
+    totals["wall_clock_s"] = simulate_schedule(schedule)
+    return {"tables": tables, "totals": totals}
+
+
+def report_plan(plan):
+    """Logs the plan as a JSON line and prints it as a table."""
+    logging.info("Batch load plan: %s", json.dumps(plan))
+    print(
+        f"{'table':<40} {'tasks':>6} {'files':>7} {'MB':>10} "
+        f"{'records':>12} {'cost($)':>9}"
+    )
+    for table_name, stats in sorted(plan["tables"].items()):
+        print(
+            f"{table_name:<40} {stats['tasks']:>6} {stats['files']:>7} "
+            f"{stats['bytes'] / 1e6:>10.2f} {stats['records']:>12} "
+            f"{stats['cost_usd']:>9.2f}"
+        )
+    totals = plan["totals"]
+    hours, rem = divmod(math.ceil(totals["wall_clock_s"]), 3600)
+    print(
+        f"{'TOTAL':<40} {totals['tasks']:>6} {totals['files']:>7} "
+        f"{totals['bytes'] / 1e6:>10.2f} {totals['records']:>12} "
+        f"{totals['cost_usd']:>9.2f}"
+    )
+    print(
+        f"Projected wall-clock time: {hours}h{rem // 60:02d}m "
+        f"({MAX_CONCURRENT_ACCOUNT_TASKS} tasks per account, "
+        f"{MAX_CONCURRENT_TABLE_TASKS} per table)"
+    )
+    return plan
@@ -1,19 +1,63 @@
 import boto3
 from botocore.config import Config
 import argparse
-from datetime import datetime, timedelta
+import json
+import os
 import re
-from create_table import create_table
+import sys
+from datetime import datetime, timedelta
 from listOfBatchLoads import count_batch_load_tasks_in_progress
 import logging
+import heapq
 import math
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from timestream_catalog import TimestreamCatalog
+from batch_monitor import BatchLoadMonitor
+from batch_plan import (
+    DEFAULT_PRICE_PER_MILLION_WRITES,
+    DEFAULT_TASK_BYTES_PER_S,
+    DEFAULT_TASK_OVERHEAD_S,
+    MAX_CONCURRENT_ACCOUNT_TASKS,
+    MAX_CONCURRENT_TABLE_TASKS,
+    build_plan,
+    report_plan,
+)
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from utils.timestream import (
+    build_data_model,
+    data_model_from_metadata,
+    timestream_target,
+)
 
 logging.basicConfig(filename="error.log", level=logging.INFO)
 
+INPUT_OBJECT_KEY_PREFIX = "timestream/jobs/"
+MANIFEST_OBJECT_KEY_PREFIX = "timestream/manifests/"
+# Jobs split into several load tasks are copied here, outside the job folders, so
+# listing a job folder never finds the copies of an earlier run
+CHUNK_OBJECT_KEY_PREFIX = "timestream/chunks/"
+MAX_FILES_PER_TASK = 100
+DEFAULT_TARGET_TASK_BYTES = 1_000_000_000
+
+_SUBMIT_LOCK = threading.Lock()
+_LEGACY_CHUNK_REGEX = re.compile(r"chunk\d+/")
+
+# Used for objects staged before the pipelines recorded their data model
+DEFAULT_DATA_MODEL = build_data_model(
+    ["location"], {"wind_speed": "DOUBLE", "wind_direction": "DOUBLE"}
+)
+
 
 def create_batch_load_task(
-    client, database_name, table_name, input_bucket_name, input_object_key_prefix
+    client,
+    database_name,
+    table_name,
+    input_bucket_name,
+    input_object_key_prefix,
+    data_model=None,
 ):
     report_bucket_name = input_bucket_name
     report_object_key_prefix = "timestream/logs/"
@@ -21,30 +65,7 @@ def create_batch_load_task(
         result = client.create_batch_load_task(
             TargetDatabaseName=database_name,
             TargetTableName=table_name,
-            DataModelConfiguration={
-                "DataModel": {
-                    "TimeColumn": "time",
-                    "TimeUnit": "MILLISECONDS",
-                    "DimensionMappings": [
-                        {"SourceColumn": "location", "DestinationColumn": "location"},
-                    ],
-                    "MultiMeasureMappings": {
-                        "TargetMultiMeasureName": "data",
-                        "MultiMeasureAttributeMappings": [
-                            {
-                                "SourceColumn": "wind_speed",
-                                "TargetMultiMeasureAttributeName": "wind_speed",
-                                "MeasureValueType": "DOUBLE",
-                            },
-                            {
-                                "SourceColumn": "wind_direction",
-                                "TargetMultiMeasureAttributeName": "wind_direction",
-                                "MeasureValueType": "DOUBLE",
-                            },
-                        ],
-                    },
-                }
-            },
+            DataModelConfiguration={"DataModel": data_model or DEFAULT_DATA_MODEL},
             DataSourceConfiguration={
                 "DataSourceS3Configuration": {
                     "BucketName": input_bucket_name,
@@ -62,7 +83,7 @@ def create_batch_load_task(
         )
 
         task_id = result["TaskId"]
-        logging.info("Successfully created batch load task: ", task_id)
+        logging.info("Successfully created batch load task: %s", task_id)
         return task_id
     except Exception as err:
         error_message = f"Create batch load task job failed: {err}"
@@ -70,72 +91,104 @@ def create_batch_load_task(
         return None
 
 
-def filter_keys_by_date(stage, keys, target_date_folder=None):
+def target_date_folder_name(stage, target_date_folder=None):
+    """Returns the YYYYMMDD.HHMMSS job folder to process: the one requested, or the
+    previous hour's in production."""
     if stage == "test" or (stage == "prod" and target_date_folder is not None):
         if target_date_folder is None:
             raise ValueError("target_date_folder is required for stage 'test'")
-        matching_keys = [key for key in keys if target_date_folder in key]
-        return matching_keys[0] if matching_keys else ""
+        return target_date_folder
     else:
         current_datetime = datetime.now()
         current_date = current_datetime.strftime("%Y%m%d")
         previous_hour_time = (current_datetime - timedelta(hours=1)).strftime("%H0000")
-        target_format = current_date + "." + previous_hour_time
+        return current_date + "." + previous_hour_time
+
 
-        matching_keys = [key for key in keys if target_format in key]
-        return matching_keys[0] if matching_keys else ""
+def stage_names(stage, database_name, table_name):
+    if stage == "test":
+        return database_name + "_test", table_name
+    return database_name, table_name
 
 
 def extract_names(stage, input_string):
-    pattern = r"[^/]+/[^/]+/\d{8}\.\d{6}/([^/]+)/([^/]+)/"
-    match = re.match(pattern, input_string)
-
-    if match:
-        database_name = match.group(1)
-        raw_table_suffix = match.group(2)
-        updated_table_suffix = raw_table_suffix.replace(".", "_")
-        table_name = f"{database_name}_{updated_table_suffix}"
-        if stage == "test":
-            database_name_updated = database_name + "_test"
-            return database_name_updated, table_name
-        else:
-            return database_name, table_name
-    else:
+    names = timestream_target(input_string)
+    if names is None:
         return None
-
-
-def table_exists(client, database_name, table_name):
-    response = client.list_tables(DatabaseName=database_name)
-
-    for table in response["Tables"]:
-        if table["TableName"] == table_name:
-            return True
-
-    return False
-
-
-def database_exists(client, database_name):
-    response = client.list_databases()
-
-    for database in response["Databases"]:
-        if database["DatabaseName"] == database_name:
-            return True
-
-    return False
-
-
-def copy_files_in_chunks(files, batch_key):
-    total_files = len(files)
-    chunk_size = 100
-    num_chunks = math.ceil(total_files / chunk_size)
-    chunk_keys = []
-
-    for i in range(num_chunks):
-        chunk_key = f"{batch_key}chunk{i + 1}"
-        chunk_keys.append(chunk_key)
-        chunk_files = files[i * chunk_size : (i + 1) * chunk_size]
-        for file in chunk_files:
-            new_file_key = file["Key"].split("/")[-1]
+    return stage_names(stage, *names)
+
+
+def plan_chunks(files, batch_key, target_bytes=DEFAULT_TARGET_TASK_BYTES):
+    """Bin-packs a job's files into the units that are each loaded by one batch task.
+
+    The number of units is the smallest that keeps every unit within
+    MAX_FILES_PER_TASK files and (apart from single oversized files) near
+    ``target_bytes``. Files are placed largest first onto the currently smallest unit
+    that still has room, which keeps the units close to equal in size.
+
+    The split only depends on the files' keys and sizes, so re-planning the same
+    files gives the same units.
+
+    Returns:
+        list: ``(load_key, files)`` pairs, largest unit first. Jobs that need more than
+            one unit are split into `chunk_prefix` prefixes that must be copied first.
+    """
+    total_bytes = sum(file["Size"] for file in files)
+    num_chunks = max(
+        math.ceil(len(files) / MAX_FILES_PER_TASK),
+        math.ceil(total_bytes / target_bytes),
+        1,
+    )
+    num_chunks = min(num_chunks, max(len(files), 1))
+    if num_chunks == 1:
+        return [(batch_key, files)]
+
+    chunks = [[] for _ in range(num_chunks)]
+    heap = [(0, i) for i in range(num_chunks)]
+    for file in sorted(files, key=lambda file: (-file["Size"], file["Key"])):
+        chunk_bytes, i = heapq.heappop(heap)
+        chunks[i].append(file)
+        if len(chunks[i]) < MAX_FILES_PER_TASK:
+            heapq.heappush(heap, (chunk_bytes + file["Size"], i))
+
+    chunks.sort(key=lambda chunk: sum(file["Size"] for file in chunk), reverse=True)
+    return [(chunk_prefix(batch_key, i + 1), chunk) for i, chunk in enumerate(chunks)]
+
+
+def chunk_prefix(batch_key, number):
+    """Returns the prefix chunk ``number`` of a job folder is copied to."""
+    if batch_key.startswith(INPUT_OBJECT_KEY_PREFIX):
+        batch_key = batch_key[len(INPUT_OBJECT_KEY_PREFIX) :]
+    return f"{CHUNK_OBJECT_KEY_PREFIX}{batch_key}chunk{number}/"
+
+
+def copy_files_in_chunks(chunks, batch_key, submitted=()):
+    """Copies each chunk's files to its prefix, leaving it with exactly those files.
+
+    Chunks in ``submitted`` are not touched, and files already copied by an earlier
+    run are not copied again.
+
+    Returns:
+        list: The load keys of the chunks.
+    """
+    for chunk_key, chunk_files in chunks:
+        if chunk_key == batch_key or chunk_key in submitted:
+            continue
+        wanted = {chunk_key + file["Key"].split("/")[-1]: file for file in chunk_files}
+        copied = {
+            obj["Key"]: obj["Size"]
+            for obj in list_all_files_in_bucket(INPUT_BUCKET_NAME, chunk_key)
+        }
+        # left by a run that planned different chunks; they would be loaded again
+        stale = [key for key in copied if key not in wanted]
+        for i in range(0, len(stale), 1000):
+            s3.delete_objects(
+                Bucket=INPUT_BUCKET_NAME,
+                Delete={"Objects": [{"Key": key} for key in stale[i : i + 1000]]},
+            )
+        for new_file_key, file in wanted.items():
+            if copied.get(new_file_key) == file["Size"]:
+                continue
             copy_source = {
                 "Bucket": INPUT_BUCKET_NAME,
                 "Key": file["Key"],
@@ -143,38 +196,71 @@ def copy_files_in_chunks(files, batch_key):
             s3.copy_object(
                 CopySource=copy_source,
                 Bucket=INPUT_BUCKET_NAME,
-                Key=f"{chunk_key}/{new_file_key}",
+                Key=new_file_key,
             )
 
-    return chunk_keys
-
-
-def check_and_create_batch_task(write_client, database_name, table_name, batch_key):
-    MAX_CONCURRENT_ACCOUNT_TASKS = 10
-    MAX_CONCURRENT_TABLE_TASKS = 5
+    return [chunk_key for chunk_key, _ in chunks]
+
+
+def estimate_records(bucket_name, files, sample_bytes=65536):
+    """Returns the number of rows in the files, using the manifest row counts when
+    available and otherwise extrapolating from the head of the largest file."""
+    if all(file.get("Rows") is not None for file in files):
+        return sum(file["Rows"] for file in files)
+    sample = max(files, key=lambda file: file["Size"], default=None)
+    if sample is None or sample["Size"] == 0:
+        return 0
+    response = s3.get_object(
+        Bucket=bucket_name, Key=sample["Key"], Range=f"bytes=0-{sample_bytes - 1}"
+    )
+    data = response["Body"].read()
+    header, _, body = data.partition(b"\n")
+    if len(data) < sample["Size"]:
+        body = body[: body.rfind(b"\n") + 1]  # drop the partial last row
+    rows = body.count(b"\n")
+    if not rows:
+        return 0
+    bytes_per_row = len(body) / rows
+    total_bytes = sum(file["Size"] for file in files)
+    # Every file repeats the header line
+    return round((total_bytes - len(files) * (len(header) + 1)) / bytes_per_row)
+
+
+def get_data_model(bucket_name, key):
+    """Reads the data model recorded on a staged object by the ingest pipeline."""
+    metadata = s3.head_object(Bucket=bucket_name, Key=key).get("Metadata", {})
+    return data_model_from_metadata(metadata) or DEFAULT_DATA_MODEL
+
+
+def check_and_create_batch_task(
+    write_client, database_name, table_name, batch_key, data_model=None
+):
     SLEEP_INTERVAL = 15
     while True:
-        num_in_progress, table_counts = count_batch_load_tasks_in_progress()
-        current_table_count = table_counts.get(table_name, 0)
-        if num_in_progress < MAX_CONCURRENT_ACCOUNT_TASKS:
-            if current_table_count < MAX_CONCURRENT_TABLE_TASKS:
-                logging.info("before create batch table count: ", current_table_count)
-                create_batch_load_task(
+        # Count and submit atomically so concurrent backfill workers can't overshoot
+        with _SUBMIT_LOCK:
+            num_in_progress, table_counts = count_batch_load_tasks_in_progress()
+            current_table_count = table_counts.get(table_name, 0)
+            if (
+                num_in_progress < MAX_CONCURRENT_ACCOUNT_TASKS
+                and current_table_count < MAX_CONCURRENT_TABLE_TASKS
+            ):
+                logging.info("before create batch table count: %s", current_table_count)
+                return create_batch_load_task(
                     write_client,
                     database_name,
                     table_name,
                     INPUT_BUCKET_NAME,
                     input_object_key_prefix=batch_key,
+                    data_model=data_model,
                 )
-                break
-            else:
-                logging.info(
-                    f"Table {table_name} already has 5 or more batch tasks in progress. Waiting..."
-                )
-                time.sleep(SLEEP_INTERVAL)
+        if num_in_progress < MAX_CONCURRENT_ACCOUNT_TASKS:
+            logging.info(
+                f"Table {table_name} already has 5 or more batch tasks in progress. Waiting..."
+            )
         else:
             logging.error("Maximum concurrent tasks reached. Waiting...")
-            time.sleep(SLEEP_INTERVAL)
+        time.sleep(SLEEP_INTERVAL)
 
 
 def list_all_files_in_bucket(bucket_name, prefix=""):
@@ -190,6 +276,206 @@ def list_all_files_in_bucket(bucket_name, prefix=""):
     return all_files
 
 
+def list_common_prefixes(bucket_name, prefix=""):
+    paginator = s3.get_paginator("list_objects_v2")
+    page_iterator = paginator.paginate(Bucket=bucket_name, Prefix=prefix, Delimiter="/")
+    return [
+        common_prefix["Prefix"]
+        for page in page_iterator
+        for common_prefix in page.get("CommonPrefixes", [])
+    ]
+
+
+def read_manifests(bucket_name, date_folder):
+    """Reads the manifests the ingest pipelines wrote for one job folder.
+
+    Returns:
+        list: One job per staged dataset prefix, merging the manifests of every
+            pipeline run that staged into it.
+    """
+    jobs = {}
+    manifest_files = list_all_files_in_bucket(
+        bucket_name=bucket_name, prefix=f"{MANIFEST_OBJECT_KEY_PREFIX}{date_folder}/"
+    )
+    for manifest_file in manifest_files:
+        if not manifest_file["Key"].endswith(".json"):
+            continue
+        body = s3.get_object(Bucket=bucket_name, Key=manifest_file["Key"])["Body"]
+        manifest = json.loads(body.read())
+        job = jobs.setdefault(
+            manifest["prefix"],
+            {
+                "prefix": manifest["prefix"],
+                "database": manifest["database"],
+                "table": manifest["table"],
+                "data_model": manifest.get("data_model"),
+                "files": [],
+            },
+        )
+        job["files"].extend(
+            {"Key": obj["key"], "Size": obj["size"], "Rows": obj.get("rows")}
+            for obj in manifest["objects"]
+        )
+    for job in jobs.values():
+        # Re-staging an input overwrites its object, so keep each key once
+        job["files"] = list({file["Key"]: file for file in job["files"]}.values())
+    return list(jobs.values())
+
+
+def crawl_jobs(bucket_name, date_folder, known_prefixes=()):
+    """Discovers staged jobs by listing the job folder. Used for datasets staged
+    without manifests; prefixes in ``known_prefixes`` are skipped."""
+    jobs = []
+    date_folder_key = f"{INPUT_OBJECT_KEY_PREFIX}{date_folder}/"
+    for project_key in list_common_prefixes(bucket_name, date_folder_key):
+        for batch_key in list_common_prefixes(bucket_name, project_key):
+            if batch_key in known_prefixes:
+                continue
+            names = timestream_target(batch_key)
+            files = [
+                file
+                for file in list_all_files_in_bucket(
+                    bucket_name=bucket_name, prefix=batch_key
+                )
+                # chunks were copied into the job folder before CHUNK_OBJECT_KEY_PREFIX
+                if not _LEGACY_CHUNK_REGEX.match(file["Key"][len(batch_key) :])
+            ]
+            if names is None or not files:
+                continue
+            jobs.append(
+                {
+                    "prefix": batch_key,
+                    "database": names[0],
+                    "table": names[1],
+                    "data_model": get_data_model(bucket_name, files[0]["Key"]),
+                    "files": files,
+                }
+            )
+    return jobs
+
+
+def discover_jobs(bucket_name, date_folder, crawl=False):
+    """Returns the jobs of a folder from its manifests, one per staged dataset.
+
+    Listing the folder is the fallback for folders without any manifest (staged by
+    pipelines without a ``manifest_root``). With ``crawl`` it is also listed for
+    datasets staged without a manifest next to ones with.
+    """
+    manifest_jobs = read_manifests(bucket_name, date_folder)
+    jobs = []
+    for job in manifest_jobs:
+        if job["database"] is None or job["table"] is None:
+            logging.warning(
+                "Skipping manifest for %s: not a job folder prefix", job["prefix"]
+            )
+            continue
+        jobs.append(job)
+    if manifest_jobs and not crawl:
+        logging.info("Found %s jobs from manifests in %s", len(jobs), date_folder)
+        return jobs
+    if not manifest_jobs:
+        logging.info("No manifests in %s; listing its job folders", date_folder)
+    crawled = crawl_jobs(
+        bucket_name, date_folder, {job["prefix"] for job in manifest_jobs}
+    )
+    logging.info(
+        "Found %s jobs from manifests and %s without in %s",
+        len(jobs),
+        len(crawled),
+        date_folder,
+    )
+    return jobs + crawled
+
+
+def list_date_folders(bucket_name, start, end):
+    """Lists the YYYYMMDD.HHMMSS job folders between start and end (inclusive)."""
+    date_folders = set()
+    for root in (INPUT_OBJECT_KEY_PREFIX, MANIFEST_OBJECT_KEY_PREFIX):
+        for prefix in list_common_prefixes(bucket_name, root):
+            date_folder = prefix[len(root) :].rstrip("/")
+            if start <= date_folder <= end:
+                date_folders.add(date_folder)
+    return sorted(date_folders)
+
+
+class BackfillCheckpoint:
+    """Records the load prefixes submitted and the job folders finished by a backfill
+    so an interrupted run resumes where it stopped.
+
+    Args:
+        path (str, optional): JSON file to persist progress to. If None, progress is
+            only kept in memory.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.submitted = set()
+        self.completed = set()
+        self._lock = threading.Lock()
+        if path is not None and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                state = json.load(f)
+            self.submitted = set(state.get("submitted", []))
+            self.completed = set(state.get("completed", []))
+            logging.info(
+                "Resuming from checkpoint with %s completed folders",
+                len(self.completed),
+            )
+
+    def mark_submitted(self, load_key):
+        with self._lock:
+            self.submitted.add(load_key)
+            self._save()
+
+    def mark_completed(self, date_folder):
+        with self._lock:
+            self.completed.add(date_folder)
+            self._save()
+
+    def _save(self):
+        if self.path is None:
+            return
+        state = {
+            "submitted": sorted(self.submitted),
+            "completed": sorted(self.completed),
+        }
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+def submit_job(
+    write_client, job, monitor, checkpoint, target_bytes=DEFAULT_TARGET_TASK_BYTES
+):
+    """Chunks a staged job if needed and submits its batch load tasks.
+
+    Returns:
+        list: The job's load keys, submitted or not.
+    """
+    batch_key = job["prefix"]
+    database_name, table_name = job["database"], job["table"]
+    files = job["files"]
+    print("batch_key", batch_key)
+
+    chunks = plan_chunks(files, batch_key, target_bytes)
+    load_keys = copy_files_in_chunks(chunks, batch_key, checkpoint.submitted)
+    print("list_of_chunk_keys", load_keys)
+
+    for key in load_keys:
+        if key in checkpoint.submitted:
+            continue
+        print("key updated", key)
+        task_id = check_and_create_batch_task(
+            write_client, database_name, table_name, key, job["data_model"]
+        )
+        monitor.track(task_id, database_name, table_name, key)
+        if task_id is not None:
+            checkpoint.mark_submitted(key)
+        logging.info("batch created")
+    return load_keys
+
+
 if __name__ == "__main__":
     try:
         parser = argparse.ArgumentParser(description="Ingest Timestream")
@@ -202,9 +488,79 @@ if __name__ == "__main__":
             type=str,
             help="Target Date folder in format YYYYMMDD.HHMMSS",
         )
+        parser.add_argument(
+            "--monitor",
+            action="store_true",
+            help="Wait for the submitted batch load tasks and report throughput",
+        )
+        parser.add_argument(
+            "--max_resubmits",
+            type=int,
+            default=0,
+            help="Resubmit failed batch load tasks up to this many times (--monitor)",
+        )
+        parser.add_argument(
+            "--start",
+            type=str,
+            help="Backfill every job folder from this YYYYMMDD.HHMMSS folder (inclusive)",
+        )
+        parser.add_argument(
+            "--end",
+            type=str,
+            help="Backfill every job folder up to this YYYYMMDD.HHMMSS folder (inclusive)",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="Number of job folders to process concurrently when backfilling",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            type=str,
+            help="JSON file used to record backfill progress and resume from it",
+        )
+        parser.add_argument(
+            "--crawl",
+            action="store_true",
+            help="Also list job folders that have manifests, for datasets staged "
+            "without one (folders without any manifest are always listed)",
+        )
+        parser.add_argument(
+            "--target_task_bytes",
+            type=int,
+            default=DEFAULT_TARGET_TASK_BYTES,
+            help="Staged bytes to aim for in each batch load task",
+        )
+        parser.add_argument(
+            "--plan",
+            action="store_true",
+            help="Print the tasks, bytes, records, duration and cost without loading",
+        )
+        parser.add_argument(
+            "--plan_task_overhead",
+            type=float,
+            default=DEFAULT_TASK_OVERHEAD_S,
+            help="Assumed fixed seconds per batch load task (--plan)",
+        )
+        parser.add_argument(
+            "--plan_bytes_per_second",
+            type=float,
+            default=DEFAULT_TASK_BYTES_PER_S,
+            help="Assumed ingest rate of one batch load task (--plan)",
+        )
+        parser.add_argument(
+            "--plan_price_per_million_writes",
+            type=float,
+            default=DEFAULT_PRICE_PER_MILLION_WRITES,
+            help="Price in USD per million 1KB writes (--plan)",
+        )
         args = parser.parse_args()
 
-        if args.stage == "test" and args.target_date_folder is None:
+        backfill = args.start is not None or args.end is not None
+        if backfill and (args.start is None or args.end is None):
+            parser.error("--start and --end must be given together")
+        if args.stage == "test" and args.target_date_folder is None and not backfill:
             parser.error("target_date_folder is required for stage 'test'")
 
         session = boto3.Session(region_name="us-west-2")
@@ -219,105 +575,110 @@ if __name__ == "__main__":
         )
 
         INPUT_BUCKET_NAME = args.s3_bucket
-        INPUT_OBJECT_KEY_PREFIX = "timestream/jobs/"
 
-        # get all the nested folders in INPUT_OBJECT_KEY_PREFIX
-        response = s3.list_objects_v2(
-            Bucket=INPUT_BUCKET_NAME, Prefix=INPUT_OBJECT_KEY_PREFIX, Delimiter="/"
-        )
-        allDatetimeKeys = [
-            prefix.get("Prefix") for prefix in response.get("CommonPrefixes", [])
-        ]
+        checkpoint = BackfillCheckpoint(args.checkpoint)
+        if backfill:
+            date_folders = list_date_folders(INPUT_BUCKET_NAME, args.start, args.end)
+        else:
+            date_folders = [
+                target_date_folder_name(args.stage, args.target_date_folder)
+            ]
+        date_folders = [f for f in date_folders if f not in checkpoint.completed]
+        print("relevant date folders:", date_folders)
+
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            jobs_by_folder = dict(
+                zip(
+                    date_folders,
+                    pool.map(
+                        lambda folder: discover_jobs(
+                            INPUT_BUCKET_NAME, folder, crawl=args.crawl
+                        ),
+                        date_folders,
+                    ),
+                )
+            )
+        jobs = [job for folder_jobs in jobs_by_folder.values() for job in folder_jobs]
+
+        if args.plan:
+            units = [
+                {
+                    "table": job["table"],
+                    "prefix": load_key,
+                    "files": len(chunk_files),
+                    "bytes": sum(file["Size"] for file in chunk_files),
+                    "records": estimate_records(INPUT_BUCKET_NAME, chunk_files),
+                }
+                for job in jobs
+                for load_key, chunk_files in plan_chunks(
+                    job["files"], job["prefix"], args.target_task_bytes
+                )
+            ]
+            report_plan(
+                build_plan(
+                    units,
+                    overhead=args.plan_task_overhead,
+                    bytes_per_s=args.plan_bytes_per_second,
+                    price_per_million_writes=args.plan_price_per_million_writes,
+                )
+            )
+            sys.exit(0)
 
-        relevantDatetimeKey = filter_keys_by_date(
-            args.stage, allDatetimeKeys, args.target_date_folder
+        # Load the catalog once and create every missing table for this run up front
+        catalog = TimestreamCatalog(write_client)
+        for job in jobs:
+            job["database"], job["table"] = stage_names(
+                args.stage, job["database"], job["table"]
+            )
+        ready_tables = catalog.provision(
+            (job["database"], job["table"]) for job in jobs
         )
-        print("relevant datetime key:", relevantDatetimeKey)
 
-        # get all the project folders (Only awaken at the moment)
-        nestedProjects = s3.list_objects_v2(
-            Bucket=INPUT_BUCKET_NAME, Prefix=relevantDatetimeKey, Delimiter="/"
+        data_models = {job["table"]: job["data_model"] for job in jobs}
+        monitor = BatchLoadMonitor(
+            write_client,
+            resubmit=lambda task: check_and_create_batch_task(
+                write_client,
+                task.database_name,
+                task.table_name,
+                task.prefix,
+                data_models.get(task.table_name),
+            ),
+            max_resubmits=args.max_resubmits,
         )
-        nestProjectKeys = [
-            prefix.get("Prefix") for prefix in nestedProjects.get("CommonPrefixes", [])
-        ]
-        print("nestProjectKeys", nestProjectKeys)
-
-        for key in nestProjectKeys:
-            newFolderswithData = s3.list_objects_v2(
-                Bucket=INPUT_BUCKET_NAME, Prefix=key, Delimiter="/"
-            )
-
-            create_batch_keys = [
-                prefix.get("Prefix")
-                for prefix in newFolderswithData.get("CommonPrefixes", [])
-            ]
 
-            for batch_key in create_batch_keys:
-                print("batch_key", batch_key)
-                list_of_chunk_keys = None
-                database_name, table_name = extract_names(args.stage, batch_key)
-                files = list_all_files_in_bucket(
-                    bucket_name=INPUT_BUCKET_NAME, prefix=batch_key
+        def process_date_folder(date_folder):
+            complete = True
+            for job in jobs_by_folder[date_folder]:
+                if (job["database"], job["table"]) not in ready_tables:
+                    logging.info("database does not exist")
+                    complete = False
+                    continue
+                load_keys = submit_job(
+                    write_client, job, monitor, checkpoint, args.target_task_bytes
                 )
-                if len(files) > 100:
-                    list_of_chunk_keys = copy_files_in_chunks(files, batch_key)
-                    print("list_of_chunk_keys", list_of_chunk_keys)
-
-                    if list_of_chunk_keys is not None:
-                        for key in list_of_chunk_keys:
-                            key = key + "/"
-                            print("key updated", key)
-                            table_in_ts = table_exists(
-                                client=write_client,
-                                database_name=database_name,
-                                table_name=table_name,
-                            )
-
-                            database_in_ts = database_exists(
-                                client=write_client, database_name=database_name
-                            )
-
-                            if table_in_ts and database_in_ts:
-                                check_and_create_batch_task(
-                                    write_client, database_name, table_name, key
-                                )
-                                logging.info("batch created")
-                            elif not table_in_ts and database_in_ts:
-                                create_table(write_client, database_name, table_name)
-                                check_and_create_batch_task(
-                                    write_client, database_name, table_name, key
-                                )
-                                logging.info(
-                                    f"created {table_name} table and then create batch"
-                                )
-                            else:
-                                logging.info("database does not exist")
-                else:
-                    table_in_ts = table_exists(
-                        client=write_client,
-                        database_name=database_name,
-                        table_name=table_name,
-                    )
-                    database_in_ts = database_exists(
-                        client=write_client, database_name=database_name
-                    )
-
-                    if table_in_ts and database_in_ts:
-                        check_and_create_batch_task(
-                            write_client, database_name, table_name, batch_key
-                        )
-                        logging.info("batch created")
-                    elif not table_in_ts and database_in_ts:
-                        create_table(write_client, database_name, table_name)
-                        check_and_create_batch_task(
-                            write_client, database_name, table_name, batch_key
-                        )
-                        logging.info(
-                            f"created {table_name} table and then create batch"
-                        )
-                    else:
-                        logging.info("database does not exist")
+                complete = complete and all(
+                    key in checkpoint.submitted for key in load_keys
+                )
+            # A folder with a skipped job or a failed submission is left incomplete so
+            # a resumed backfill retries it; its submitted keys are not resubmitted
+            if complete:
+                checkpoint.mark_completed(date_folder)
+            else:
+                logging.warning(
+                    "Job folder %s was not fully submitted; it will be retried",
+                    date_folder,
+                )
+
+        # Folders are processed concurrently; check_and_create_batch_task keeps the
+        # submissions within the account and table batch load limits
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            for future in [pool.submit(process_date_folder, f) for f in date_folders]:
+                future.result()
+
+        if args.monitor:
+            monitor.wait()
+            monitor.report()
 
     except Exception as e:
         logging.error(f"An error occurred: {str(e)}")
@@ -35,13 +35,16 @@ def create_table(client, database_name, table_name):
             MagneticStoreWriteProperties=magnetic_store_write_properties,
         )
         print("Table [%s] successfully created." % table_name)
+        return True
     except client.exceptions.ConflictException:
         print(
             "Table [%s] exists on database [%s]. Skipping table creation"
             % (table_name, database_name)
         )
+        return True
     except Exception as err:
         print("Create table failed:", err)
+        return False
 
 
 if __name__ == "__main__":
@@ -1,40 +1,305 @@
 import asyncio
+import json
+import logging
+import os
+import random
+from argparse import ArgumentDefaultsHelpFormatter, ArgumentParser
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
 import aiohttp
 import pandas as pd
 
+DEFAULT_BASE_URL = "https://api.eia.gov/v2/"
+DEFAULT_ROUTE = "electricity/rto/fuel-type-data/data/"
+# The EIA API returns at most 5000 rows per request
+DEFAULT_PAGE_SIZE = 5000
+DEFAULT_CONCURRENCY = 4
+DEFAULT_MAX_RETRIES = 6
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+RESPONDENTS = [
+    "AECI", "AVA", "AVRN", "AZPS", "BPAT", "CHPD", "CISO", "ERCO", "GWA", "IPCO",
+    "ISNE", "LDWP", "MISO", "NEVP", "NWMT", "NYIS", "PACE", "PACW", "PJM", "PNM",
+    "PSCO", "PSEI", "SOCO", "SRP", "SWPP", "TEPC", "TVA", "WACM", "WALC", "WWA",
+]  # fmt: skip
+
+
+def build_params(start, end, respondents, fueltype="WND", frequency="hourly"):
+    """Returns the query parameters of a fuel type data request, without paging."""
+    params = [
+        ("frequency", frequency),
+        ("data[0]", "value"),
+        ("facets[fueltype][]", fueltype),
+    ]
+    params += [("facets[respondent][]", respondent) for respondent in respondents]
+    params += [
+        ("start", start),
+        ("end", end),
+        ("sort[0][column]", "period"),
+        ("sort[0][direction]", "asc"),
+    ]
+    return params
+
+
+class RetryableError(Exception):
+    pass
+
+
+def retry_after_seconds(value):
+    """Returns the delay a ``Retry-After`` header asks for, in seconds.
+
+    The header is either a number of seconds or an HTTP date. Returns None if it is
+    missing or can't be read, so the caller falls back to its own backoff.
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class EiaDownloader:
+    """Downloads every row of an EIA API v2 query as fixed-size pages.
+
+    The first page is fetched on its own to discover the total row count; the
+    remaining pages are then fetched concurrently, at most ``concurrency`` at a time.
+    Requests that fail with 429 or a 5xx status (or a connection error) are retried
+    with exponential backoff and jitter, honouring ``Retry-After``.
+
+    Each page is written to ``parts_dir`` as soon as it arrives, which doubles as the
+    resume checkpoint: pages already on disk are not fetched again. The output file
+    is built from the parts with a single concat at the end.
+
+    Args:
+        params (list): Query parameters from `build_params`.
+        api_key (str): EIA API key.
+        base_url (str): API root, e.g. a local stub when testing.
+        route (str): API route of the data.
+        page_size (int): Rows per request.
+        concurrency (int): Maximum requests in flight.
+        max_retries (int): Retries per page before giving up.
+        backoff (float): Base delay in seconds between retries.
+    """
+
+    def __init__(
+        self,
+        params,
+        api_key,
+        base_url=DEFAULT_BASE_URL,
+        route=DEFAULT_ROUTE,
+        page_size=DEFAULT_PAGE_SIZE,
+        concurrency=DEFAULT_CONCURRENCY,
+        max_retries=DEFAULT_MAX_RETRIES,
+        backoff=1.0,
+    ):
+        self.url = base_url.rstrip("/") + "/" + route.lstrip("/")
+        self.params = list(params)
+        self.api_key = api_key
+        self.page_size = page_size
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+
+    async def fetch_page(self, session, offset):
+        """Returns the decoded JSON of the page starting at ``offset``."""
+        params = self.params + [
+            ("offset", str(offset)),
+            ("length", str(self.page_size)),
+            ("api_key", self.api_key),
+        ]
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with session.get(self.url, params=params) as response:
+                    if response.status in RETRY_STATUSES:
+                        raise RetryableError(
+                            f"HTTP {response.status}",
+                            response.headers.get("Retry-After"),
+                        )
+                    response.raise_for_status()
+                    return await response.json(content_type=None)
+            except (
+                RetryableError,
+                aiohttp.ClientConnectionError,
+                asyncio.TimeoutError,
+            ) as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = (
+                    retry_after_seconds(e.args[1])
+                    if isinstance(e, RetryableError)
+                    else None
+                )
+                if delay is None:
+                    delay = self.backoff * 2**attempt * (1 + random.random())
+                logging.warning(
+                    "Page at offset %s failed (%s), retrying in %.1fs",
+                    offset,
+                    e.args[0],
+                    delay,
+                )
+                await asyncio.sleep(delay)
+
+    def _part_path(self, parts_dir, offset):
+        return os.path.join(parts_dir, f"offset_{offset:010d}.csv")
+
+    def _write_part(self, parts_dir, offset, page):
+        rows = page["response"]["data"]
+        path = self._part_path(parts_dir, offset)
+        pd.DataFrame(rows).to_csv(f"{path}.tmp", index=False)
+        os.replace(f"{path}.tmp", path)
+        return len(rows)
+
+    def _check_parts(self, parts_dir):
+        # parts left by a run of a different query (or page size) can't be reused
+        checkpoint = {
+            "url": self.url,
+            "params": self.params,
+            "page_size": self.page_size,
+        }
+        checkpoint_path = os.path.join(parts_dir, "checkpoint.json")
+        if os.path.exists(checkpoint_path):
+            with open(checkpoint_path, encoding="utf-8") as f:
+                if json.load(f) == json.loads(json.dumps(checkpoint)):
+                    return
+            logging.warning("Discarding parts of a different query in %s", parts_dir)
+            for name in os.listdir(parts_dir):
+                os.remove(os.path.join(parts_dir, name))
+        os.makedirs(parts_dir, exist_ok=True)
+        with open(checkpoint_path, "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f)
+
+    async def download(self, parts_dir):
+        """Fetches every page missing from ``parts_dir``.
+
+        Returns:
+            list: The part files, in offset order.
+        """
+        self._check_parts(parts_dir)
+        timeout = aiohttp.ClientTimeout(total=300)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            first = await self.fetch_page(session, 0)
+            total = int(first["response"]["total"])
+            offsets = list(range(0, total, self.page_size)) or [0]
+            self._write_part(parts_dir, 0, first)
+            pending = [
+                offset
+                for offset in offsets
+                if not os.path.exists(self._part_path(parts_dir, offset))
+            ]
+            logging.info(
+                "%s rows in %s pages, %s still to fetch",
+                total,
+                len(offsets),
+                len(pending),
+            )
+
+            semaphore = asyncio.Semaphore(self.concurrency)
+
+            async def fetch(offset):
+                async with semaphore:
+                    page = await self.fetch_page(session, offset)
+                rows = self._write_part(parts_dir, offset, page)
+                expected = min(self.page_size, total - offset)
+                if rows != expected:
+                    logging.warning(
+                        "Page at offset %s has %s rows, expected %s",
+                        offset,
+                        rows,
+                        expected,
+                    )
+                logging.info("Fetched offset %s", offset)
+
+            await asyncio.gather(*(fetch(offset) for offset in pending))
+        return [self._part_path(parts_dir, offset) for offset in offsets]
+
+    def run(self, output, keep_parts=False):
+        """Downloads the query to ``output`` as one CSV and returns its row count.
+
+        Re-running after an interruption resumes from the parts already fetched.
+        """
+        parts_dir = f"{output}.parts"
+        parts = asyncio.run(self.download(parts_dir))
+        frames = [pd.read_csv(part) for part in parts if os.path.getsize(part) > 1]
+        main = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        main.to_csv(output, index=False)
+        if not keep_parts:
+            for name in os.listdir(parts_dir):
+                os.remove(os.path.join(parts_dir, name))
+            os.rmdir(parts_dir)
+        return len(main)
+
+
+def build_parser():
+    """Build argument parser.
+
+    :return:  argument parser
+    :rtype:  ArgumentParser
+    """
+    desc = "\n\tDownload EIA hourly generation by fuel type"
+
+    parser = ArgumentParser(
+        description=desc,
+        formatter_class=ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("output", help="CSV file to write")
+    parser.add_argument("--start", default="2018-07-01T00")
+    parser.add_argument("--end", default="2018-12-31T00")
+    parser.add_argument("--fueltype", default="WND")
+    parser.add_argument("--frequency", default="hourly")
+    parser.add_argument("--respondents", nargs="+", default=RESPONDENTS)
+    parser.add_argument(
+        "--api_key",
+        default=os.environ.get("EIA_API_KEY"),
+        help="EIA API key (defaults to $EIA_API_KEY)",
+    )
+    parser.add_argument(
+        "--base_url", default=DEFAULT_BASE_URL, help="API root, e.g. a local stub"
+    )
+    parser.add_argument("--route", default=DEFAULT_ROUTE)
+    parser.add_argument("--page_size", type=int, default=DEFAULT_PAGE_SIZE)
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=DEFAULT_CONCURRENCY,
+        help="Maximum requests in flight",
+    )
+    parser.add_argument("--max_retries", type=int, default=DEFAULT_MAX_RETRIES)
+    parser.add_argument(
+        "--keep_parts",
+        action="store_true",
+        help="Keep the per-page files after writing the output",
+    )
+    return parser
+
+
+if __name__ == "__main__":
+    parser = build_parser()
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    if not args.api_key:
+        parser.error("an API key is required (--api_key or $EIA_API_KEY)")
 
-API_KEY = 'qI5lW8HBQSF3JNZHnWvbR02auviARIbwhhU1Kl6d'
-url = 'https://api.eia.gov/v2/electricity/rto/fuel-type-data/data/?frequency=hourly&data[0]=value&facets[fueltype][]=WND&facets[respondent][]=AECI&facets[respondent][]=AVA&facets[respondent][]=AVRN&facets[respondent][]=AZPS&facets[respondent][]=BPAT&facets[respondent][]=CHPD&facets[respondent][]=CISO&facets[respondent][]=ERCO&facets[respondent][]=GWA&facets[respondent][]=IPCO&facets[respondent][]=ISNE&facets[respondent][]=LDWP&facets[respondent][]=MISO&facets[respondent][]=NEVP&facets[respondent][]=NWMT&facets[respondent][]=NYIS&facets[respondent][]=PACE&facets[respondent][]=PACW&facets[respondent][]=PJM&facets[respondent][]=PNM&facets[respondent][]=PSCO&facets[respondent][]=PSEI&facets[respondent][]=SOCO&facets[respondent][]=SRP&facets[respondent][]=SWPP&facets[respondent][]=TEPC&facets[respondent][]=TVA&facets[respondent][]=WACM&facets[respondent][]=WALC&facets[respondent][]=WWA&start=2018-07-01T00&end=2018-12-31T00&sort[0][column]=period&sort[0][direction]=asc&offset={}&length={}&api_key={}'
-header = {
-    'content_type':'application/json'
-}
-results = []
-csv_filename = 'eia....'
-num_of_records = 24000
-number_of_iterations = int(num_of_records/5000) + 1
-
-
-async def get_records():
-    offset = 0
-    length = 5000
-    i = 0
-    async with aiohttp.ClientSession() as session:
-        while i <= number_of_iterations:
-            await asyncio.sleep(1)
-            response = await asyncio.create_task(session.get(url.format(offset, length,API_KEY), headers=header, ssl=False))
-            results.append(await response.json())
-            print(offset)
-            offset = offset + 5000
-            length = length + 5000
-            i += 1
-
-asyncio.run(get_records())
-
-
-main = pd.DataFrame()
-for result in results:
-    dict_value = result['response']['data']
-    df = pd.DataFrame(dict_value) 
-    main = pd.concat([main,df], axis=0) 
-
-main.to_csv("{csv_filename}.csv",index=False)
\ No newline at end of file
+    downloader = EiaDownloader(
+        build_params(
+            args.start, args.end, args.respondents, args.fueltype, args.frequency
+        ),
+        args.api_key,
+        base_url=args.base_url,
+        route=args.route,
+        page_size=args.page_size,
+        concurrency=args.concurrency,
+        max_retries=args.max_retries,
+    )
+    rows = downloader.run(args.output, keep_parts=args.keep_parts)
+    print(f"Wrote {rows} rows to {args.output}")
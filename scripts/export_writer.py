@@ -0,0 +1,112 @@
+import os
+
+import pandas as pd
+
+
+class CsvExportWriter:
+    """Writes a metadata-headed CSV export in a single pass.
+
+    The metadata block (``Headers=N`` followed by ``Key=Value`` lines) is written
+    first, then data frames are appended one at a time as they arrive, so the file is
+    never re-read or rewritten and memory is bounded by the largest frame. The block is
+    written lazily on the first `write_frame` call so header values that depend on the
+    data (e.g. units taken from the first row) can still be filled in after the writer
+    is opened.
+
+    Args:
+        filename (str): The output CSV file.
+        headers (dict): Ordered metadata ``Key: Value`` pairs.
+        header_count (int, optional): The value written as ``Headers=``. Defaults to
+            the number of metadata lines including the ``Headers`` line itself.
+        append (bool): Append rows to an existing export instead, without writing
+            the metadata block or column names again. Defaults to False.
+    """
+
+    def __init__(self, filename, headers=None, header_count=None, append=False):
+        self.filename = filename
+        self.headers = None if append else dict(headers or {})
+        self.header_count = header_count
+        self.append = append
+        self.rows = 0
+        self._file = None
+        self._wrote_columns = append
+
+    def __enter__(self):
+        mode = "a" if self.append else "w"
+        self._file = open(self.filename, mode, encoding="utf-8", newline="")
+        return self
+
+    def __exit__(self, *exc):
+        if not exc[0]:
+            self._write_headers()
+        self._file.close()
+        return False
+
+    def _write_headers(self):
+        if self.headers is None:
+            return
+        count = self.header_count or len(self.headers) + 1
+        lines = [f"Headers={count}"] + [f"{k}={v}" for k, v in self.headers.items()]
+        self._file.write("\n".join(lines) + "\n")
+        self.headers = None
+
+    def write_frame(self, df: pd.DataFrame, index=False):
+        """Appends a frame's rows, writing the metadata and column names first if
+        this is the first frame."""
+        self._write_headers()
+        df.to_csv(self._file, index=index, header=not self._wrote_columns)
+        self._wrote_columns = True
+        self.rows += len(df)
+
+
+def read_header(filename):
+    """Returns the metadata ``Key: Value`` pairs and the column names of an export."""
+    headers = {}
+    with open(filename, encoding="utf-8") as f:
+        count = int(f.readline().strip().split("=", 1)[1])
+        for _ in range(count - 1):
+            key, _, value = f.readline().rstrip("\n").partition("=")
+            headers[key] = value
+        columns = f.readline().rstrip("\n").split(",")
+    return headers, columns
+
+
+def update_headers(filename, values):
+    """Sets metadata values of an existing export.
+
+    Values of the same length as the old ones (e.g. a new ``ProcessedDate``) are
+    overwritten in place without touching the data. Otherwise the file is copied once
+    with the new header block.
+    """
+    with open(filename, "r+b") as f:
+        line = f.readline()
+        count = int(line.strip().split(b"=", 1)[1])
+        offset = len(line)
+        patches = []
+        for _ in range(count - 1):
+            line = f.readline()
+            key, _, old = line.rstrip(b"\n").decode("utf-8").partition("=")
+            if key in values:
+                new = str(values[key]).encode("utf-8")
+                if len(new) != len(old.encode("utf-8")):
+                    break
+                patches.append((offset + len(key.encode("utf-8")) + 1, new))
+            offset += len(line)
+        else:
+            for position, new in patches:
+                f.seek(position)
+                f.write(new)
+            return
+
+    tmp_filename = f"{filename}.tmp"
+    with open(filename, encoding="utf-8", newline="") as src, open(
+        tmp_filename, "w", encoding="utf-8", newline=""
+    ) as dst:
+        line = src.readline()
+        dst.write(line)
+        for _ in range(int(line.strip().split("=", 1)[1]) - 1):
+            key, _, old = src.readline().rstrip("\n").partition("=")
+            dst.write(f"{key}={values.get(key, old)}\n")
+        for line in src:
+            dst.write(line)
+    os.replace(tmp_filename, filename)
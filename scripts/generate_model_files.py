@@ -1,9 +1,15 @@
 import pandas as pd
 import numpy as np
 from argparse import ArgumentDefaultsHelpFormatter, ArgumentParser
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import os
 import re
 
+START_TIME = 1514764800
+NAMEPLATE_FILE = "scripts/supporting_files/name_code_nameplate.csv"
+ALL_TURBINES = ["turbineA", "turbineB", "turbineC"]
+WRITE_THREADS = 4
+
 
 def build_parser():
     """Build argument parser.
@@ -20,10 +26,145 @@ def build_parser():
     parser.add_argument("input_directory")
     parser.add_argument("output_directory")
     parser.add_argument("time_resolution")
-    parser.add_argument("time_increment")
+    parser.add_argument("time_increment", type=int)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of processes converting input files in parallel",
+    )
+    parser.add_argument(
+        "--write_threads",
+        type=int,
+        default=WRITE_THREADS,
+        help="Number of per-BA output files written concurrently for each input file",
+    )
     return parser
 
 
+def load_nameplates(path=NAMEPLATE_FILE):
+    """Returns the nameplate rows that have both a plant name and a plant code."""
+    unfiltered_data = pd.read_csv(path)
+    return unfiltered_data.loc[
+        ~(
+            pd.isna(unfiltered_data["plant_name"])
+            | pd.isna(unfiltered_data["plant_code"])
+        )
+    ]
+
+
+def parse_tech_id(filename):
+    """Returns the tech id of a turbine file, e.g. "turbineA1" for
+    "TurbineA.1.csv", or None if the name doesn't match."""
+    match = re.search(r"Turbine([A-Za-z]+)\.\d+", filename)
+    if not match:
+        return None
+    tech_id = match.group().replace(".", "")
+    return tech_id[0].lower() + tech_id[1:]
+
+
+def read_turbine_file(filepath):
+    """Reads a turbine csv, dropping its index column and its first row."""
+    df = pd.read_csv(filepath, low_memory=False)
+    df = df.drop(df.columns[0], axis=1)
+    return df.drop(index=df.index[0], axis=0)
+
+
+def generate_power(df, data, tech_id, time_increment, start_time=START_TIME):
+    """Scales a turbine's capacity factors by plant nameplate and sums them per plant.
+
+    Every nameplate row whose unique id is a column of ``df`` is selected at once and
+    multiplied by its nameplate with broadcasting. The columns are then summed per
+    (plant, BA) with a single groupby over the transposed matrix, adding the rows of
+    each plant in nameplate order as the row-by-row version did, so the sums are
+    bit-for-bit the same.
+
+    Args:
+        df (pd.DataFrame): The turbine file, one column per unique id.
+        data (pd.DataFrame): The nameplate rows from `load_nameplates`.
+        tech_id (str): The tech id of the turbine file.
+        time_increment (int): Seconds between consecutive rows.
+        start_time (int): Epoch seconds of the first row.
+
+    Returns:
+        pd.DataFrame: ``time, plant_id, tech_id, ba_id, wind_pw`` sorted by time,
+            plant and BA.
+    """
+    present = data[data["unique_id"].isin(df.columns)]
+    if present.empty:
+        return pd.DataFrame(columns=["time", "plant_id", "tech_id", "ba_id", "wind_pw"])
+
+    values = df[present["unique_id"]].to_numpy(dtype=np.float64)
+    power = np.round(values * present["nameplate"].to_numpy(), 8)
+    times = start_time + np.arange(len(df), dtype=np.int64) * time_increment
+
+    keys = pd.MultiIndex.from_arrays(
+        [present["plant_code"].to_numpy(), present["ba_id"].to_numpy()],
+        names=["plant_id", "ba_id"],
+    )
+    summed = pd.DataFrame(power.T, index=keys).groupby(level=[0, 1]).sum()
+
+    # time-major order, as from a groupby on (time, plant_id, tech_id, ba_id)
+    n_groups = len(summed)
+    return pd.DataFrame(
+        {
+            "time": np.repeat(times, n_groups),
+            "plant_id": np.tile(summed.index.get_level_values(0), len(times)),
+            "tech_id": tech_id,
+            "ba_id": np.tile(summed.index.get_level_values(1), len(times)),
+            "wind_pw": summed.to_numpy().T.ravel(),
+        }
+    )
+
+
+def write_ba_files(
+    grouped,
+    output_directory,
+    turbine_cat,
+    time_resolution,
+    tech_id,
+    threads=WRITE_THREADS,
+):
+    """Writes one file per BA of the generated power, ``threads`` at a time."""
+
+    def write(i, temp):
+        temp = temp.sort_values("time")
+        temp.to_csv(
+            f"{output_directory}/{turbine_cat}/modelwkt.{time_resolution}.a1.2018.{tech_id.lower()}.{i}.csv",
+            index=False,
+        )
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        futures = [
+            pool.submit(write, i, temp)
+            for i, temp in grouped.groupby("ba_id", sort=False)
+        ]
+        for future in futures:
+            future.result()
+    return len(futures)
+
+
+def convert_file(
+    filepath,
+    data,
+    output_directory,
+    time_resolution,
+    time_increment,
+    threads=WRITE_THREADS,
+):
+    """Generates and writes the per-BA power files of one turbine file.
+
+    Returns:
+        int: The number of files written.
+    """
+    tech_id = parse_tech_id(os.path.basename(filepath))
+    df = read_turbine_file(filepath)
+    main_grouped = generate_power(df, data, tech_id, time_increment)
+    return write_ba_files(
+        main_grouped, output_directory, tech_id[:-1], time_resolution, tech_id, threads
+    )
+
+
 if __name__ == "__main__":
     parser = build_parser()
     args = parser.parse_args()
@@ -31,75 +172,31 @@ if __name__ == "__main__":
     output_directory = args.output_directory
     time_resolution = args.time_resolution
     time_increment = args.time_increment
-    START_TIME = 1514764800
 
-    all_turbines = ["turbineA", "turbineB", "turbineC"]
-
-    for turbine in all_turbines:
+    for turbine in ALL_TURBINES:
         turbine_path = os.path.join(output_directory, turbine)
         if not os.path.exists(turbine_path):
             os.makedirs(turbine_path)
 
-    unfiltered_data = pd.read_csv("scripts/supporting_files/name_code_nameplate.csv")
-    data = unfiltered_data.loc[
-        ~(
-            pd.isna(unfiltered_data["plant_name"])
-            | pd.isna(unfiltered_data["plant_code"])
-        )
-    ]
-
-    for filename in os.listdir(input_directory):
-        if filename.endswith(".csv"):  # make sure it's a csv file
-            filepath = os.path.join(input_directory, filename)
-
-        match = re.search(r"Turbine([A-Za-z]+)\.\d+", filename)
-        if match:
-            tech_id = match.group().replace(".", "")
-
-        tech_id = tech_id[0].lower() + tech_id[1:]
-        turbine_cat = tech_id[:-1]
-
-        df = pd.read_csv(filepath, low_memory=False)
-        df = df.drop(df.columns[0], axis=1)
-        df.drop(index=df.index[0], axis=0, inplace=True)
-
-        rows = []
-
-        for i in data.index:
-            time_stamp = START_TIME
-            multiplier = data["nameplate"][i]
-            column_name = data["unique_id"][i]
-            if column_name in df.columns:
-                plant_id = data["plant_code"][i]
-                for j in df.index:
-                    wind_value = round((df.loc[j, column_name] * multiplier), 8)
-                    rows.append(
-                        {
-                            "time": time_stamp,
-                            "plant_id": plant_id,
-                            "tech_id": tech_id,
-                            "ba_id": data["ba_id"][i],
-                            "wind_pw": wind_value,
-                        }
-                    )
-                    time_stamp = (
-                        time_stamp + time_increment
-                    )  # update based on time resolution
-
-        main = pd.DataFrame(rows)
-
-        main_grouped = (
-            main.groupby(["time", "plant_id", "tech_id", "ba_id"])["wind_pw"]
-            .sum()
-            .reset_index()
-        )
+    data = load_nameplates()
 
-        ba_list = main_grouped["ba_id"].unique()
-
-        for i in ba_list:
-            temp = main_grouped[main_grouped["ba_id"] == i]
-            temp = temp.sort_values("time")
-            temp.to_csv(
-                f"{output_directory}/{turbine_cat}/modelwkt.{time_resolution}.a1.2018.{tech_id.lower()}.{i}.csv",
-                index=False,
-            )
+    filepaths = [
+        os.path.join(input_directory, filename)
+        for filename in sorted(os.listdir(input_directory))
+        if filename.endswith(".csv") and parse_tech_id(filename) is not None
+    ]
+    convert_args = (data, output_directory, time_resolution, time_increment)
+
+    if args.workers > 1:
+        # input files are independent, so each is converted in its own process
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            futures = {
+                pool.submit(convert_file, path, *convert_args, args.write_threads): path
+                for path in filepaths
+            }
+            for future, path in futures.items():
+                print(f"{path}: wrote {future.result()} files")
+    else:
+        for path in filepaths:
+            count = convert_file(path, *convert_args, args.write_threads)
+            print(f"{path}: wrote {count} files")
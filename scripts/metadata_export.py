@@ -0,0 +1,663 @@
+import json
+import logging
+import os
+from argparse import ArgumentDefaultsHelpFormatter, ArgumentParser
+from contextlib import ExitStack
+from datetime import datetime
+
+import boto3
+import numpy as np
+import pandas as pd
+import yaml
+from export_writer import CsvExportWriter, read_header, update_headers
+from query_cache import DEFAULT_CACHE_DIR, DEFAULT_CLOSED_AFTER_S, QueryCache
+from timestream_query import (
+    DEFAULT_MAX_CONCURRENT_QUERIES,
+    STATS,
+    iter_frames,
+    iter_windowed_query,
+    run_query,
+)
+
+logger = logging.getLogger(__name__)
+
+SPEC_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "supporting_files", "exports"
+)
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def load_spec(path):
+    """Reads an export spec and fills in the defaults.
+
+    A spec is a yaml file like:
+
+    ```yaml
+    database: windpower
+    table: eia_hourly_data
+    start: "2018-01-01"          # inclusive
+    end: "2019-01-01"            # exclusive, or "now"
+    windows: MS                  # optional; query the range as parallel windows
+    partition: ba_id             # optional; one output file per value
+    filename: eia930.hr.2018.{partition_lower}.a1.csv
+    units: Megawatts             # or units_column: measure_name
+    pivot:                       # optional
+      columns: measure_name
+      values: megawatts
+      measures: [demand, wind]   # optional; else every value of the column, sorted
+      names: [load_mw, wind_mw]  # optional; renames the pivoted columns in order
+    aggregate:                   # optional; bin and pivot server-side
+      bin: 1h
+      function: avg
+    headers:                     # values may use {partition}, {units}, {processed_date}
+      BalancingAuthority: "{partition}"
+      ...
+    ```
+
+    See the specs in ``supporting_files/exports`` for the full set of options.
+    """
+    with open(path, encoding="utf-8") as f:
+        spec = yaml.safe_load(f)
+    for key in ("database", "table", "start", "end", "filename", "headers"):
+        if key not in spec:
+            raise ValueError(f"Export spec {path} is missing '{key}'")
+    spec.setdefault("name", os.path.splitext(os.path.basename(path))[0])
+    spec.setdefault("time_column", "time")
+    spec.setdefault("windows", None)
+    spec.setdefault("partition", None)
+    spec.setdefault("drop", [])
+    spec.setdefault("fill_value", None)
+    return spec
+
+
+def _where(spec):
+    where = "time >= '{start}' AND time < '{end}'"
+    if spec.get("where"):
+        where += f" AND ({spec['where']})"
+    return where
+
+
+def build_query(spec, measures=None):
+    """Returns the spec's query, with ``{start}``/``{end}`` left as placeholders to
+    be filled in for the whole range or each window of it.
+
+    Args:
+        measures (list, optional): The pivoted columns of an aggregated pivot, from
+            `pivot_measures`.
+    """
+    where = _where(spec)
+    if spec.get("aggregate"):
+        return build_aggregate_query(spec, where, measures)
+    return (
+        f"SELECT * FROM {spec['database']}.{spec['table']} "
+        f"WHERE {where} ORDER BY {spec['time_column']} ASC"
+    )
+
+
+def check_aggregate(spec):
+    """Raises a ValueError if the spec can't be aggregated server-side, i.e. has
+    neither a pivot nor ``aggregate.columns`` to aggregate."""
+    if not spec.get("pivot") and not (spec.get("aggregate") or {}).get("columns"):
+        raise ValueError(
+            f"Export {spec['name']} can't be aggregated: it needs a pivot or "
+            "aggregate.columns listing the columns to aggregate"
+        )
+
+
+def build_aggregate_query(spec, where, measures=None):
+    """Returns SQL that bins, aggregates and pivots server-side.
+
+    Rows are grouped by the partition column and ``bin(time, <bin>)``. With a pivot,
+    each of ``measures`` (by default ``pivot.measures``) becomes its own column
+    through conditional aggregation, e.g. ``avg(CASE WHEN measure_name = 'load' THEN megawatts END) AS
+    load_mw``. Without one, each of ``aggregate.columns`` is aggregated as is. Only
+    the final, already pivoted rows are returned.
+    """
+    aggregate = spec["aggregate"]
+    function = aggregate.get("function", "avg")
+    time_bin = f"bin({spec['time_column']}, {aggregate['bin']})"
+    partition = spec["partition"]
+
+    selects = [partition] if partition else []
+    selects.append(f"{time_bin} AS {spec['time_column']}")
+    check_aggregate(spec)
+    pivot = spec.get("pivot")
+    if pivot:
+        measures = measures or pivot.get("measures")
+        if not measures:
+            raise ValueError(
+                f"Export {spec['name']} has no pivot.measures to select; pass the "
+                "ones found by pivot_measures"
+            )
+        names = pivot.get("names") or measures
+        if len(names) != len(measures):
+            raise ValueError(
+                f"Pivot selects the measures {list(measures)} but the spec names "
+                f"{names}"
+            )
+        for measure, name in zip(measures, names):
+            selects.append(
+                f"{function}(CASE WHEN {pivot['columns']} = '{measure}' "
+                f'THEN {pivot["values"]} END) AS "{name}"'
+            )
+    else:
+        selects.extend(
+            f"{function}({column}) AS {column}" for column in aggregate["columns"]
+        )
+    if spec.get("units_column"):
+        selects.append(f"arbitrary({spec['units_column']}) AS {spec['units_column']}")
+
+    group_by = ([partition] if partition else []) + [time_bin]
+    return (
+        f"SELECT {', '.join(selects)} "
+        f"FROM {spec['database']}.{spec['table']} WHERE {where} "
+        f"GROUP BY {', '.join(group_by)} ORDER BY {time_bin} ASC"
+    )
+
+
+def time_range(spec, start=None):
+    """Returns the ``(start, end)`` to query.
+
+    An ``end`` of ``now`` is the current time, rounded down to the aggregation bin so
+    an incremental export never appends a partially filled bin.
+    """
+    end = spec["end"]
+    if str(end).lower() == "now":
+        end = pd.Timestamp.utcnow().tz_localize(None)
+        if spec.get("aggregate"):
+            end = end.floor(spec["aggregate"]["bin"])
+        end = end.strftime(TIME_FORMAT)
+    return start or spec["start"], end
+
+
+def iter_results(
+    client,
+    spec,
+    start=None,
+    cache=None,
+    max_workers=DEFAULT_MAX_CONCURRENT_QUERIES,
+    measures=None,
+):
+    """Runs the spec's query and yields its result in time order as it arrives.
+
+    Windowed specs yield one frame per window, the next few windows being queried in
+    the meantime; others yield one frame per result page. Either way, all the rows of
+    a timestamp are in the same frame, so a client-side pivot of a frame is complete.
+
+    Args:
+        start (str, optional): Overrides the spec's start. Defaults to None.
+        measures (list, optional): See `build_query`.
+    """
+    query = build_query(spec, measures)
+    start, end = time_range(spec, start)
+    if spec["windows"]:
+        frames = iter_windowed_query(
+            client,
+            query,
+            start,
+            end,
+            windows=spec["windows"],
+            max_workers=max_workers,
+            cache=cache,
+            label=spec["name"],
+        )
+    else:
+        frames = iter_frames(
+            client, query.format(start=start, end=end), cache=cache, label=spec["name"]
+        )
+    return _whole_times(frames, spec["time_column"])
+
+
+def _whole_times(frames, time_column):
+    """Re-chunks time-ordered frames so a timestamp's rows are never split between
+    two of them, by holding back the rows of each frame's last timestamp."""
+    held = None
+    for df in frames:
+        if held is not None:
+            df = pd.concat([held, df], ignore_index=True)
+        if df.empty:
+            continue
+        last = df[time_column] == df[time_column].iloc[-1]
+        held = df[last]
+        if not last.all():
+            yield df[~last]
+    if held is not None and not held.empty:
+        yield held
+
+
+def pivot_measures(client, spec, start=None, cache=None):
+    """Returns the values of the pivot column, which become the pivoted columns.
+
+    These are the spec's ``pivot.measures`` if given, or else every value in the
+    queried range, sorted, found with a ``SELECT DISTINCT`` of the pivot column. Fixing
+    them up front gives every frame of a streamed export the same columns.
+    """
+    pivot = spec["pivot"]
+    if pivot.get("measures"):
+        return [str(measure) for measure in pivot["measures"]]
+    column = pivot["columns"]
+    start, end = time_range(spec, start)
+    where = _where(spec).format(start=start, end=end)
+    df = run_query(
+        client,
+        f"SELECT DISTINCT {column} FROM {spec['database']}.{spec['table']} "
+        f"WHERE {where}",
+        cache=cache,
+        label=f"{spec['name']} {column}",
+    )
+    if df.empty:
+        return []
+    return sorted(df[column].dropna().astype(str).unique())
+
+
+def shape(df, spec, measures=None, lookup=None):
+    """Applies the spec's drops, time formatting, pivot, renames and fills.
+
+    Client-side pivots keep the partition column in the index and are reindexed to
+    ``measures``, so all partitions and all frames share one column set, even if a
+    partition or frame is missing a measure entirely.
+
+    Args:
+        measures (list, optional): The pivoted columns, from `pivot_measures`.
+        lookup (pd.DataFrame, optional): The spec's labels file, read once by the
+            caller. Read here if not given.
+    """
+    time_column = spec["time_column"]
+    partition = spec["partition"]
+    df = df.drop(columns=[c for c in spec["drop"] if c in df.columns])
+    df[time_column] = df[time_column].dt.strftime(TIME_FORMAT)
+
+    pivot = spec.get("pivot")
+    if pivot and not spec.get("aggregate"):  # aggregated results arrive pivoted
+        index = [partition, time_column] if partition else [time_column]
+        df = df.astype({pivot["columns"]: str})
+        df = pd.pivot_table(
+            df,
+            values=pivot["values"],
+            index=index,
+            columns=pivot["columns"],
+            aggfunc=pivot.get("aggfunc", "mean"),
+            dropna=pivot.get("dropna", True),
+        )
+        if measures is not None:
+            df = df.reindex(columns=measures)
+        df.columns = [str(column) for column in df.columns]
+        if pivot.get("names"):
+            if len(pivot["names"]) != len(df.columns):
+                raise ValueError(
+                    f"Pivot produced columns {list(df.columns)} but the spec names "
+                    f"{pivot['names']}"
+                )
+            df.columns = pivot["names"]
+        df = df.reset_index()
+
+    labels = spec.get("labels")
+    if labels:
+        if lookup is None:
+            lookup = pd.read_csv(labels["file"])
+        names = dict(zip(lookup[labels["key"]].astype(str), lookup[labels["value"]]))
+        fmt = labels.get("format", "{column}({label})")
+        df = df.rename(
+            columns={
+                column: fmt.format(
+                    column=column,
+                    label=names.get(column, labels.get("default", "unknown")),
+                )
+                for column in df.columns
+                if column not in (time_column, partition)
+            }
+        )
+
+    if spec["fill_value"] is not None:
+        df = df.replace(np.nan, spec["fill_value"])
+
+    rounding = spec.get("round")
+    if rounding:
+        for column in rounding["columns"]:
+            df[column] = df[column].astype(float).round(decimals=rounding["decimals"])
+    return df
+
+
+def partitions(df, spec):
+    """Yields ``(partition_value, frame)`` pairs, or ``(None, df)`` if unpartitioned.
+
+    Rows keep their time order within each partition.
+    """
+    partition = spec["partition"]
+    if not partition:
+        yield None, df
+        return
+    for value, group in df.groupby(partition, sort=True):
+        yield value, group.drop(columns=[partition])
+
+
+class ExportState:
+    """The watermarks of an incremental export: the last exported time of each
+    partition of one table.
+
+    Args:
+        path (str): JSON file the watermarks are kept in.
+        table (str): The ``database.table`` exported. Watermarks recorded for a
+            different table are discarded.
+    """
+
+    def __init__(self, path, table):
+        self.path = path
+        self.table = table
+        self.watermarks = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                state = json.load(f)
+            if state.get("table") == table:
+                self.watermarks = state.get("watermarks", {})
+
+    def save(self):
+        state = {"table": self.table, "watermarks": self.watermarks}
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+def _state_key(value):
+    return "" if value is None else str(value)
+
+
+def _export_filename(spec, output_dir, value):
+    return os.path.join(
+        output_dir,
+        spec["filename"].format(partition=value, partition_lower=str(value).lower()),
+    )
+
+
+def export(
+    client,
+    spec,
+    output_dir=".",
+    cache=None,
+    max_workers=DEFAULT_MAX_CONCURRENT_QUERIES,
+    incremental=False,
+    state_dir=None,
+):
+    """Runs one export spec and writes its files.
+
+    Rows are shaped, partitioned and written as the query's windows (or pages) arrive,
+    with one writer open per partition, so memory is bounded by a few windows rather
+    than the whole range.
+
+    In incremental mode the last exported time of each partition is kept in a state
+    file. Only rows newer than the oldest watermark are queried; rows newer than their
+    partition's watermark are appended to the existing files and the headers that
+    use ``{processed_date}`` are updated in place. Partitions found without a
+    watermark (e.g. newly added to the spec's ``where``, or whose export was deleted)
+    are then queried again on their own from the spec's start and written in full.
+
+    Args:
+        client: A boto3 ``timestream-query`` client.
+        spec (dict): A spec from `load_spec`.
+        output_dir (str): Where to write the files. Defaults to ".".
+        cache (QueryCache, optional): Defaults to None.
+        max_workers (int): Maximum window queries in flight at once.
+        incremental (bool): Append only new rows to the existing files. Defaults to
+            False.
+        state_dir (str, optional): Where incremental state files are kept. Defaults
+            to ``output_dir``.
+
+    Returns:
+        list: The files written or appended to.
+    """
+    partition = spec["partition"]
+    time_column = spec["time_column"]
+    state = None
+    start = spec["start"]
+    if incremental:
+        state = ExportState(
+            os.path.join(state_dir or output_dir, f".{spec['name']}.state.json"),
+            f"{spec['database']}.{spec['table']}",
+        )
+        # a watermark is only usable if its export still exists
+        state.watermarks = {
+            key: watermark
+            for key, watermark in state.watermarks.items()
+            if os.path.exists(_export_filename(spec, output_dir, key or None))
+        }
+        if state.watermarks:
+            start = min(state.watermarks.values())
+            logger.info("Exporting %s incrementally from %s", spec["name"], start)
+    # rows at or before their partition's watermark were exported by an earlier run
+    watermarks = dict(state.watermarks) if state is not None else {}
+    # fixed up front so the incremental and backfill scans end at the same time
+    spec = dict(spec, end=time_range(spec)[1])
+
+    lookup = pd.read_csv(spec["labels"]["file"]) if spec.get("labels") else None
+    units_column = spec.get("units_column")
+    processed_date = datetime.utcnow().strftime(TIME_FORMAT)
+    writers = {}
+
+    def open_writer(stack, value, units):
+        fields = {
+            "partition": value,
+            "partition_lower": str(value).lower(),
+            "units": units,
+            "processed_date": processed_date,
+        }
+        filename = _export_filename(spec, output_dir, value)
+        headers = {
+            key: str(template).format(**fields)
+            for key, template in spec["headers"].items()
+        }
+        append = _state_key(value) in watermarks
+        writer = stack.enter_context(
+            CsvExportWriter(filename, headers, spec.get("header_count"), append=append)
+        )
+        return writer, headers
+
+    def write_results(stack, scan, start):
+        """Writes the rows of ``scan`` from ``start`` and returns the partitions that
+        were skipped because they have no watermark to append after."""
+        skipped = set()
+        measures = None
+        if scan.get("pivot"):
+            measures = pivot_measures(client, scan, start=start, cache=cache)
+            if not measures:
+                return skipped
+        for df in iter_results(
+            client,
+            scan,
+            start=start,
+            cache=cache,
+            max_workers=max_workers,
+            measures=measures,
+        ):
+            if watermarks:
+                keys = (
+                    df[partition].astype(str)
+                    if partition
+                    else pd.Series("", index=df.index)
+                )
+                marks = pd.to_datetime(keys.map(watermarks))
+                # rows of a partition without a watermark only go back to the
+                # oldest watermark, so the partition is exported in full later
+                skipped.update(keys[marks.isna()])
+                df = df[marks.notna() & (df[time_column] > marks)]
+                if df.empty:
+                    continue
+
+            units = {}
+            if units_column:
+                # taken from the first row (of each partition) before the column
+                # is dropped
+                if partition:
+                    units = df.groupby(partition)[units_column].first().to_dict()
+                else:
+                    units = {None: df[units_column].iloc[0]}
+                units = {k: str(v).capitalize() for k, v in units.items()}
+
+            for value, frame in partitions(shape(df, scan, measures, lookup), scan):
+                if value not in writers:
+                    writer, headers = open_writer(
+                        stack, value, units.get(value, spec.get("units", ""))
+                    )
+                    if writer.append:
+                        _, columns = read_header(writer.filename)
+                        if columns != [str(column) for column in frame.columns]:
+                            raise ValueError(
+                                f"New rows for {writer.filename} have columns "
+                                f"{list(frame.columns)} but the export has "
+                                f"{columns}; re-run without --incremental"
+                            )
+                    writers[value] = (writer, headers)
+                writers[value][0].write_frame(frame)
+                if state is not None:
+                    state.watermarks[_state_key(value)] = frame[time_column].max()
+        return skipped
+
+    try:
+        with ExitStack() as stack:
+            skipped = write_results(stack, spec, start)
+            if skipped:
+                logger.info(
+                    "Exporting partitions %s of %s in full from %s, since they have "
+                    "no watermark",
+                    sorted(skipped),
+                    spec["name"],
+                    spec["start"],
+                )
+                values = ", ".join(
+                    "'{}'".format(value.replace("'", "''")) for value in sorted(skipped)
+                )
+                where = f"{partition} IN ({values})"
+                if spec.get("where"):
+                    where = f"({spec['where']}) AND {where}"
+                watermarks = {}
+                write_results(stack, dict(spec, where=where), spec["start"])
+    finally:
+        # the rows of every closed writer are on disk, so their watermarks hold even
+        # if the export stopped part way
+        if state is not None and writers:
+            state.save()
+
+    if not writers:
+        logger.warning("No new data for export %s", spec["name"])
+    written = []
+    for writer, headers in writers.values():
+        if writer.append:
+            update_headers(
+                writer.filename,
+                {
+                    key: headers[key]
+                    for key, template in spec["headers"].items()
+                    if "{processed_date}" in str(template)
+                },
+            )
+        logger.info(
+            "%s %s rows to %s",
+            "Appended" if writer.append else "Wrote",
+            writer.rows,
+            writer.filename,
+        )
+        written.append(writer.filename)
+    return written
+
+
+def build_parser():
+    """Build argument parser.
+
+    :return:  argument parser
+    :rtype:  ArgumentParser
+    """
+    desc = "\n\tRun one or more declarative metadata exports"
+
+    parser = ArgumentParser(
+        description=desc,
+        formatter_class=ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "specs",
+        nargs="+",
+        help=f"Export spec yaml files, or names of the specs in {SPEC_DIR}",
+    )
+    parser.add_argument(
+        "--aggregate",
+        metavar="BIN",
+        help="Bin and aggregate every spec server-side at this interval (e.g. 1h), "
+        "overriding their aggregate.bin. Each spec needs a pivot or aggregate.columns",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Append only rows newer than the last run to the existing files",
+    )
+    parser.add_argument(
+        "--state_dir",
+        help="Directory of the incremental state files (defaults to --output_dir)",
+    )
+    parser.add_argument(
+        "--output_dir", default=".", help="Directory to write the exported files to"
+    )
+    parser.add_argument(
+        "--max_concurrency",
+        type=int,
+        default=DEFAULT_MAX_CONCURRENT_QUERIES,
+        help="Maximum number of window queries in flight",
+    )
+    parser.add_argument(
+        "--cache_dir",
+        default=DEFAULT_CACHE_DIR,
+        help="Directory of the local query result cache",
+    )
+    parser.add_argument(
+        "--no_cache", action="store_true", help="Bypass the local query result cache"
+    )
+    parser.add_argument(
+        "--cache_closed_after",
+        type=float,
+        default=DEFAULT_CLOSED_AFTER_S,
+        help="Seconds after a window ends before its cached result stops expiring",
+    )
+    return parser
+
+
+def resolve_spec_path(name):
+    if os.path.exists(name):
+        return name
+    return os.path.join(SPEC_DIR, f"{name}.yaml")
+
+
+if __name__ == "__main__":
+    parser = build_parser()
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    specs = [load_spec(resolve_spec_path(name)) for name in args.specs]
+    if args.aggregate:
+        # checked up front so a run doesn't fail after the first exports
+        errors = []
+        for spec in specs:
+            spec["aggregate"] = dict(spec.get("aggregate") or {}, bin=args.aggregate)
+            try:
+                check_aggregate(spec)
+            except ValueError as e:
+                errors.append(str(e))
+        if errors:
+            parser.error("; ".join(errors))
+
+    boto3.setup_default_session(profile_name="dev", region_name="us-west-2")
+    client = boto3.client("timestream-query")
+    cache = QueryCache(
+        args.cache_dir, closed_after=args.cache_closed_after, bypass=args.no_cache
+    )
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    for spec in specs:
+        export(
+            client,
+            spec,
+            args.output_dir,
+            cache=cache,
+            max_workers=args.max_concurrency,
+            incremental=args.incremental,
+            state_dir=args.state_dir,
+        )
+    STATS.report()
@@ -0,0 +1,209 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+import uuid
+from pathlib import Path
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_DIR = ".query_cache"
+DEFAULT_MAX_BYTES = 5 * 1024**3
+DEFAULT_TTL_S = 3600.0
+# create_batch loads each hour's staged folder during the next hour, so rows for
+# a window can still arrive for about two hours after it ends
+DEFAULT_CLOSED_AFTER_S = 2 * 3600.0
+
+_TIME_BOUNDS_REGEX = re.compile(
+    r"time\s*>=?\s*'([^']+)'\s+and\s+time\s*<=?\s*'([^']+)'", re.IGNORECASE
+)
+
+
+def normalize_sql(query_string):
+    """Collapses whitespace so formatting-only changes to a query share an entry.
+
+    Case is preserved since string literals (e.g. ba_id = 'CISO') are case sensitive.
+    """
+    return re.sub(r"\s+", " ", query_string).strip().rstrip(";")
+
+
+def infer_time_bounds(query_string):
+    """Returns the ``(start, end)`` of a ``time >= '..' AND time < '..'`` filter, or
+    None if the query has no such filter."""
+    match = _TIME_BOUNDS_REGEX.search(query_string)
+    return match.groups() if match else None
+
+
+class QueryCache:
+    """Local on-disk cache of decoded query results, stored as Parquet.
+
+    Entries are keyed by the normalized SQL and the query's time bounds (given, or
+    inferred from its time filter). Results for a closed historical window (one that
+    ended more than ``closed_after`` seconds before it was cached) never expire;
+    other results expire after ``ttl`` seconds. When the cache grows past ``max_bytes`` the least recently used
+    entries are evicted.
+
+    Args:
+        directory (str | Path): Where to store entries. Defaults to ".query_cache".
+        max_bytes (int): Size limit for all entries. Defaults to 5 GiB.
+        ttl (float): Lifetime in seconds of results that may still change. Defaults
+            to one hour.
+        closed_after (float): How long after its end a window's rows may still be
+            loaded. Defaults to two hours, the ingest lag of create_batch.
+        bypass (bool): If True, always miss (results are still written so the next
+            run can use them). Defaults to False.
+    """
+
+    def __init__(
+        self,
+        directory=DEFAULT_CACHE_DIR,
+        max_bytes=DEFAULT_MAX_BYTES,
+        ttl=DEFAULT_TTL_S,
+        closed_after=DEFAULT_CLOSED_AFTER_S,
+        bypass=False,
+    ):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.closed_after = closed_after
+        self.bypass = bypass
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def key(self, query_string, time_bounds=None):
+        time_bounds = time_bounds or infer_time_bounds(query_string)
+        bounds = [str(pd.Timestamp(b)) for b in time_bounds] if time_bounds else []
+        payload = json.dumps([normalize_sql(query_string), bounds])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, query_string, time_bounds=None):
+        """Returns the cached DataFrame, or None on a miss, expiry or bypass."""
+        if self.bypass:
+            return None
+        key = self.key(query_string, time_bounds)
+        data_path, meta_path = self._paths(key)
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            if meta["expires"] is not None and meta["expires"] < time.time():
+                self._remove(key)
+                return None
+            df = pd.read_parquet(data_path)
+        except (OSError, ValueError, KeyError):
+            return None
+        os.utime(data_path)  # mark as recently used
+        logger.info("Query cache hit %s", key[:12])
+        return df
+
+    def put(self, query_string, df, time_bounds=None):
+        writer = self.open_writer(query_string, time_bounds)
+        writer.write(df)
+        writer.commit()
+
+    def open_writer(self, query_string, time_bounds=None):
+        """Returns a writer that stores a result page by page.
+
+        The entry only becomes visible once the writer is committed, so an
+        interrupted stream never leaves a partial result behind.
+        """
+        return _EntryWriter(self, query_string, time_bounds)
+
+    def _commit(self, query_string, time_bounds, tmp_path):
+        time_bounds = time_bounds or infer_time_bounds(query_string)
+        key = self.key(query_string, time_bounds)
+        data_path, meta_path = self._paths(key)
+        now = time.time()
+        closed = time_bounds is not None and pd.Timestamp(
+            time_bounds[1]
+        ) < pd.Timestamp(now - self.closed_after, unit="s")
+        os.replace(tmp_path, data_path)
+        meta = {
+            "sql": normalize_sql(query_string),
+            "time_bounds": [str(b) for b in time_bounds] if time_bounds else None,
+            "created": now,
+            "expires": None if closed else now + self.ttl,
+        }
+        meta_path.write_text(json.dumps(meta), encoding="utf-8")
+        self.evict()
+
+    def evict(self):
+        """Removes least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        for path in self.directory.glob("*.parquet"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:  # evicted by a concurrent query
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path.stem))
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._remove(key)
+            total -= size
+
+    def clear(self):
+        for path in self.directory.glob("*.parquet"):
+            self._remove(path.stem)
+
+    def _paths(self, key):
+        return self.directory / f"{key}.parquet", self.directory / f"{key}.json"
+
+    def _remove(self, key):
+        for path in self._paths(key):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class _EntryWriter:
+    def __init__(self, cache, query_string, time_bounds):
+        self.cache = cache
+        self.query_string = query_string
+        self.time_bounds = time_bounds
+        self.tmp_path = cache.directory / f"{uuid.uuid4().hex}.tmp"
+        self._writer = None
+        self._failed = False
+
+    def write(self, df):
+        if self._failed:
+            return
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            # the query has already been paid for; return it uncached
+            logger.warning("pyarrow is not installed; results are not cached")
+            self._failed = True
+            return
+        try:
+            if self._writer is None:
+                table = pa.Table.from_pandas(df, preserve_index=False)
+                self._writer = pq.ParquetWriter(self.tmp_path, table.schema)
+            else:
+                table = pa.Table.from_pandas(
+                    df, schema=self._writer.schema, preserve_index=False
+                )
+            self._writer.write_table(table)
+        except (pa.ArrowException, ValueError, TypeError):
+            logger.warning("Could not cache result page; skipping cache", exc_info=True)
+            self.abort()
+            self._failed = True
+
+    def commit(self):
+        if self._failed or self._writer is None:
+            return
+        self._writer.close()
+        self.cache._commit(self.query_string, self.time_bounds, self.tmp_path)
+
+    def abort(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        try:
+            self.tmp_path.unlink()
+        except FileNotFoundError:
+            pass
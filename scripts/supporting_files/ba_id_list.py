@@ -1,59 +0,0 @@
-ba_id_list = ['TEC',
-'TIDC',
-'LDWP',
-'EPE',
-'IPCO',
-'SRP',
-'GVL',
-'CHPD',
-'ERCO',
-'PSEI',
-'TEPC',
-'SOCO',
-'WAUW',
-'WACM',
-'CPLW',
-'PSCO',
-'TVA',
-'DOPD',
-'SC',
-'FPC',
-'AZPS',
-'SCL',
-'AVA',
-'GCPD',
-'SWPP',
-'AECI',
-'BANC',
-'FMPP',
-'NEVP',
-'DUK',
-'CISO',
-'PGE',
-'OVEC',
-'SEC',
-'SCEG',
-'WALC',
-'AEC',
-'TPWR',
-'PNM',
-'HST',
-'NWMT',
-'PACW',
-'FPL',
-'JEA',
-'MISO',
-'NSB',
-'CPLE',
-'ISNE',
-'PACE',
-'PJM',
-'NYIS',
-'LGEE',
-'BPAT',
-'IID',
-'SPA',
-'TAL',
-'GWA',
-'WWA',
-'AVRN']
\ No newline at end of file
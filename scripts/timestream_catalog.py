@@ -0,0 +1,90 @@
+import logging
+
+from create_table import create_table
+
+
+class TimestreamCatalog:
+    """In-memory view of the Timestream databases and tables for a single run.
+
+    The catalog is loaded once with full pagination of ``list_databases`` and
+    ``list_tables`` so that existence checks for each batch key are answered locally
+    instead of issuing two listing calls per chunk. Tables created through the catalog
+    are added to the cache immediately.
+
+    Args:
+        client: A boto3 ``timestream-write`` client.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self._tables = {}
+        self.refresh()
+
+    def refresh(self):
+        """Reloads every database and its tables from Timestream."""
+        self._tables = {
+            database_name: set(self._list_tables(database_name))
+            for database_name in self._list_databases()
+        }
+        logging.info(
+            "Loaded Timestream catalog with %s databases and %s tables",
+            len(self._tables),
+            sum(len(tables) for tables in self._tables.values()),
+        )
+
+    def database_exists(self, database_name):
+        return database_name in self._tables
+
+    def table_exists(self, database_name, table_name):
+        return table_name in self._tables.get(database_name, ())
+
+    def create_table(self, database_name, table_name):
+        """Creates the table (if its database exists) and records it in the cache.
+
+        Returns:
+            bool: True if the table exists after the call, False otherwise.
+        """
+        if self.table_exists(database_name, table_name):
+            return True
+        if not self.database_exists(database_name):
+            logging.info(f"database {database_name} does not exist")
+            return False
+        if create_table(self.client, database_name, table_name):
+            self._tables[database_name].add(table_name)
+            return True
+        return False
+
+    def provision(self, targets):
+        """Creates any missing tables for the run up front.
+
+        Args:
+            targets: An iterable of ``(database_name, table_name)`` pairs.
+
+        Returns:
+            set: The ``(database_name, table_name)`` pairs that are ready to load into.
+        """
+        ready = set()
+        for database_name, table_name in sorted(set(targets)):
+            if self.create_table(database_name, table_name):
+                ready.add((database_name, table_name))
+        return ready
+
+    def _list_databases(self):
+        kwargs = {}
+        while True:
+            response = self.client.list_databases(**kwargs)
+            for database in response.get("Databases", []):
+                yield database["DatabaseName"]
+            if not response.get("NextToken"):
+                break
+            kwargs["NextToken"] = response["NextToken"]
+
+    def _list_tables(self, database_name):
+        kwargs = {"DatabaseName": database_name}
+        while True:
+            response = self.client.list_tables(**kwargs)
+            for table in response.get("Tables", []):
+                yield table["TableName"]
+            if not response.get("NextToken"):
+                break
+            kwargs["NextToken"] = response["NextToken"]
@@ -0,0 +1,492 @@
+import json
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from query_cache import normalize_sql
+
+logger = logging.getLogger(__name__)
+
+ONE_GB_IN_BYTES = 1073741824
+DEFAULT_MAX_CONCURRENT_QUERIES = 4
+
+
+class ColumnarDecoder:
+    """Decodes Timestream query pages into typed per-column arrays.
+
+    `ColumnInfo` is read once per page and each page's `ScalarValue`s are appended to
+    one list per column. Conversion to typed arrays happens once, in bulk, when the
+    result is materialized: TIMESTAMP columns become datetime64[ns], DOUBLE columns
+    float64, BIGINT columns int64 (or nullable Int64 if there are NULLs) and BOOLEAN
+    columns bool. NULLs become NaN/NaT/None. Array, row and time series columns are
+    decoded into Python lists and dicts.
+    """
+
+    def __init__(self):
+        self.names = []
+        self.types = []
+        self._columns = []
+
+    def add_page(self, page):
+        column_info = page["ColumnInfo"]
+        if not self.names:
+            self.names = [info["Name"] for info in column_info]
+            self.types = [info["Type"] for info in column_info]
+            self._columns = [[] for _ in column_info]
+
+        rows = page.get("Rows", [])
+        if not rows:
+            return
+        for j, (column_type, values) in enumerate(zip(self.types, self._columns)):
+            if "ScalarType" in column_type:
+                values.extend([row["Data"][j].get("ScalarValue") for row in rows])
+            else:
+                values.extend(
+                    [_decode_datum(column_type, row["Data"][j]) for row in rows]
+                )
+
+    def __len__(self):
+        return len(self._columns[0]) if self._columns else 0
+
+    def to_frame(self):
+        """Returns the decoded rows as a pandas DataFrame."""
+        return pd.DataFrame(
+            {
+                name: _convert(column_type, values)
+                for name, column_type, values in zip(
+                    self.names, self.types, self._columns
+                )
+            },
+            columns=self.names,
+        )
+
+    def to_arrow(self):
+        """Returns the decoded rows as a pyarrow Table."""
+        import pyarrow as pa
+
+        return pa.Table.from_pandas(self.to_frame(), preserve_index=False)
+
+
+def decode_page(page):
+    """Decodes a single query page into a DataFrame."""
+    decoder = ColumnarDecoder()
+    decoder.add_page(page)
+    return decoder.to_frame()
+
+
+def _convert(column_type, values):
+    scalar_type = column_type.get("ScalarType")
+    if scalar_type == "TIMESTAMP":
+        return np.array(values, dtype="datetime64[ns]")
+    elif scalar_type == "DOUBLE":
+        return np.array(values, dtype=np.float64)
+    elif scalar_type in ("BIGINT", "INTEGER"):
+        if None in values:
+            return pd.array(
+                [None if v is None else int(v) for v in values], dtype="Int64"
+            )
+        return np.array(values, dtype=np.int64)
+    elif scalar_type == "BOOLEAN":
+        if None in values:
+            return pd.array(
+                [None if v is None else v == "true" for v in values], dtype="boolean"
+            )
+        return np.array(values, dtype=object) == "true"
+    return np.array(values, dtype=object)
+
+
+def _decode_datum(column_type, datum):
+    if datum.get("NullValue", False):
+        return None
+    if "ScalarType" in column_type:
+        return datum["ScalarValue"]
+    elif "TimeSeriesMeasureValueColumnInfo" in column_type:
+        value_type = column_type["TimeSeriesMeasureValueColumnInfo"]["Type"]
+        return [
+            {
+                "time": point["Time"],
+                "value": _decode_datum(value_type, point["Value"]),
+            }
+            for point in datum["TimeSeriesValue"]
+        ]
+    elif "ArrayColumnInfo" in column_type:
+        value_type = column_type["ArrayColumnInfo"]["Type"]
+        return [_decode_datum(value_type, value) for value in datum["ArrayValue"]]
+    elif "RowColumnInfo" in column_type:
+        return {
+            info["Name"]: _decode_datum(info["Type"], value)
+            for info, value in zip(
+                column_type["RowColumnInfo"], datum["RowValue"]["Data"]
+            )
+        }
+    raise ValueError(f"Unsupported Timestream column type: {column_type}")
+
+
+class QueryMetrics:
+    """Cost and latency of a single query.
+
+    Bytes scanned and metered are the cumulative totals from the last page's
+    `QueryStatus`. A result served from the local cache is recorded with
+    ``cached=True`` and no bytes.
+    """
+
+    def __init__(self, label, query_string):
+        self.label = label
+        self.sql = normalize_sql(query_string)
+        self.query_id = None
+        self.cached = False
+        self.failed = False
+        self.pages = 0
+        self.rows = 0
+        self.bytes_scanned = 0
+        self.bytes_metered = 0
+        self.time_to_first_page = None
+        self.wall_time = None
+        self._start = time.monotonic()
+
+    def add_page(self, page):
+        if self.time_to_first_page is None:
+            self.time_to_first_page = time.monotonic() - self._start
+        query_status = page.get("QueryStatus", {})
+        self.query_id = page.get("QueryId", self.query_id)
+        self.pages += 1
+        self.rows += len(page.get("Rows", []))
+        self.bytes_scanned = int(query_status.get("CumulativeBytesScanned", 0))
+        self.bytes_metered = int(query_status.get("CumulativeBytesMetered", 0))
+
+    def finish(self):
+        self.wall_time = time.monotonic() - self._start
+
+    def to_dict(self):
+        return {
+            "label": self.label,
+            "query_id": self.query_id,
+            "cached": self.cached,
+            "failed": self.failed,
+            "wall_s": self.wall_time,
+            "time_to_first_page_s": self.time_to_first_page,
+            "pages": self.pages,
+            "rows": self.rows,
+            "bytes_scanned": self.bytes_scanned,
+            "bytes_metered": self.bytes_metered,
+            "sql": self.sql,
+        }
+
+
+class QueryStats:
+    """Collects `QueryMetrics` for a run.
+
+    Each finished query is logged as a ``Query metrics: {...}`` JSON line, and
+    `report` prints an end-of-run table sorted by bytes metered, so the expensive
+    exports stand out and runs can be compared after schema changes.
+    """
+
+    def __init__(self):
+        self.queries = []
+        self._lock = threading.Lock()
+
+    def record(self, metrics):
+        metrics.finish()
+        with self._lock:
+            self.queries.append(metrics)
+        logger.info("Query metrics: %s", json.dumps(metrics.to_dict()))
+
+    def summary(self):
+        queries = [metrics.to_dict() for metrics in self.queries]
+        totals = {"queries": len(queries)}
+        for key in ("cached", "failed"):
+            totals[key] = sum(query[key] for query in queries)
+        for key in ("wall_s", "pages", "rows", "bytes_scanned", "bytes_metered"):
+            totals[key] = sum(query[key] or 0 for query in queries)
+        return {"queries": queries, "totals": totals}
+
+    def report(self):
+        """Logs the summary as a JSON line and prints it as a table."""
+        summary = self.summary()
+        logger.info("Query summary: %s", json.dumps(summary["totals"]))
+        print(
+            f"{'query':<40} {'wall(s)':>8} {'first(s)':>8} {'pages':>6} "
+            f"{'rows':>10} {'scanned(GB)':>11} {'metered(GB)':>11}"
+        )
+        rows = sorted(
+            summary["queries"], key=lambda q: q["bytes_metered"], reverse=True
+        )
+        for query in rows + [dict(summary["totals"], label="TOTAL")]:
+            label = query["label"] + (
+                " (cached)" if query.get("cached") is True else ""
+            )
+            first = query.get("time_to_first_page_s")
+            print(
+                f"{label[:40]:<40} {query['wall_s'] or 0:>8.2f} "
+                f"{'' if first is None else f'{first:.2f}':>8} {query['pages']:>6} "
+                f"{query['rows']:>10} {query['bytes_scanned'] / ONE_GB_IN_BYTES:>11.3f} "
+                f"{query['bytes_metered'] / ONE_GB_IN_BYTES:>11.3f}"
+            )
+        return summary
+
+
+# Queries are recorded here unless a caller passes its own collector.
+STATS = QueryStats()
+
+
+def iter_pages(client, query_string, metrics=None):
+    """Runs a query and yields its result pages, logging progress as they arrive.
+
+    Args:
+        client: A boto3 ``timestream-query`` client.
+        query_string (str): The SQL to run.
+        metrics (QueryMetrics, optional): Updated with each page. Defaults to None.
+    """
+    paginator = client.get_paginator("query")
+    for page in paginator.paginate(QueryString=query_string):
+        if metrics is not None:
+            metrics.add_page(page)
+        query_status = page["QueryStatus"]
+        logger.info(
+            "Query progress so far: %s%%, scanned %.3f GB, metered %.3f GB",
+            query_status["ProgressPercentage"],
+            float(query_status["CumulativeBytesScanned"]) / ONE_GB_IN_BYTES,
+            float(query_status["CumulativeBytesMetered"]) / ONE_GB_IN_BYTES,
+        )
+        yield page
+
+
+def iter_frames(
+    client, query_string, cache=None, time_bounds=None, label=None, stats=STATS
+):
+    """Runs a query and yields its result one decoded page at a time.
+
+    Memory stays bounded by a single page. With a cache, a cached result is yielded
+    as a single frame, and otherwise the pages are written to the cache as they stream
+    through.
+
+    Args:
+        client: A boto3 ``timestream-query`` client.
+        query_string (str): The SQL to run.
+        cache (QueryCache, optional): Defaults to None.
+        time_bounds (tuple, optional): See `run_query`.
+        label (str, optional): See `run_query`.
+        stats (QueryStats, optional): See `run_query`.
+
+    Yields:
+        pd.DataFrame: The decoded rows of each non-empty page.
+    """
+    metrics = QueryMetrics(label or _default_label(query_string), query_string)
+    if cache is not None:
+        df = cache.get(query_string, time_bounds)
+        if df is not None:
+            metrics.cached = True
+            metrics.rows = len(df)
+            _record(stats, metrics)
+            yield df
+            return
+    writer = cache.open_writer(query_string, time_bounds) if cache else None
+    try:
+        for page in iter_pages(client, query_string, metrics):
+            df = decode_page(page)
+            if df.empty:
+                continue
+            if writer is not None:
+                writer.write(df)
+            yield df
+    except BaseException:
+        metrics.failed = True
+        if writer is not None:
+            writer.abort()
+        raise
+    finally:
+        _record(stats, metrics)
+    if writer is not None:
+        writer.commit()
+
+
+def run_query(
+    client,
+    query_string,
+    output="pandas",
+    cache=None,
+    time_bounds=None,
+    label=None,
+    stats=STATS,
+):
+    """Runs a query and returns the decoded result.
+
+    Args:
+        client: A boto3 ``timestream-query`` client.
+        query_string (str): The SQL to run.
+        output (str): "pandas" for a DataFrame or "arrow" for a pyarrow Table.
+        cache (QueryCache, optional): Serves the result locally if cached, and stores
+            it otherwise. Defaults to None.
+        time_bounds (tuple, optional): The ``(start, end)`` the query covers, used
+            for the cache entry. Inferred from the SQL's ``time >= '..' AND
+            time < '..'`` filter if not given.
+        label (str, optional): Names the query in its metrics. Defaults to the start
+            of the SQL.
+        stats (QueryStats, optional): Where the query's metrics are recorded.
+            Defaults to the module-level `STATS`; None disables recording.
+
+    Returns:
+        The decoded result.
+    """
+    metrics = QueryMetrics(label or _default_label(query_string), query_string)
+    df = cache.get(query_string, time_bounds) if cache is not None else None
+    if df is not None:
+        metrics.cached = True
+        metrics.rows = len(df)
+        _record(stats, metrics)
+    else:
+        try:
+            decoder = ColumnarDecoder()
+            for page in iter_pages(client, query_string, metrics):
+                decoder.add_page(page)
+        except BaseException:
+            metrics.failed = True
+            raise
+        finally:
+            _record(stats, metrics)
+        df = decoder.to_frame()
+        if cache is not None:
+            cache.put(query_string, df, time_bounds)
+    if output == "arrow":
+        import pyarrow as pa
+
+        return pa.Table.from_pandas(df, preserve_index=False)
+    return df
+
+
+def _default_label(query_string):
+    return normalize_sql(query_string)[:60]
+
+
+def _record(stats, metrics):
+    if stats is not None:
+        stats.record(metrics)
+
+
+def split_time_range(start, end, windows="MS"):
+    """Splits [start, end) into consecutive sub-windows.
+
+    Args:
+        start: Inclusive start of the range (anything `pd.Timestamp` accepts).
+        end: Exclusive end of the range.
+        windows (str | int): A pandas frequency for the window boundaries (e.g. "MS"
+            for calendar months, "7D" for weeks) or the number of equal windows.
+
+    Returns:
+        list: ``(window_start, window_end)`` Timestamp pairs in time order.
+    """
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    if isinstance(windows, int):
+        edges = list(pd.date_range(start, end, periods=windows + 1))
+    else:
+        edges = [start, *pd.date_range(start, end, freq=windows), end]
+    edges = sorted(set(edge for edge in edges if start <= edge <= end))
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def iter_windowed_query(
+    client,
+    query_template,
+    start,
+    end,
+    windows="MS",
+    max_workers=DEFAULT_MAX_CONCURRENT_QUERIES,
+    cache=None,
+    label=None,
+):
+    """Runs a long-range query as parallel sub-window queries and yields each
+    window's result in window order.
+
+    The query template must select the window with ``{start}`` (inclusive) and
+    ``{end}`` (exclusive) placeholders and order each window by time, e.g.
+    ``... where time >= '{start}' AND time < '{end}' order by time asc``. Since the
+    windows don't overlap, the frames come out in time order. At most ``max_workers``
+    windows are queried ahead of the one being consumed, so memory is bounded by a
+    few windows rather than the whole range.
+
+    Args:
+        client: A boto3 ``timestream-query`` client.
+        query_template (str): SQL with ``{start}`` and ``{end}`` placeholders.
+        start: Inclusive start of the range.
+        end: Exclusive end of the range.
+        windows (str | int): Passed to `split_time_range`. Defaults to months.
+        max_workers (int): The maximum number of window queries in flight at once.
+        cache (QueryCache, optional): Caches each window separately, so closed
+            months are served locally while the current one is re-queried. Defaults
+            to None.
+        label (str, optional): Prefixes the window start in each window's query
+            metrics. Defaults to None.
+
+    Raises:
+        RuntimeError: If a window's query fails, since the result would silently be
+            missing that window.
+
+    Yields:
+        pd.DataFrame: The result of each window.
+    """
+    time_format = "%Y-%m-%d %H:%M:%S"
+    ranges = iter(split_time_range(start, end, windows))
+    pending = deque()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+
+        def submit_next():
+            window = next(ranges, None)
+            if window is None:
+                return
+            window_start, window_end = window
+            # keyed by window start so each window's metrics are labelled with it
+            key = " ".join(filter(None, [label, window_start.strftime(time_format)]))
+            query = query_template.format(
+                start=window_start.strftime(time_format),
+                end=window_end.strftime(time_format),
+            )
+            future = pool.submit(run_query, client, query, cache=cache, label=key)
+            pending.append((key, future))
+
+        for _ in range(max_workers):
+            submit_next()
+        while pending:
+            key, future = pending.popleft()
+            try:
+                df = future.result()
+            except Exception as e:
+                for _, other in pending:
+                    other.cancel()
+                raise RuntimeError(f"Query failed for window starting {key}") from e
+            submit_next()
+            yield df
+
+
+def run_windowed_query(
+    client,
+    query_template,
+    start,
+    end,
+    windows="MS",
+    max_workers=DEFAULT_MAX_CONCURRENT_QUERIES,
+    cache=None,
+    label=None,
+):
+    """Runs a long-range query as parallel sub-window queries and merges the results.
+
+    Takes the same arguments as `iter_windowed_query`, and about as long as its
+    slowest window instead of the sum of all of them. Prefer `iter_windowed_query`
+    when the result can be processed a window at a time.
+
+    Raises:
+        RuntimeError: If any window's query fails.
+
+    Returns:
+        pd.DataFrame: The merged result.
+    """
+    frames = list(
+        iter_windowed_query(
+            client, query_template, start, end, windows, max_workers, cache, label
+        )
+    )
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
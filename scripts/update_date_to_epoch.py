@@ -1,15 +1,15 @@
+import os
+import sys
 import pandas as pd
-from datetime import datetime
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from utils.timestamps import iso_to_epoch
 
 filepath = 'CISO.2020.utc.csv'
 
 df = pd.read_csv(f'{filepath}')
 
-def convert_to_epoch(timestamp_string):
-    dt = datetime.fromisoformat(timestamp_string)
-    return int(dt.timestamp())
-
-df['Date'] = df['Date'].apply(lambda x: convert_to_epoch(x))
+# times without a UTC offset are read as UTC
+df['Date'] = iso_to_epoch(df['Date'], unit='s')
 
 
 df.to_csv(f'{filepath}', index=False, mode='w')
\ No newline at end of file
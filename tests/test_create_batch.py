@@ -0,0 +1,263 @@
+"""Tests staging, job discovery and chunking (`TimestreamPipeline`, `create_batch`)
+against an in-process S3 (moto)."""
+
+import json
+import os
+import sys
+from string import Template
+
+import boto3
+import pytest
+from moto import mock_aws
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "scripts"))
+
+import create_batch  # noqa: E402
+import utils.timestream  # noqa: E402
+from utils.metrics import RunMetrics, stage_timer  # noqa: E402
+from utils.timestream import MANIFEST_NAME, TimestreamPipeline  # noqa: E402
+
+BUCKET = "ingest-test"
+REGION = "us-west-2"
+FOLDER = "20221001.190000"
+MET = f"timestream/jobs/{FOLDER}/awaken/sa1.met_z01.b0/"
+SONIC = f"timestream/jobs/{FOLDER}/awaken/sa1.sonic_z01.b0/"
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    for name in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"):
+        monkeypatch.setenv(name, "testing")
+    monkeypatch.setenv("AWS_DEFAULT_REGION", REGION)
+    with mock_aws():
+        client = boto3.client("s3", region_name=REGION)
+        client.create_bucket(
+            Bucket=BUCKET, CreateBucketConfiguration={"LocationConstraint": REGION}
+        )
+        # create_batch only defines its client when run as a script
+        monkeypatch.setattr(create_batch, "s3", client, raising=False)
+        monkeypatch.setattr(create_batch, "INPUT_BUCKET_NAME", BUCKET, raising=False)
+        TimestreamPipeline._get_session.cache_clear()
+        yield client
+
+
+def make_pipeline(converter=None):
+    return TimestreamPipeline(
+        triggers=[],
+        converter=converter,
+        variables=["wind_speed"],
+        bucket_name=BUCKET,
+        storage_root=Template("timestream/jobs/"),
+        manifest_root=Template("timestream/manifests/"),
+    )
+
+
+def stage(s3, prefix, names, size=10):
+    objects = []
+    for name in names:
+        s3.put_object(Bucket=BUCKET, Key=prefix + name, Body=b"x" * size)
+        objects.append(dict(key=prefix + name, size=size, rows=1))
+    return objects
+
+
+def manifest_root(job_prefix):
+    return job_prefix.replace("timestream/jobs/", "timestream/manifests/")
+
+
+def list_keys(s3, prefix):
+    response = s3.list_objects_v2(Bucket=BUCKET, Prefix=prefix)
+    return [obj["Key"] for obj in response.get("Contents", [])]
+
+
+def test_runs_merge_into_one_manifest_per_job_folder(s3):
+    pipeline = make_pipeline()
+    first = stage(s3, MET, ["a.csv", "b.csv"])
+    second = stage(s3, MET, ["b.csv", "c.csv"], size=20)
+
+    keys = {
+        pipeline._write_manifest(MET, manifest_root(MET), first),
+        pipeline._write_manifest(MET, manifest_root(MET), second),
+    }
+
+    assert keys == {manifest_root(MET) + MANIFEST_NAME}
+    assert list_keys(s3, "timestream/manifests/") == list(keys)
+    manifest = json.loads(s3.get_object(Bucket=BUCKET, Key=keys.pop())["Body"].read())
+    assert manifest["prefix"] == MET
+    assert manifest["table"] == "awaken_sa1_met_z01_b0"
+    assert {obj["key"]: obj["size"] for obj in manifest["objects"]} == {
+        MET + "a.csv": 10,
+        MET + "b.csv": 20,
+        MET + "c.csv": 20,
+    }
+
+
+def write_rows(filepath, variables, location, directory, **kwargs):
+    """A converter writing one CSV row per line of its input."""
+    with open(filepath) as f:
+        rows = f.read().splitlines()
+    target = os.path.join(directory, os.path.basename(filepath))
+    with stage_timer(kwargs)("write", rows=len(rows)):
+        with open(target, "w") as f:
+            f.write("time,wind_speed\n" + "".join(f"{row},1.0\n" for row in rows))
+    return target
+
+
+def test_run_takes_row_counts_from_the_converter(s3, tmp_path, monkeypatch):
+    inputs = []
+    for i, rows in enumerate((3, 5)):
+        path = tmp_path / f"sa1.f{i}.csv"
+        path.write_text("".join(f"{t}\n" for t in range(rows)))
+        inputs.append(str(path))
+    pipeline = make_pipeline(write_rows)
+    # staged files aren't read again
+    monkeypatch.setattr(utils.timestream, "count_rows", pytest.fail)
+    metrics = RunMetrics()
+
+    pipeline.run(inputs, metrics)
+
+    key = "timestream/manifests/" + MANIFEST_NAME
+    manifest = json.loads(s3.get_object(Bucket=BUCKET, Key=key)["Body"].read())
+    assert sorted(obj["rows"] for obj in manifest["objects"]) == [3, 5]
+    assert metrics.summary()["totals"]["rows"] == 8
+
+
+def test_manifest_merge_retries_when_another_run_wrote_first(s3, monkeypatch):
+    pipeline = make_pipeline()
+    bucket = pipeline._bucket
+    # the property builds a new client each time; keep the one patched below
+    monkeypatch.setattr(TimestreamPipeline, "_bucket", property(lambda self: bucket))
+    client = bucket.meta.client
+    get_object = client.get_object
+    raced = []
+
+    def racing_get_object(**kwargs):
+        response = get_object(**kwargs)
+        if not raced:
+            # another run merges its object between this run's read and write
+            raced.append(True)
+            pipeline._write_manifest(MET, manifest_root(MET), other)
+        return response
+
+    pipeline._write_manifest(MET, manifest_root(MET), stage(s3, MET, ["a.csv"]))
+    other = stage(s3, MET, ["b.csv"])
+    monkeypatch.setattr(client, "get_object", racing_get_object)
+    key = pipeline._write_manifest(MET, manifest_root(MET), stage(s3, MET, ["c.csv"]))
+
+    manifest = json.loads(get_object(Bucket=BUCKET, Key=key)["Body"].read())
+    assert sorted(obj["key"] for obj in manifest["objects"]) == [
+        MET + "a.csv",
+        MET + "b.csv",
+        MET + "c.csv",
+    ]
+
+
+def test_discover_jobs_reads_manifests_without_listing_job_folders(s3, monkeypatch):
+    pipeline = make_pipeline()
+    pipeline._write_manifest(MET, manifest_root(MET), stage(s3, MET, ["a.csv"]))
+    stage(s3, SONIC, ["s.csv"])  # staged by a pipeline without a manifest_root
+
+    def crawl_jobs(*args, **kwargs):
+        raise AssertionError("job folders with manifests should not be listed")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(create_batch, "crawl_jobs", crawl_jobs)
+        jobs = create_batch.discover_jobs(BUCKET, FOLDER)
+    assert [(job["prefix"], len(job["files"])) for job in jobs] == [(MET, 1)]
+
+    jobs = create_batch.discover_jobs(BUCKET, FOLDER, crawl=True)
+    assert sorted(job["prefix"] for job in jobs) == [MET, SONIC]
+
+
+def test_discover_jobs_lists_folders_without_manifests(s3):
+    stage(s3, MET, ["a.csv", "b.csv"])
+
+    jobs = create_batch.discover_jobs(BUCKET, FOLDER)
+
+    assert [job["prefix"] for job in jobs] == [MET]
+    assert sorted(file["Key"] for file in jobs[0]["files"]) == [
+        MET + "a.csv",
+        MET + "b.csv",
+    ]
+
+
+def files_of(sizes, prefix=MET):
+    return [
+        {"Key": f"{prefix}f{i:04d}.csv", "Size": size} for i, size in enumerate(sizes)
+    ]
+
+
+def test_plan_chunks_caps_files_per_task():
+    files = files_of([1] * (2 * create_batch.MAX_FILES_PER_TASK + 1))
+
+    chunks = create_batch.plan_chunks(files, MET, target_bytes=10**9)
+
+    assert len(chunks) == 3
+    assert all(len(chunk) <= create_batch.MAX_FILES_PER_TASK for _, chunk in chunks)
+    assert sorted(f["Key"] for _, chunk in chunks for f in chunk) == sorted(
+        f["Key"] for f in files
+    )
+
+
+def test_plan_chunks_balances_bytes_and_is_stable():
+    sizes = [900, 700, 500, 400, 300, 300, 200, 100, 100, 50]
+    files = files_of(sizes)
+
+    chunks = create_batch.plan_chunks(files, MET, target_bytes=1200)
+
+    totals = [sum(f["Size"] for f in chunk) for _, chunk in chunks]
+    assert len(chunks) == 3  # ceil(3550 / 1200)
+    assert totals == sorted(totals, reverse=True)
+    assert max(totals) - min(totals) <= max(sizes) // 2
+    # the same files in any listing order plan the same chunks
+    assert create_batch.plan_chunks(files[::-1], MET, target_bytes=1200) == chunks
+    assert [key for key, _ in chunks] == [
+        f"timestream/chunks/{FOLDER}/awaken/sa1.met_z01.b0/chunk{n}/" for n in (1, 2, 3)
+    ]
+
+
+def test_plan_chunks_keeps_small_jobs_whole():
+    files = files_of([10, 20])
+
+    assert create_batch.plan_chunks(files, MET) == [(MET, files)]
+
+
+def test_chunk_copies_are_reused_and_not_rediscovered(s3, monkeypatch):
+    files = [
+        dict(obj, Key=obj.pop("key"), Size=obj.pop("size"))
+        for obj in stage(s3, MET, [f"f{i}.csv" for i in range(5)], size=100)
+    ]
+    # left in the job folder by an earlier version
+    stage(s3, MET + "chunk1/", ["f0.csv"], size=100)
+    chunks = create_batch.plan_chunks(files, MET, target_bytes=200)
+    assert len(chunks) == 3
+
+    load_keys = create_batch.copy_files_in_chunks(chunks, MET)
+
+    assert load_keys == [key for key, _ in chunks]
+    for key, chunk in chunks:
+        assert sorted(list_keys(s3, key)) == sorted(
+            key + f["Key"].split("/")[-1] for f in chunk
+        )
+    # the copies are neither found again in the job folder nor double counted
+    (job,) = create_batch.discover_jobs(BUCKET, FOLDER)
+    assert sorted(f["Key"] for f in job["files"]) == sorted(f["Key"] for f in files)
+
+    # a re-run copies nothing it already copied or submitted, and clears copies
+    # left by a different plan
+    stage(s3, chunks[1][0], ["stale.csv"])
+    copies = []
+    copy_object = s3.copy_object
+    monkeypatch.setattr(
+        s3,
+        "copy_object",
+        lambda **kwargs: copies.append(kwargs) or copy_object(**kwargs),
+    )
+    s3.delete_object(
+        Bucket=BUCKET, Key=chunks[2][0] + chunks[2][1][0]["Key"].split("/")[-1]
+    )
+    create_batch.copy_files_in_chunks(chunks, MET, submitted={chunks[0][0]})
+
+    assert [c["Key"] for c in copies] == [
+        chunks[2][0] + chunks[2][1][0]["Key"].split("/")[-1]
+    ]
+    assert chunks[1][0] + "stale.csv" not in list_keys(s3, chunks[1][0])
@@ -0,0 +1,148 @@
+"""Tests `download_data_api.EiaDownloader` against a local aiohttp stub of the EIA API.
+
+The stub serves ``TOTAL`` rows in pages and can be told to fail given offsets, so
+the retry, Retry-After and resume paths run without network access or an API key.
+"""
+
+import asyncio
+import os
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pandas as pd
+import pytest
+from aiohttp import web
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "scripts"))
+
+from download_data_api import (  # noqa: E402
+    DEFAULT_ROUTE,
+    EiaDownloader,
+    RetryableError,
+    build_params,
+    retry_after_seconds,
+)
+
+TOTAL = 23
+PAGE_SIZE = 5
+
+
+class StubApi:
+    """Serves ``TOTAL`` rows; ``failures[offset]`` is a list of (status, headers)
+    responses to send for that offset before serving it, or "always"."""
+
+    def __init__(self):
+        self.failures = {}
+        self.requests = Counter()
+
+    async def handle(self, request):
+        assert request.query["api_key"] == "test-key"
+        offset = int(request.query["offset"])
+        length = int(request.query["length"])
+        self.requests[offset] += 1
+        failures = self.failures.get(offset)
+        if failures == "always":
+            return web.Response(status=503)
+        if failures:
+            status, headers = failures.pop(0)
+            return web.Response(status=status, headers=headers)
+        rows = [
+            {"period": f"2018-07-01T{i:02d}", "respondent": "CISO", "value": i}
+            for i in range(offset, min(offset + length, TOTAL))
+        ]
+        return web.json_response({"response": {"total": TOTAL, "data": rows}})
+
+
+@contextmanager
+def serve(api):
+    """Runs the stub on a free local port in a background thread and yields the
+    base URL to pass to the downloader."""
+    loop = asyncio.new_event_loop()
+    app = web.Application()
+    app.router.add_get("/v2/" + DEFAULT_ROUTE, api.handle)
+    runner = web.AppRunner(app)
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    loop.run_until_complete(site.start())
+    port = site._server.sockets[0].getsockname()[1]
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{port}/v2/"
+    finally:
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+
+def make_downloader(base_url, max_retries=3):
+    return EiaDownloader(
+        build_params("2018-07-01T00", "2018-07-02T00", ["CISO"]),
+        "test-key",
+        base_url=base_url,
+        page_size=PAGE_SIZE,
+        max_retries=max_retries,
+        backoff=0,
+    )
+
+
+def read_values(path):
+    return pd.read_csv(path)["value"].tolist()
+
+
+def test_retries_429s_honouring_retry_after(tmp_path):
+    api = StubApi()
+    past = format_datetime(datetime.now(timezone.utc) - timedelta(minutes=1), True)
+    api.failures[5] = [(429, {"Retry-After": "0"}), (429, {"Retry-After": past})]
+    api.failures[15] = [(429, {"Retry-After": "not a delay"}), (500, {})]
+    output = tmp_path / "wind.csv"
+
+    with serve(api) as base_url:
+        rows = make_downloader(base_url).run(str(output))
+
+    assert rows == TOTAL
+    assert read_values(output) == list(range(TOTAL))
+    assert api.requests[5] == 3
+    assert api.requests[15] == 3
+    assert not os.path.exists(f"{output}.parts")
+
+
+def test_persistent_503_fails_then_resumes(tmp_path):
+    api = StubApi()
+    api.failures[10] = "always"
+    output = tmp_path / "wind.csv"
+
+    with serve(api) as base_url:
+        with pytest.raises(RetryableError):
+            make_downloader(base_url, max_retries=2).run(str(output))
+        assert api.requests[10] == 3
+        assert not output.exists()
+        parts = sorted(os.listdir(f"{output}.parts"))
+        assert "offset_0000000010.csv" not in parts
+        assert "offset_0000000020.csv" in parts
+
+        # the API recovers; only the first page (for the row count) and the
+        # missing one are fetched again
+        api.failures.clear()
+        api.requests.clear()
+        rows = make_downloader(base_url).run(str(output))
+
+    assert rows == TOTAL
+    assert read_values(output) == list(range(TOTAL))
+    assert api.requests == Counter({0: 1, 10: 1})
+
+
+def test_retry_after_seconds():
+    assert retry_after_seconds(None) is None
+    assert retry_after_seconds("") is None
+    assert retry_after_seconds("garbage") is None
+    assert retry_after_seconds("2.5") == 2.5
+    assert retry_after_seconds("-1") == 0.0
+    future = datetime.now(timezone.utc) + timedelta(seconds=120)
+    assert 100 < retry_after_seconds(format_datetime(future, True)) <= 120
+    assert retry_after_seconds("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
@@ -0,0 +1,303 @@
+"""Tests `metadata_export` against a fake ``timestream-query`` client.
+
+The fake runs the exporter's SQL on an in-memory sqlite copy of the table (with
+``bin(time, 1h)`` and ``arbitrary`` added) and returns the result as Timestream
+query pages, a few rows at a time so frames and pages split timestamps.
+"""
+
+import os
+import re
+import sqlite3
+import subprocess
+import sys
+import threading
+
+import pandas as pd
+import pytest
+from pandas.api.types import is_numeric_dtype
+
+SCRIPTS = os.path.join(os.path.dirname(__file__), os.pardir, "scripts")
+sys.path.insert(0, SCRIPTS)
+
+import metadata_export  # noqa: E402
+
+PAGE_ROWS = 7
+
+
+class FakeTimestream:
+    """A ``timestream-query`` client serving ``tables`` ({"db.table": DataFrame})."""
+
+    def __init__(self, tables, page_rows=PAGE_ROWS):
+        self.page_rows = page_rows
+        self.queries = []
+        self.types = {}
+        # windows are queried from worker threads
+        self.db = sqlite3.connect(":memory:", check_same_thread=False)
+        self.lock = threading.Lock()
+        self.db.create_function("bin", 2, _bin)
+        self.db.create_aggregate("arbitrary", 1, _Arbitrary)
+        for name, df in tables.items():
+            database, table = name.split(".")
+            if database not in self._databases():
+                self.db.execute(f"ATTACH ':memory:' AS {database}")
+            df = df.assign(time=df["time"].dt.strftime("%Y-%m-%d %H:%M:%S"))
+            # pandas only writes to the main database
+            df.to_sql("staged", self.db, index=False)
+            self.db.execute(f"CREATE TABLE {name} AS SELECT * FROM staged")
+            self.db.execute("DROP TABLE staged")
+            self.types.update(
+                {
+                    column: "DOUBLE" if is_numeric_dtype(dtype) else "VARCHAR"
+                    for column, dtype in df.dtypes.items()
+                }
+            )
+
+    def _databases(self):
+        return [row[1] for row in self.db.execute("PRAGMA database_list")]
+
+    def get_paginator(self, name):
+        assert name == "query"
+        return self
+
+    def paginate(self, QueryString):
+        self.queries.append(QueryString)
+        sql = re.sub(r"bin\((\w+), (\w+)\)", r"bin(\1, '\2')", QueryString)
+        with self.lock:
+            cursor = self.db.execute(sql)
+            names = [column[0] for column in cursor.description]
+            rows = cursor.fetchall()
+        column_info = [
+            {"Name": name, "Type": {"ScalarType": self._type(name)}} for name in names
+        ]
+        status = {
+            "ProgressPercentage": 100.0,
+            "CumulativeBytesScanned": 0,
+            "CumulativeBytesMetered": 0,
+        }
+        for start in range(0, max(len(rows), 1), self.page_rows):
+            yield {
+                "ColumnInfo": column_info,
+                "QueryStatus": status,
+                "Rows": [
+                    {"Data": [self._datum(n, v) for n, v in zip(names, row)]}
+                    for row in rows[start : start + self.page_rows]
+                ],
+            }
+
+    def _type(self, name):
+        return "TIMESTAMP" if name == "time" else self.types.get(name, "DOUBLE")
+
+    def _datum(self, name, value):
+        if value is None:
+            return {"NullValue": True}
+        if name == "time":
+            value += ".000000000"
+        return {"ScalarValue": str(value)}
+
+
+def _bin(time, interval):
+    return str(pd.Timestamp(time).floor(interval))
+
+
+class _Arbitrary:
+    def __init__(self):
+        self.value = None
+
+    def step(self, value):
+        if self.value is None:
+            self.value = value
+
+    def finalize(self):
+        return self.value
+
+
+def eia930_table(bas=("CISO", "ERCO"), start="2018-01-01", end="2018-03-01"):
+    """Hourly demand and wind rows; ERCO has no wind in January."""
+    rows = []
+    for time in pd.date_range(start, end, freq="1h", inclusive="left"):
+        for i, ba in enumerate(bas):
+            rows.append((ba, time, "demand", 1000.0 + i + time.hour))
+            if not (ba == "ERCO" and time.month == 1):
+                rows.append((ba, time, "wind", 10.0 * i + time.day))
+    return pd.DataFrame(rows, columns=["ba_id", "time", "measure_name", "megawatts"])
+
+
+def ba_5min_table():
+    times = pd.date_range("2020-01-01", "2020-01-03", freq="5min", inclusive="left")
+    frames = []
+    for ba in ("CISO", "BPAT"):
+        frames.append(
+            pd.DataFrame(
+                {
+                    "ba_id": ba,
+                    "time": times,
+                    "measure_name": "megawatts",
+                    "load_mw": [20000.123456789 + i for i in range(len(times))],
+                    "wind_mw": [float(i % 50) for i in range(len(times))],
+                }
+            )
+        )
+    return pd.concat(frames, ignore_index=True)
+
+
+def load_spec(name, **overrides):
+    spec = metadata_export.load_spec(metadata_export.resolve_spec_path(name))
+    spec.update(overrides)
+    return spec
+
+
+def read_export(path):
+    with open(path, encoding="utf-8") as f:
+        count = int(f.readline().split("=")[1])
+    headers, _ = metadata_export.read_header(path)
+    return headers, pd.read_csv(path, skiprows=count)
+
+
+def test_load_spec_fills_defaults_and_checks_keys(tmp_path):
+    spec = load_spec("eia930_hourly")
+    assert spec["name"] == "eia930_hourly"
+    assert spec["time_column"] == "time"
+    assert spec["drop"] == []
+
+    path = tmp_path / "broken.yaml"
+    path.write_text("database: windpower\ntable: t\n")
+    with pytest.raises(ValueError, match="missing 'start'"):
+        metadata_export.load_spec(str(path))
+
+
+def test_eia930_hourly_pivots_server_side_into_one_file_per_ba(tmp_path):
+    client = FakeTimestream({"windpower.eia_hourly_data": eia930_table()})
+    spec = load_spec("eia930_hourly", end="2018-03-01")
+
+    written = metadata_export.export(client, spec, str(tmp_path))
+
+    # the measures are found first, then each month is binned and pivoted
+    assert client.queries[0].startswith(
+        "SELECT DISTINCT measure_name FROM windpower.eia_hourly_data "
+        "WHERE time >= '2018-01-01' AND time < '2018-03-01' AND (ba_id IN ("
+    )
+    windows = client.queries[1:]
+    assert len(windows) == 2
+    assert windows[0].startswith(
+        "SELECT ba_id, bin(time, 1h) AS time, "
+        "avg(CASE WHEN measure_name = 'demand' THEN megawatts END) AS \"load_mw\", "
+        "avg(CASE WHEN measure_name = 'wind' THEN megawatts END) AS \"wind_mw\" "
+        "FROM windpower.eia_hourly_data "
+        "WHERE time >= '2018-01-01 00:00:00' AND time < '2018-02-01 00:00:00' "
+    )
+    assert windows[0].endswith(
+        "GROUP BY ba_id, bin(time, 1h) ORDER BY bin(time, 1h) ASC"
+    )
+
+    assert sorted(os.path.basename(path) for path in written) == [
+        "eia930.hr.2018.ciso.a1.csv",
+        "eia930.hr.2018.erco.a1.csv",
+    ]
+    headers, df = read_export(tmp_path / "eia930.hr.2018.erco.a1.csv")
+    assert list(headers) == list(spec["headers"])
+    assert headers["BalancingAuthority"] == "ERCO"
+    assert headers["MeasurementValue"] == "Megawatts"
+    assert list(df.columns) == ["time", "load_mw", "wind_mw"]
+    assert len(df) == 59 * 24
+    assert df["time"].is_monotonic_increasing and df["time"].is_unique
+    assert df.loc[0].tolist() == ["2018-01-01 00:00:00", 1001.0, -9999.0]
+    assert (df["wind_mw"] == -9999).sum() == 31 * 24
+
+
+def test_client_side_pivot_matches_server_side(tmp_path):
+    client = FakeTimestream(
+        {"windpower.eia_hourly_data": eia930_table()}, page_rows=500
+    )
+    spec = load_spec("eia930_hourly", end="2018-03-01")
+    for name in ("server", "client"):
+        (tmp_path / name).mkdir()
+    metadata_export.export(client, spec, str(tmp_path / "server"))
+
+    client.queries.clear()
+    unaggregated = dict(spec, aggregate=None, windows=None)
+    metadata_export.export(client, unaggregated, str(tmp_path / "client"))
+
+    assert client.queries[1].endswith("ORDER BY time ASC")
+    for name in ("eia930.hr.2018.ciso.a1.csv", "eia930.hr.2018.erco.a1.csv"):
+        server = read_export(tmp_path / "server" / name)[1]
+        client_side = read_export(tmp_path / "client" / name)[1]
+        pd.testing.assert_frame_equal(server, client_side)
+
+
+def test_ba_5min_filters_rounds_and_takes_units_from_the_data(tmp_path):
+    client = FakeTimestream({"windpower.testtable": ba_5min_table()})
+    spec = load_spec("ba_5min", end="2020-01-02")
+
+    written = metadata_export.export(client, spec, str(tmp_path))
+
+    assert client.queries == [
+        "SELECT * FROM windpower.testtable "
+        "WHERE time >= '2020-01-01 00:00:00' AND time < '2020-01-02 00:00:00' "
+        "AND (ba_id = 'CISO') ORDER BY time ASC"
+    ]
+    assert [os.path.basename(path) for path in written] == ["ba.5m.a1.2020.ciso.csv"]
+    headers, df = read_export(written[0])
+    assert headers["BalancingAuthority"] == "CISO"
+    assert headers["MeasurementValue"] == "Megawatts"
+    assert list(df.columns) == ["time", "load_mw", "wind_mw"]
+    assert len(df) == 24 * 12
+    assert df["load_mw"].iloc[1] == 20001.12345679
+
+
+def test_incremental_appends_and_backfills_partitions_without_a_watermark(tmp_path):
+    table = eia930_table(bas=("CISO", "ERCO", "BPAT"), end="2018-04-01")
+    client = FakeTimestream({"windpower.eia_hourly_data": table})
+    spec = load_spec("eia930_hourly", end="2018-03-01", where="ba_id != 'BPAT'")
+    metadata_export.export(client, spec, str(tmp_path), incremental=True)
+    ciso = tmp_path / "eia930.hr.2018.ciso.a1.csv"
+    erco = tmp_path / "eia930.hr.2018.erco.a1.csv"
+    bpat = tmp_path / "eia930.hr.2018.bpat.a1.csv"
+    assert not bpat.exists()
+
+    # BPAT is added to the spec and the ERCO export is lost
+    os.remove(erco)
+    client.queries.clear()
+    spec = load_spec("eia930_hourly", end="2018-04-01", where=None)
+    written = metadata_export.export(client, spec, str(tmp_path), incremental=True)
+
+    assert sorted(written) == sorted(map(str, [ciso, erco, bpat]))
+    assert "time >= '2018-02-28 23:00:00'" in client.queries[0]
+    backfill = [
+        query for query in client.queries if "ba_id IN ('BPAT', 'ERCO')" in query
+    ]
+    assert backfill and "time >= '2018-01-01" in backfill[0]
+    for path in (ciso, erco, bpat):
+        _, df = read_export(path)
+        assert len(df) == 90 * 24, path
+        assert df["time"].is_unique and df["time"].is_monotonic_increasing
+    state = metadata_export.ExportState(
+        str(tmp_path / ".eia930_hourly.state.json"), "windpower.eia_hourly_data"
+    )
+    assert state.watermarks == dict.fromkeys(
+        ["BPAT", "CISO", "ERCO"], "2018-03-31 23:00:00"
+    )
+
+    # nothing new: nothing is written and the watermarks stay
+    client.queries.clear()
+    assert metadata_export.export(client, spec, str(tmp_path), incremental=True) == []
+    assert not any(
+        "ba_id IN ('" in query and "2018-01-01" in query for query in client.queries
+    )
+
+
+def test_aggregate_rejects_specs_without_columns_to_aggregate():
+    result = subprocess.run(
+        [
+            sys.executable,
+            os.path.join(SCRIPTS, "metadata_export.py"),
+            "eia930_hourly",
+            "ba_5min",
+            "--aggregate",
+            "1h",
+        ],
+        capture_output=True,
+        text=True,
+    )
+    assert result.returncode == 2
+    assert "Export ba_5min can't be aggregated" in result.stderr
+    assert "eia930_hourly" not in result.stderr.splitlines()[-1]
@@ -0,0 +1,47 @@
+"""Tests when `query_cache.QueryCache` entries expire."""
+
+import json
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "scripts"))
+
+from query_cache import QueryCache  # noqa: E402
+
+QUERY = "SELECT * FROM windpower.t WHERE time >= '{}' AND time < '{}'"
+
+
+def window_ending(seconds_ago):
+    end = pd.Timestamp(time.time() - seconds_ago, unit="s").floor("s")
+    return QUERY.format(end - pd.Timedelta("1h"), end)
+
+
+def expires(cache, query):
+    cache.put(query, pd.DataFrame({"x": [1.0]}))
+    meta_path = cache._paths(cache.key(query))[1]
+    return json.loads(meta_path.read_text(encoding="utf-8"))["expires"]
+
+
+def test_windows_within_the_ingest_lag_expire(tmp_path):
+    cache = QueryCache(tmp_path, ttl=60, closed_after=2 * 3600)
+
+    # ended an hour ago: the next hourly load may still add rows to it
+    assert expires(cache, window_ending(3600)) is not None
+    assert expires(cache, window_ending(-3600)) is not None
+    assert expires(cache, window_ending(3 * 3600)) is None
+    assert expires(cache, "SELECT count(*) FROM windpower.t") is not None
+
+    cache = QueryCache(tmp_path, ttl=60, closed_after=0)
+    assert expires(cache, window_ending(60)) is None
+
+
+def test_expired_entries_miss(tmp_path):
+    cache = QueryCache(tmp_path, ttl=-1)
+    query = window_ending(0)
+    cache.put(query, pd.DataFrame({"x": [1.0]}))
+
+    assert cache.get(query) is None
+    assert not list(tmp_path.iterdir())
@@ -0,0 +1,33 @@
+"""Tests `utils.timestamps.local_to_utc` around daylight saving changes."""
+
+import pandas as pd
+import pytest
+
+from utils.timestamps import local_to_utc, to_epoch
+
+# clocks sprang forward at 02:00 and fell back at 02:00 in 2020
+SPRING = ["2020-03-08 01:00", "2020-03-08 02:30", "2020-03-08 03:00"]
+FALL = ["2020-11-01 00:00", "2020-11-01 01:00", "2020-11-01 01:00", "2020-11-01 02:00"]
+
+
+def test_matches_tz_localize():
+    times = pd.Series(pd.to_datetime(FALL))
+    expected = times.dt.tz_localize("US/Pacific", ambiguous="infer")
+
+    result = local_to_utc(FALL, "US/Pacific")
+
+    pd.testing.assert_series_equal(result, expected.dt.tz_convert("UTC"))
+    assert to_epoch(result).tolist() == [
+        1604214000,
+        1604217600,
+        1604221200,
+        1604224800,
+    ]
+
+
+def test_skipped_times_raise_unless_shifting_is_asked_for():
+    with pytest.raises(ValueError, match="2020-03-08 02:30:00"):
+        local_to_utc(SPRING, "US/Pacific")
+
+    result = local_to_utc(SPRING, "US/Pacific", nonexistent="shift_forward")
+    assert result.dt.strftime("%H:%M").tolist() == ["09:00", "10:00", "10:00"]
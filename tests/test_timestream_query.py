@@ -0,0 +1,166 @@
+"""Tests `timestream_query.ColumnarDecoder` on canned Timestream ``Query`` pages."""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "scripts"))
+
+from timestream_query import ColumnarDecoder, decode_page, run_query  # noqa: E402
+
+NULL = {"NullValue": True}
+
+
+def scalar(value):
+    return {"ScalarValue": value}
+
+
+def scalar_type(name):
+    return {"ScalarType": name}
+
+
+COLUMN_INFO = [
+    {"Name": "location", "Type": scalar_type("VARCHAR")},
+    {"Name": "time", "Type": scalar_type("TIMESTAMP")},
+    {"Name": "wind_speed", "Type": scalar_type("DOUBLE")},
+    {"Name": "samples", "Type": scalar_type("BIGINT")},
+    {"Name": "qc", "Type": scalar_type("BIGINT")},
+    {"Name": "valid", "Type": scalar_type("BOOLEAN")},
+    {"Name": "flagged", "Type": scalar_type("BOOLEAN")},
+    {
+        "Name": "heights",
+        "Type": {"ArrayColumnInfo": {"Type": scalar_type("DOUBLE")}},
+    },
+    {
+        "Name": "site",
+        "Type": {
+            "RowColumnInfo": [
+                {"Name": "name", "Type": scalar_type("VARCHAR")},
+                {"Name": "elevation", "Type": scalar_type("DOUBLE")},
+            ]
+        },
+    },
+    {
+        "Name": "series",
+        "Type": {"TimeSeriesMeasureValueColumnInfo": {"Type": scalar_type("DOUBLE")}},
+    },
+]
+
+
+def page(rows, column_info=COLUMN_INFO):
+    return {
+        "QueryId": "query-1",
+        "ColumnInfo": column_info,
+        "Rows": [{"Data": row} for row in rows],
+        "QueryStatus": {
+            "ProgressPercentage": 100.0,
+            "CumulativeBytesScanned": 1024,
+            "CumulativeBytesMetered": 10485760,
+        },
+    }
+
+
+FIRST = [
+    scalar("sa1"),
+    scalar("2022-10-01 19:00:00.000000000"),
+    scalar("4.25"),
+    scalar("60"),
+    scalar("1"),
+    scalar("true"),
+    scalar("false"),
+    {"ArrayValue": [scalar("10.0"), NULL]},
+    {"RowValue": {"Data": [scalar("Site 1"), scalar("312.5")]}},
+    {
+        "TimeSeriesValue": [
+            {"Time": "2022-10-01 19:00:00.000000000", "Value": scalar("1.5")},
+            {"Time": "2022-10-01 19:00:01.000000000", "Value": NULL},
+        ]
+    },
+]
+SECOND = [
+    scalar("sa2"),
+    scalar("2022-10-01 19:00:00.500000000"),
+    NULL,
+    scalar("9007199254740993"),  # above 2**53: must not go through a float
+    NULL,
+    scalar("false"),
+    NULL,
+    NULL,
+    NULL,
+    NULL,
+]
+
+
+def test_decodes_every_type_across_pages():
+    decoder = ColumnarDecoder()
+    decoder.add_page(page([FIRST]))
+    decoder.add_page(page([]))  # pages may be empty while the query runs
+    decoder.add_page(page([SECOND]))
+
+    assert len(decoder) == 2
+    df = decoder.to_frame()
+
+    assert list(df.columns) == [info["Name"] for info in COLUMN_INFO]
+    assert df["location"].tolist() == ["sa1", "sa2"]
+    assert df["time"].dtype == "datetime64[ns]"
+    assert df["time"].tolist() == [
+        pd.Timestamp("2022-10-01 19:00:00"),
+        pd.Timestamp("2022-10-01 19:00:00.5"),
+    ]
+    assert df["wind_speed"].dtype == np.float64
+    assert df["wind_speed"].iloc[0] == 4.25 and np.isnan(df["wind_speed"].iloc[1])
+    assert df["samples"].dtype == np.int64
+    assert df["samples"].tolist() == [60, 9007199254740993]
+    assert df["qc"].dtype == "Int64"
+    assert df["qc"].iloc[0] == 1 and df["qc"].iloc[1] is pd.NA
+    assert df["valid"].dtype == bool and df["valid"].tolist() == [True, False]
+    assert df["flagged"].dtype == "boolean"
+    assert df["flagged"].iloc[0] == False  # noqa: E712
+    assert df["flagged"].iloc[1] is pd.NA
+    assert df["heights"].tolist() == [["10.0", None], None]
+    assert df["site"].tolist() == [{"name": "Site 1", "elevation": "312.5"}, None]
+    assert df["series"].iloc[0] == [
+        {"time": "2022-10-01 19:00:00.000000000", "value": "1.5"},
+        {"time": "2022-10-01 19:00:01.000000000", "value": None},
+    ]
+    assert df["series"].iloc[1] is None
+
+
+def test_empty_result_keeps_the_columns():
+    df = decode_page(page([]))
+
+    assert df.empty
+    assert list(df.columns) == [info["Name"] for info in COLUMN_INFO]
+
+
+def test_unsupported_nested_type_is_rejected():
+    column_info = [{"Name": "x", "Type": {"UnknownColumnInfo": {}}}]
+
+    with pytest.raises(ValueError, match="Unsupported Timestream column type"):
+        decode_page(page([[{"Something": 1}]], column_info))
+
+
+class CannedClient:
+    def __init__(self, pages):
+        self.pages = pages
+
+    def get_paginator(self, name):
+        assert name == "query"
+        return self
+
+    def paginate(self, QueryString):
+        yield from self.pages
+
+
+def test_run_query_decodes_every_page():
+    client = CannedClient([page([FIRST]), page([SECOND])])
+
+    df = run_query(client, "SELECT * FROM db.t", stats=None)
+    table = run_query(client, "SELECT * FROM db.t", output="arrow", stats=None)
+
+    assert df["location"].tolist() == ["sa1", "sa2"]
+    assert table.num_rows == 2
+    assert table.column_names == df.columns.tolist()
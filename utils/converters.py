@@ -1,9 +1,12 @@
+import os
 from pathlib import Path
 from typing import Any, List, Optional, Union
 
 import xarray as xr
 import pandas as pd
-import numpy as np
+
+from .metrics import stage_timer
+from .timestamps import datetime64_to_epoch_ms
 
 
 def from_netcdf_to_csv(
@@ -19,36 +22,41 @@ def from_netcdf_to_csv(
     if directory is not None:
         target = Path(directory) / Path(filepath).name
 
-    ds = xr.open_dataset(filepath)
-
-    ds["location"] = location
-    ds["measure_name"] = "data"
-
-    new_variables = []
-    i = 0
-    for variable in variables:
-        if variable in ds.coords:
-            new_variables.append(variable)
-            i += 1
-        else:
-            break
-    new_variables.append("location")
-    new_variables.append("measure_name")
-    new_variables.extend(variables[i:])
-
-    ds = ds[new_variables]
-
-    ds["time"] = (
-        ds["time"].values.astype("datetime64[ms]")
-        - np.datetime64("1970-01-01T00:00:00")
-    ).astype(np.int64)
-
-    output_filepath, _ = to_csv(
-        ds,
-        filepath=target,
-        metadata=False,
-        to_csv_kwargs=dict(date_format="%Y-%m-%d %H:%M:%S.%f"),
-    )
+    timer = stage_timer(kwargs)
+
+    with timer("read", bytes=os.path.getsize(filepath)) as stage:
+        ds = xr.open_dataset(filepath)
+
+        ds["location"] = location
+        ds["measure_name"] = "data"
+
+        new_variables = []
+        i = 0
+        for variable in variables:
+            if variable in ds.coords:
+                new_variables.append(variable)
+                i += 1
+            else:
+                break
+        new_variables.append("location")
+        new_variables.append("measure_name")
+        new_variables.extend(variables[i:])
+
+        # load here so the read is timed as the read rather than inside to_csv
+        ds = ds[new_variables].load()
+        stage.rows = ds.sizes["time"]
+
+    with timer("transform", rows=stage.rows):
+        ds["time"] = datetime64_to_epoch_ms(ds["time"].values)
+
+    with timer("write", rows=stage.rows) as stage:
+        output_filepath, _ = to_csv(
+            ds,
+            filepath=target,
+            metadata=False,
+            to_csv_kwargs=dict(date_format="%Y-%m-%d %H:%M:%S.%f"),
+        )
+        stage.bytes = os.path.getsize(output_filepath)
 
     return output_filepath
 
@@ -64,15 +72,21 @@ def from_csv_to_csv(
     if directory is not None:
         target = Path(directory) / Path(filepath).name
 
-    df = pd.read_csv(filepath)
+    timer = stage_timer(kwargs)
+
+    with timer("read", bytes=os.path.getsize(filepath)) as stage:
+        df = pd.read_csv(filepath)
+        stage.rows = len(df)
 
-    df["location"] = location
+    with timer("transform", rows=len(df)):
+        df["location"] = location
 
-    df = df[variables + ["location", "measure_name"]]
+        df = df[variables + ["location", "measure_name"]]
 
-    df.to_csv(
-        filepath=target,
-        date_format="%Y-%m-%d %H:%M:%S.%f",
-    )
+    with timer("write", rows=len(df)):
+        df.to_csv(
+            filepath=target,
+            date_format="%Y-%m-%d %H:%M:%S.%f",
+        )
 
     return Path(target)
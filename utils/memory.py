@@ -0,0 +1,106 @@
+"""Peak memory of a block of code, used to size ingest workers.
+
+Two methods are available:
+
+- "rss": the resident set size high-water mark of the process. It sees everything,
+  including allocations made by the NetCDF/HDF5 C libraries, but is Linux only: the
+  kernel's high-water mark (VmHWM) is reset through ``/proc/self/clear_refs`` before
+  the block and read from ``/proc/self/status`` after it.
+- "tracemalloc": the peak of Python and numpy allocations, on any platform, at the
+  cost of slowing the block down while it is traced.
+
+In both cases `PeakMemory.peak` is the high-water mark above what was already in use
+when the block started, in bytes. A `PeakMemory` can be reused for one block after
+another, but not for nested or concurrent blocks.
+"""
+
+from __future__ import annotations
+
+import tracemalloc
+from abc import ABC, abstractmethod
+from typing import Optional
+
+METHODS = ("rss", "tracemalloc")
+
+_CLEAR_REFS = "/proc/self/clear_refs"
+_STATUS = "/proc/self/status"
+
+
+class PeakMemory(ABC):
+    """Measures the peak memory of a ``with`` block into `peak`."""
+
+    method = ""
+
+    def __init__(self) -> None:
+        self.peak: Optional[int] = None
+
+    @abstractmethod
+    def __enter__(self) -> "PeakMemory": ...
+
+    @abstractmethod
+    def __exit__(self, *exc) -> None: ...
+
+
+class RssPeak(PeakMemory):
+    method = "rss"
+
+    def __enter__(self) -> "RssPeak":
+        # "5" resets the peak RSS to the current RSS (Linux 4.0+)
+        with open(_CLEAR_REFS, "w") as f:
+            f.write("5")
+        self._base = _status_bytes("VmRSS")
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.peak = max(_status_bytes("VmHWM") - self._base, 0)
+
+
+class TracemallocPeak(PeakMemory):
+    method = "tracemalloc"
+
+    def __enter__(self) -> "TracemallocPeak":
+        self._started = not tracemalloc.is_tracing()
+        if self._started:
+            tracemalloc.start()
+        elif hasattr(tracemalloc, "reset_peak"):  # Python 3.9+
+            tracemalloc.reset_peak()
+        self._base = tracemalloc.get_traced_memory()[0]
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.peak = max(tracemalloc.get_traced_memory()[1] - self._base, 0)
+        if self._started:
+            tracemalloc.stop()
+
+
+def _status_bytes(field: str) -> int:
+    with open(_STATUS, encoding="ascii") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) * 1024
+    raise OSError(f"{field} not found in {_STATUS}")
+
+
+def peak_memory(method: str) -> PeakMemory:
+    """Returns a reusable context manager measuring the peak memory of its block.
+
+    Raises:
+        ValueError: If ``method`` is not one of `METHODS`, or is "rss" on a system
+            without a resettable RSS high-water mark.
+    """
+    if method == "tracemalloc":
+        return TracemallocPeak()
+    elif method == "rss":
+        try:
+            with open(_CLEAR_REFS, "w") as f:
+                f.write("5")
+            _status_bytes("VmHWM")
+        except OSError as e:
+            raise ValueError(
+                f"Peak RSS tracking needs a writable {_CLEAR_REFS} (Linux); use"
+                " 'tracemalloc' instead"
+            ) from e
+        return RssPeak()
+    raise ValueError(
+        f"Unknown memory profiling method '{method}', use one of {METHODS}"
+    )
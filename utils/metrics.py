@@ -0,0 +1,301 @@
+"""Per-stage timing and per-input peak memory of pipeline runs.
+
+`RunMetrics` collects one `StageMetrics` per timed stage (config load, converter
+read/transform/write, upload, manifest). Each finished stage is logged as a
+``Stage metrics: {...}`` JSON line with the record attached as ``extra["metrics"]``,
+and `RunMetrics.summary` aggregates the stages per pipeline and per input.
+
+With memory profiling switched on, each converter call is also recorded as a
+`MemoryMetrics`, logged as a ``Memory metrics: {...}`` line, and `RunMetrics.report`
+lists the inputs with the highest peaks.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Optional, Union
+
+from .memory import peak_memory
+
+logger = logging.getLogger(__name__)
+
+StageTimer = Callable[..., ContextManager["StageMetrics"]]
+
+
+class StageMetrics:
+    """Timing and volume of one stage of a pipeline run.
+
+    ``rows`` and ``bytes`` may be set inside the timed block, once they are known.
+    """
+
+    def __init__(
+        self,
+        stage: str,
+        pipeline: Optional[str] = None,
+        input: Optional[str] = None,
+        rows: Optional[int] = None,
+        bytes: Optional[int] = None,
+    ) -> None:
+        self.stage = stage
+        self.pipeline = pipeline
+        self.input = input
+        self.rows = rows
+        self.bytes = bytes
+        self.failed = False
+        self.seconds: Optional[float] = None
+        self._start = time.perf_counter()
+
+    def finish(self) -> None:
+        if self.seconds is None:
+            self.seconds = time.perf_counter() - self._start
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "stage": self.stage,
+            "pipeline": self.pipeline,
+            "input": self.input,
+            "seconds": self.seconds,
+            "rows": self.rows,
+            "bytes": self.bytes,
+            "failed": self.failed,
+            **_throughput(self.seconds, self.rows, self.bytes),
+        }
+
+
+class MemoryMetrics:
+    """Peak memory of one converter call, and its ratio to the input file size."""
+
+    def __init__(
+        self,
+        method: str,
+        pipeline: Optional[str] = None,
+        input: Optional[str] = None,
+        input_bytes: Optional[int] = None,
+    ) -> None:
+        self.method = method
+        self.pipeline = pipeline
+        self.input = input
+        self.input_bytes = input_bytes
+        self.peak_bytes: Optional[int] = None
+        self.failed = False
+
+    @property
+    def ratio(self) -> Optional[float]:
+        if self.peak_bytes is None or not self.input_bytes:
+            return None
+        return round(self.peak_bytes / self.input_bytes, 2)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "pipeline": self.pipeline,
+            "input": self.input,
+            "method": self.method,
+            "input_bytes": self.input_bytes,
+            "peak_bytes": self.peak_bytes,
+            "ratio": self.ratio,
+            "failed": self.failed,
+        }
+
+
+def _throughput(
+    seconds: Optional[float], rows: Optional[int], bytes: Optional[int]
+) -> Dict[str, Optional[float]]:
+    def rate(count):
+        if count is None or not seconds:
+            return None
+        return round(count / seconds, 1)
+
+    return {"rows_per_s": rate(rows), "bytes_per_s": rate(bytes)}
+
+
+class RunMetrics:
+    """Collects `StageMetrics` (and `MemoryMetrics`) for a dispatch or pipeline run.
+
+    Args:
+        memory (str, optional): Profile the peak memory of each converter call with
+            this method, "rss" or "tracemalloc" (see `utils.memory`). Off by default.
+        worst (int): How many of the highest memory peaks `report` lists.
+    """
+
+    def __init__(self, memory: Optional[str] = None, worst: int = 10) -> None:
+        self.stages: List[StageMetrics] = []
+        self.memory_records: List[MemoryMetrics] = []
+        self.worst = worst
+        self._lock = threading.Lock()
+        # fails fast on an unknown or unavailable method
+        self._peak = peak_memory(memory) if memory is not None else None
+
+    @contextmanager
+    def stage(
+        self,
+        stage: str,
+        pipeline: Optional[str] = None,
+        input: Optional[str] = None,
+        rows: Optional[int] = None,
+        bytes: Optional[int] = None,
+    ) -> Iterator[StageMetrics]:
+        """Times the enclosed block as ``stage`` and records it, even if it raises."""
+        metrics = StageMetrics(stage, pipeline, input, rows, bytes)
+        try:
+            yield metrics
+        except BaseException:
+            metrics.failed = True
+            raise
+        finally:
+            self.record(metrics)
+
+    def timer(
+        self, pipeline: Optional[str] = None, input: Optional[str] = None
+    ) -> StageTimer:
+        """Returns `stage` with the pipeline and input filled in, for converters."""
+
+        def stage(name: str, **counts: Optional[int]) -> ContextManager[StageMetrics]:
+            return self.stage(name, pipeline=pipeline, input=input, **counts)
+
+        return stage
+
+    @contextmanager
+    def memory(
+        self, pipeline: Optional[str] = None, input: Optional[str] = None
+    ) -> Iterator[Optional[MemoryMetrics]]:
+        """Records the peak memory of the enclosed block if profiling is on."""
+        if self._peak is None:
+            yield None
+            return
+        try:
+            input_bytes: Optional[int] = os.path.getsize(input) if input else None
+        except OSError:
+            input_bytes = None
+        metrics = MemoryMetrics(self._peak.method, pipeline, input, input_bytes)
+        try:
+            with self._peak:
+                yield metrics
+        except BaseException:
+            metrics.failed = True
+            raise
+        finally:
+            metrics.peak_bytes = self._peak.peak
+            self.record_memory(metrics)
+
+    def record_memory(self, metrics: MemoryMetrics) -> None:
+        with self._lock:
+            self.memory_records.append(metrics)
+        record = metrics.to_dict()
+        logger.info("Memory metrics: %s", json.dumps(record), extra={"metrics": record})
+
+    def record(self, metrics: StageMetrics) -> None:
+        metrics.finish()
+        with self._lock:
+            self.stages.append(metrics)
+        record = metrics.to_dict()
+        logger.info("Stage metrics: %s", json.dumps(record), extra={"metrics": record})
+
+    def summary(self) -> Dict[str, Any]:
+        """Returns the stage totals per pipeline and per input, and overall.
+
+        The overall rows and bytes are those uploaded, so its throughput is that of
+        the run end to end.
+        """
+        stages = [metrics.to_dict() for metrics in self.stages]
+        by_pipeline: Dict[tuple, List[dict]] = defaultdict(list)
+        by_input: Dict[tuple, List[dict]] = defaultdict(list)
+        for record in stages:
+            by_pipeline[(record["pipeline"], record["stage"])].append(record)
+            if record["input"] is not None:
+                by_input[(record["input"], record["stage"])].append(record)
+        return {
+            "pipelines": [
+                dict(pipeline=pipeline, stage=stage, **_totals(records))
+                for (pipeline, stage), records in by_pipeline.items()
+            ],
+            "inputs": [
+                dict(input=input, stage=stage, **_totals(records))
+                for (input, stage), records in by_input.items()
+            ],
+            "totals": _run_totals(stages),
+            "stages": stages,
+            "memory": sorted(
+                (metrics.to_dict() for metrics in self.memory_records),
+                key=lambda record: record["peak_bytes"] or 0,
+                reverse=True,
+            ),
+        }
+
+    def report(self) -> Dict[str, Any]:
+        """Logs the per-pipeline stage totals, slowest first, and the highest memory
+        peaks, and returns the summary."""
+        summary = self.summary()
+        for totals in sorted(
+            summary["pipelines"], key=lambda t: t["seconds"], reverse=True
+        ):
+            logger.info(
+                "Stage summary: %s", json.dumps(totals), extra={"metrics": totals}
+            )
+        totals = summary["totals"]
+        logger.info("Run summary: %s", json.dumps(totals), extra={"metrics": totals})
+        worst = summary["memory"][: self.worst]
+        if worst:
+            logger.info("Highest peak memory of %s inputs:", len(summary["memory"]))
+        for record in worst:
+            ratio = record["ratio"]
+            logger.info(
+                "  %9.1f MiB (%s x input size) %s %s",
+                (record["peak_bytes"] or 0) / 2**20,
+                "?" if ratio is None else f"{ratio:.1f}",
+                record["pipeline"],
+                record["input"],
+                extra={"metrics": record},
+            )
+        return summary
+
+    def write(self, path: Union[Path, str]) -> None:
+        """Writes the summary, including every stage record, as JSON."""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, indent=2)
+            f.write("\n")
+
+
+def _totals(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    seconds = sum(record["seconds"] or 0 for record in records)
+    totals: Dict[str, Any] = {"count": len(records), "seconds": round(seconds, 6)}
+    totals["failed"] = sum(record["failed"] for record in records)
+    for key in ("rows", "bytes"):
+        values = [record[key] for record in records if record[key] is not None]
+        totals[key] = sum(values) if values else None
+    totals.update(_throughput(seconds, totals["rows"], totals["bytes"]))
+    return totals
+
+
+def _run_totals(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    uploads = _totals([record for record in records if record["stage"] == "upload"])
+    seconds = round(sum(record["seconds"] or 0 for record in records), 6)
+    totals: Dict[str, Any] = {
+        "stages": len(records),
+        "inputs": len({record["input"] for record in records} - {None}),
+        "seconds": seconds,
+        "failed": sum(record["failed"] for record in records),
+        "rows": uploads["rows"],
+        "bytes": uploads["bytes"],
+    }
+    totals.update(_throughput(seconds, totals["rows"], totals["bytes"]))
+    return totals
+
+
+@contextmanager
+def _untimed(stage: str, **counts: Optional[int]) -> Iterator[StageMetrics]:
+    yield StageMetrics(stage, **counts)
+
+
+def stage_timer(kwargs: Dict[str, Any]) -> StageTimer:
+    """Returns the stage timer passed to a converter as ``timer``, or a no-op one.
+
+    Converters call it as ``with timer("read", bytes=size) as stage:``.
+    """
+    return kwargs.get("timer") or _untimed
@@ -1,8 +1,9 @@
 import logging
 import re
 from pathlib import Path
-from typing import Dict, List, Pattern
+from typing import Dict, List, Optional, Pattern, Union
 
+from .metrics import RunMetrics
 from .timestream import TimestreamPipeline, read_yaml
 
 logger = logging.getLogger(__name__)
@@ -17,7 +18,13 @@ class PipelineRegistry:
         self._load()
 
     def dispatch(
-        self, input_keys: List[str], clump: bool = False, multidispatch: bool = False
+        self,
+        input_keys: List[str],
+        clump: bool = False,
+        multidispatch: bool = False,
+        metrics: Optional[RunMetrics] = None,
+        metrics_file: Optional[Union[Path, str]] = None,
+        profile_memory: Optional[str] = None,
     ):
         """Instantiates and runs the appropriate Pipeline for the provided input files.
 
@@ -31,10 +38,20 @@ class PipelineRegistry:
                 multiple pipelines to process each input key. If True, any pipeline
                 whose regex pattern matches an input key will be used to process the
                 input key. Defaults to False.
+            metrics (RunMetrics, optional): Collects the stage timings of the run.
+                Defaults to a new collector.
+            metrics_file (Path | str, optional): If given, the stage timings, totalled
+                per pipeline and per input, are written here as JSON.
+            profile_memory (str, optional): Record the peak memory of each converter
+                call using this method, "rss" or "tracemalloc", and log the inputs
+                with the highest peaks at the end. Ignored if ``metrics`` is passed.
+                Off by default.
 
         Returns:
             bool: True if the Pipeline ran without error, False otherwise.
         """
+        if metrics is None:
+            metrics = RunMetrics(memory=profile_memory)
         successes = 0
         failures = 0
         skipped = 0
@@ -56,7 +73,8 @@ class PipelineRegistry:
                 skipped += 1
             else:
                 for config_file in config_files:
-                    pipeline = TimestreamPipeline.from_config(config_file)
+                    with metrics.stage("config", pipeline=config_file.parent.name):
+                        pipeline = TimestreamPipeline.from_config(config_file)
                     inputs = input_keys if clump else [input_key]
                     logger.debug(
                         "Running pipeline %s on input %s",
@@ -64,7 +82,7 @@ class PipelineRegistry:
                         inputs,
                     )
                     try:
-                        pipeline.run(inputs)
+                        pipeline.run(inputs, metrics=metrics)
                         successes += 1
                         if clump:
                             successes += 1
@@ -83,6 +101,10 @@ class PipelineRegistry:
             failures,
             skipped,
         )
+        metrics.report()
+        if metrics_file is not None:
+            metrics.write(metrics_file)
+            logger.info("Wrote stage metrics to %s", metrics_file)
         return successes, failures, skipped
 
     def _load(self, folder: Path = Path("pipelines")):
@@ -0,0 +1,151 @@
+"""Vectorized time normalization shared by the converters and the scripts.
+
+Every function works on whole columns at once; none of them loop over rows in Python.
+Naive datetimes are taken to be UTC unless stated otherwise.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Dict, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+_UNITS = ("s", "ms", "us", "ns")
+_UTC_OFFSET_REGEX = re.compile(r"(?P<sign>[+-])(?P<hours>\d{2}):(?P<minutes>\d{2})")
+
+ArrayLike = Union[pd.Series, pd.Index, np.ndarray, Sequence]
+
+
+def _check_unit(unit: str) -> str:
+    if unit not in _UNITS:
+        raise ValueError(f"Unsupported epoch unit '{unit}', expected one of {_UNITS}")
+    return unit
+
+
+def local_to_utc(
+    values: ArrayLike,
+    timezone: str,
+    ambiguous: Union[str, np.ndarray] = "infer",
+    nonexistent: str = "raise",
+) -> pd.Series:
+    """Converts naive local wall-clock times to UTC.
+
+    Args:
+        values: Naive datetimes, or strings `pd.to_datetime` can parse, in local time.
+        timezone (str): The local time zone, e.g. "US/Pacific".
+        ambiguous: How to resolve the repeated hour when clocks fall back. "infer"
+            (the default) uses the order of the values, so the first 01:00 is read as
+            daylight time and the second as standard time; "NaT" drops them, or pass
+            a boolean array (True for daylight time). See `Series.dt.tz_localize`.
+        nonexistent (str): How to handle the skipped hour when clocks spring
+            forward. Defaults to "raise", as `Series.dt.tz_localize` does, since such
+            times usually mean the data isn't in local time; pass "shift_forward",
+            "shift_backward" or "NaT" to accept them.
+
+    Returns:
+        pd.Series: Timezone-aware UTC datetimes.
+    """
+    times = pd.Series(pd.to_datetime(values))
+    localized = times.dt.tz_localize(
+        timezone, ambiguous=ambiguous, nonexistent=nonexistent
+    )
+    return localized.dt.tz_convert("UTC")
+
+
+def to_epoch(values: ArrayLike, unit: str = "s") -> np.ndarray:
+    """Converts datetimes to integer time since the epoch.
+
+    Timezone-aware values are converted to UTC first; naive values are taken to be
+    UTC. Values are floored to whole units.
+
+    Args:
+        values: datetime64 values, Timestamps or a datetime Series/Index.
+        unit (str): "s", "ms", "us" or "ns". Defaults to "s".
+
+    Returns:
+        np.ndarray: int64 epoch times, or a nullable Int64 array if any value is NaT.
+    """
+    _check_unit(unit)
+    if isinstance(values, np.ndarray) and np.issubdtype(values.dtype, np.datetime64):
+        times = values
+    else:
+        index = pd.DatetimeIndex(values)
+        if index.tz is not None:
+            index = index.tz_convert("UTC").tz_localize(None)
+        times = index.to_numpy()
+    # numpy floors when casting to a coarser unit
+    times = times.astype(f"datetime64[{unit}]")
+    epoch = times.view(np.int64)
+    missing = np.isnat(times)
+    if missing.any():
+        epoch = pd.array(epoch, dtype="Int64")
+        epoch[missing] = pd.NA
+    return epoch
+
+
+def datetime64_to_epoch_ms(values: ArrayLike) -> np.ndarray:
+    """Converts datetime64 values (e.g. a NetCDF time coordinate) to epoch ms."""
+    return to_epoch(values, unit="ms")
+
+
+def iso_to_epoch(values: ArrayLike, unit: str = "s") -> np.ndarray:
+    """Parses ISO 8601 strings into integer time since the epoch.
+
+    Strings with a UTC offset (e.g. "2020-01-01 00:00:00-08:00") are converted using
+    it, so mixed offsets are fine. Strings without an offset are taken to be UTC.
+
+    Args:
+        values: ISO 8601 strings.
+        unit (str): "s", "ms", "us" or "ns". Defaults to "s".
+
+    Returns:
+        np.ndarray: int64 epoch times.
+    """
+    strings = pd.Series(np.asarray(values, dtype=object))
+    # Fast path for the common "...+HH:MM" form: the naive part is parsed by the C
+    # ISO parser and the offsets, of which there are usually only one or two, are
+    # parsed once each and subtracted.
+    suffixes = strings.str.slice(-6)
+    codes, uniques = pd.factorize(suffixes)
+    if len(uniques) and codes.min() >= 0:
+        matches = [_UTC_OFFSET_REGEX.fullmatch(str(suffix)) for suffix in uniques]
+        if all(matches):
+            offsets = np.array(
+                [
+                    (1 if m["sign"] == "+" else -1)
+                    * (int(m["hours"]) * 3600 + int(m["minutes"]) * 60)
+                    for m in matches
+                ],
+                dtype=np.int64,
+            )
+            naive = pd.to_datetime(strings.str.slice(0, -6), format="ISO8601")
+            per_second = pd.Timedelta(1, unit="s") // pd.Timedelta(1, unit=unit)
+            return to_epoch(naive, unit=unit) - offsets[codes] * per_second
+    return to_epoch(pd.to_datetime(strings, utc=True, format="ISO8601"), unit=unit)
+
+
+def components_to_epoch(
+    df: pd.DataFrame,
+    columns: Optional[Dict[str, str]] = None,
+    unit: str = "ms",
+) -> np.ndarray:
+    """Combines date/time component columns into integer time since the epoch.
+
+    Args:
+        df (pd.DataFrame): Holds the component columns, taken to be UTC.
+        columns (dict, optional): Maps the `pd.to_datetime` component names (year,
+            month, day, hour, minute, second, ms, ...) to column names in ``df``.
+            Defaults to year, month, day, hour and minute columns of the same names.
+        unit (str): "s", "ms", "us" or "ns". Defaults to "ms".
+
+    Returns:
+        np.ndarray: int64 epoch times.
+    """
+    if columns is None:
+        columns = {name: name for name in ("year", "month", "day", "hour", "minute")}
+    components = pd.DataFrame(
+        {component: df[column] for component, column in columns.items()}
+    )
+    return to_epoch(pd.to_datetime(components), unit=unit)
@@ -1,11 +1,15 @@
 from __future__ import annotations
 
 import datetime
+import json
+import logging
 from functools import lru_cache
 
 import os
 import re
 import tempfile
+from collections import defaultdict
+from contextlib import contextmanager
 from pathlib import Path
 import time
 from typing import (
@@ -18,12 +22,22 @@ from typing import (
     Tuple,
     Union,
     Callable,
+    Iterator,
     Mapping,
     Match,
 )
 
 import yaml
 import boto3
+from botocore.exceptions import ClientError
+
+from .metrics import RunMetrics, StageMetrics, StageTimer
+
+logger = logging.getLogger(__name__)
+
+# Each job folder's manifest, under the pipeline's manifest_root
+MANIFEST_NAME = "manifest.json"
+MANIFEST_WRITE_ATTEMPTS = 10
 
 
 def read_yaml(filepath: Path) -> Dict[Any, Any]:
@@ -187,6 +201,173 @@ class Template:
         return resolved
 
 
+TIME_COLUMN = "time"
+MEASURE_NAME = "data"
+MEASURE_VALUE_TYPES = ("DOUBLE", "BIGINT", "BOOLEAN", "VARCHAR", "TIMESTAMP")
+
+
+def parse_variables(entries: List[Union[str, Dict[str, str]]]) -> Dict[str, str]:
+    """Parses the `inputs.variables` section of a pipeline config.
+
+    Each entry is either a variable name, which is loaded as a DOUBLE measure, or a
+    single-item mapping of the variable name to its Timestream measure value type.
+
+    Examples:
+
+        ```yaml
+        variables:
+          - time
+          - wind_speed: DOUBLE
+          - qc_wind_speed: BIGINT
+        ```
+
+    Args:
+        entries (List[Union[str, Dict[str, str]]]): The raw `variables` entries.
+
+    Raises:
+        ValueError: If an entry is malformed or declares an unsupported type.
+
+    Returns:
+        Dict[str, str]: Variable name to measure value type, in config order.
+    """
+    variables: Dict[str, str] = {}
+    for entry in entries:
+        if isinstance(entry, str):
+            entry = {entry: "DOUBLE"}
+        if not isinstance(entry, dict) or len(entry) != 1:
+            raise ValueError(f"Invalid variable entry in pipeline config: {entry!r}")
+        (name, value_type), *_ = entry.items()
+        value_type = str(value_type).upper()
+        if value_type not in MEASURE_VALUE_TYPES:
+            raise ValueError(
+                f"Unsupported measure value type '{value_type}' for variable '{name}'."
+                f" Expected one of {MEASURE_VALUE_TYPES}"
+            )
+        variables[name] = value_type
+    return variables
+
+
+def build_data_model(
+    dimensions: List[str], measure_types: Mapping[str, str]
+) -> Dict[str, Any]:
+    """Builds the `DataModel` of a batch load task's `DataModelConfiguration`.
+
+    Every measure is mapped into a single multi-measure record named "data", so each
+    timestamp is loaded as one row regardless of how many variables a dataset has.
+    Column names use underscores in place of spaces to match the converted CSVs.
+
+    Args:
+        dimensions (List[str]): The columns to load as (VARCHAR) dimensions.
+        measure_types (Mapping[str, str]): Measure column name to measure value type.
+            The time column is skipped if present.
+
+    Returns:
+        Dict[str, Any]: The data model for `create_batch_load_task`.
+    """
+
+    def _column(name: str) -> str:
+        return name.replace(" ", "_")
+
+    return {
+        "TimeColumn": TIME_COLUMN,
+        "TimeUnit": "MILLISECONDS",
+        "DimensionMappings": [
+            {"SourceColumn": _column(name), "DestinationColumn": _column(name)}
+            for name in dimensions
+        ],
+        "MultiMeasureMappings": {
+            "TargetMultiMeasureName": MEASURE_NAME,
+            "MultiMeasureAttributeMappings": [
+                {
+                    "SourceColumn": _column(name),
+                    "TargetMultiMeasureAttributeName": _column(name),
+                    "MeasureValueType": value_type,
+                }
+                for name, value_type in measure_types.items()
+                if name != TIME_COLUMN
+            ],
+        },
+    }
+
+
+def data_model_from_metadata(metadata: Mapping[str, str]) -> Optional[Dict[str, Any]]:
+    """Rebuilds a data model from the S3 object metadata written by the pipeline.
+
+    Args:
+        metadata (Mapping[str, str]): The user metadata of a staged S3 object.
+
+    Returns:
+        Optional[Dict[str, Any]]: The data model, or None if the object was staged
+            without one.
+    """
+    if "data-model" not in metadata:
+        return None
+    model = json.loads(metadata["data-model"])
+    return build_data_model(model["dimensions"], model["measures"])
+
+
+_JOB_PREFIX_REGEX = r"[^/]+/[^/]+/\d{8}\.\d{6}/([^/]+)/([^/]+)/"
+
+
+def timestream_target(job_prefix: str) -> Optional[Tuple[str, str]]:
+    """Returns the Timestream database and table a staged job folder is loaded into.
+
+    Job folders look like `timestream/jobs/{date}.{time}/{project}/{dataset}/`. The
+    project is the database and the table is `{project}_{dataset}` with dots replaced
+    by underscores.
+
+    Args:
+        job_prefix (str): The S3 key prefix of the job folder.
+
+    Returns:
+        Optional[Tuple[str, str]]: The database and table names, or None if the prefix
+            is not a job folder.
+    """
+    match = re.match(_JOB_PREFIX_REGEX, job_prefix)
+    if not match:
+        return None
+    database_name, dataset = match.groups()
+    return database_name, f"{database_name}_{dataset.replace('.', '_')}"
+
+
+def count_rows(filepath: Path, chunk_size: int = 1 << 20) -> int:
+    """Counts the data rows (lines after the header) in a CSV file.
+
+    Only used for outputs whose converter didn't report the rows it wrote.
+    """
+    lines = 0
+    last = b"\n"
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            lines += chunk.count(b"\n")
+            last = chunk[-1:]
+    if last != b"\n":
+        lines += 1
+    return max(lines - 1, 0)
+
+
+def _recording(timer: StageTimer, stages: List[StageMetrics]) -> StageTimer:
+    """Wraps a converter's stage timer to keep the stages it times, so the counts
+    the converter reports can be reused."""
+
+    @contextmanager
+    def stage(name: str, **counts: Optional[int]) -> Iterator[StageMetrics]:
+        with timer(name, **counts) as metrics:
+            stages.append(metrics)
+            yield metrics
+
+    return stage
+
+
+def _written_rows(stages: List[StageMetrics]) -> Optional[int]:
+    """Returns the rows of a converter call's single write stage, if it reported
+    them."""
+    writes = [metrics for metrics in stages if metrics.stage == "write"]
+    if len(writes) != 1:
+        return None
+    return writes[0].rows
+
+
 class Converter(Protocol):
     def __call__(
         self,
@@ -206,12 +387,20 @@ class TimestreamPipeline:
         variables: List[str],
         bucket_name: str,
         storage_root: Template,
+        measure_types: Optional[Dict[str, str]] = None,
+        dimensions: Optional[List[str]] = None,
+        manifest_root: Optional[Template] = None,
+        name: Optional[str] = None,
     ) -> None:
         self.triggers = triggers
         self.converter = converter
         self.variables = variables
         self.bucket_name = bucket_name
         self.storage_root = storage_root
+        self.measure_types = measure_types or {name: "DOUBLE" for name in variables}
+        self.dimensions = dimensions or ["location"]
+        self.manifest_root = manifest_root
+        self.name = name or self.__repr_name__()
 
         self.bucket_region = "us-west-2"
 
@@ -252,6 +441,18 @@ class TimestreamPipeline:
         s3 = self._session.resource("s3", region_name=self.bucket_region)  # type: ignore
         return s3.Bucket(name=self.bucket_name)
 
+    @property
+    def data_model(self) -> Dict[str, Any]:
+        return build_data_model(self.dimensions, self.measure_types)
+
+    @property
+    def _upload_metadata(self) -> Dict[str, str]:
+        # Carried on each staged object so create_batch can build the batch load task's
+        # data model without needing access to the pipeline configs.
+        measures = {k: v for k, v in self.measure_types.items() if k != TIME_COLUMN}
+        model = dict(dimensions=self.dimensions, measures=measures)
+        return {"data-model": json.dumps(model, separators=(",", ":"))}
+
     @classmethod
     def from_config(cls, config_file: Path):
         config = read_yaml(config_file)
@@ -260,49 +461,179 @@ class TimestreamPipeline:
         inputs = config.get("inputs", {})
         outputs = config.get("outputs", {})
         converter = inputs.get("converter", "")
-        variables = inputs.get("variables", [])
+        measure_types = parse_variables(inputs.get("variables", []))
+        dimensions = outputs.get("dimensions", ["location"])
         bucket_name = outputs.get("bucket_name", os.getenv("TSDAT_S3_BUCKET_NAME", ""))
         storage_root = Template(outputs.get("storage_root", ""))
+        manifest_root = outputs.get("manifest_root")
+        if manifest_root is not None:
+            manifest_root = Template(manifest_root)
 
         converter = import_string(converter)
 
         return cls(
             triggers=triggers,
             converter=converter,
-            variables=variables,
+            variables=list(measure_types),
             bucket_name=bucket_name,
             storage_root=storage_root,
+            measure_types=measure_types,
+            dimensions=dimensions,
+            manifest_root=manifest_root,
+            name=Path(config_file).parent.name,
         )
 
-    def run(self, inputs: List[str]) -> None:
+    def run(self, inputs: List[str], metrics: Optional[RunMetrics] = None) -> None:
+        """Converts the inputs, uploads the results and writes the job manifests.
+
+        Args:
+            inputs (List[str]): Paths of the files to process.
+            metrics (RunMetrics, optional): Collects the converter and upload stage
+                timings, and the converters' peak memory if it profiles memory.
+                Defaults to a collector local to this run.
+        """
+        if metrics is None:
+            metrics = RunMetrics()
         date = datetime.date.today()
         time = datetime.datetime.now()
+        manifest_roots: Dict[Path, str] = {}
+        sources: Dict[Path, str] = {}
+        written_rows: Dict[Path, int] = {}
         with tempfile.TemporaryDirectory() as tmp_dir:
             for input_filepath in inputs:
+                mapping = dict(
+                    date=date.strftime("%Y%m%d"),
+                    time=time.strftime("%H0000"),
+                    dataset=Path(input_filepath).parts[4],
+                )
                 storage_root = Path(tmp_dir) / Path(
-                    self.storage_root.substitute(
-                        date=date.strftime("%Y%m%d"),
-                        time=time.strftime("%H0000"),
-                        dataset=Path(input_filepath).parts[4],
-                    )
+                    self.storage_root.substitute(mapping)
                 )
+                if self.manifest_root is not None:
+                    manifest_roots[storage_root] = self.manifest_root.substitute(
+                        mapping
+                    )
                 storage_root.mkdir(parents=True, exist_ok=True)
                 location = Path(input_filepath).name.split(".")[0]
-                self.converter(
-                    filepath=input_filepath,
-                    variables=self.variables,
-                    location=location,
-                    directory=storage_root,
-                )
-
+                stages: List[StageMetrics] = []
+                with metrics.memory(self.name, input_filepath):
+                    outputs = self.converter(
+                        filepath=input_filepath,
+                        variables=self.variables,
+                        location=location,
+                        directory=storage_root,
+                        timer=_recording(
+                            metrics.timer(self.name, input_filepath), stages
+                        ),
+                    )
+                if not isinstance(outputs, tuple):
+                    outputs = (outputs,)
+                for output in outputs:
+                    sources[Path(output).resolve()] = input_filepath
+                # the write stage's rows can't be split between several outputs
+                rows = _written_rows(stages)
+                if len(outputs) == 1 and rows is not None:
+                    written_rows[Path(outputs[0]).resolve()] = rows
+
+            staged: Dict[Path, List[Dict[str, Any]]] = defaultdict(list)
             for filepath in Path(tmp_dir).glob("**/*"):
                 if filepath.is_dir():
                     continue
                 s3_filepath = filepath.relative_to(tmp_dir).as_posix()
-                self._bucket.upload_file(Filename=filepath.as_posix(), Key=s3_filepath)
-                # logger.info(
-                #     "Saved %s data file to s3://%s/%s",
-                #     datastream,
-                #     self.parameters.bucket,
-                #     s3_filepath,
-                # )
+                size = filepath.stat().st_size
+                rows = written_rows.get(filepath.resolve())
+                if rows is None:
+                    rows = count_rows(filepath)
+                with metrics.stage(
+                    "upload",
+                    pipeline=self.name,
+                    input=sources.get(filepath.resolve()),
+                    rows=rows,
+                    bytes=size,
+                ):
+                    self._bucket.upload_file(
+                        Filename=filepath.as_posix(),
+                        Key=s3_filepath,
+                        ExtraArgs={"Metadata": self._upload_metadata},
+                    )
+                staged[filepath.parent].append(
+                    dict(key=s3_filepath, size=size, rows=rows)
+                )
+                logger.info(
+                    "Saved %s rows to s3://%s/%s", rows, self.bucket_name, s3_filepath
+                )
+
+            # Manifests are written last so their presence implies the data is staged
+            for job_dir, objects in staged.items():
+                if job_dir in manifest_roots:
+                    with metrics.stage("manifest", pipeline=self.name):
+                        self._write_manifest(
+                            job_prefix=job_dir.relative_to(tmp_dir).as_posix() + "/",
+                            manifest_root=manifest_roots[job_dir],
+                            objects=objects,
+                        )
+
+    def _write_manifest(
+        self, job_prefix: str, manifest_root: str, objects: List[Dict[str, Any]]
+    ) -> str:
+        """Merges the objects this run staged in a job folder into its manifest.
+
+        Each job folder has a single manifest at ``{manifest_root}/manifest.json``, so
+        create_batch reads one object per job. Runs staging into the same folder
+        concurrently merge with conditional writes: a write based on a manifest that
+        changed in the meantime fails and is retried on the new one.
+
+        Args:
+            job_prefix (str): The S3 prefix of the job folder.
+            manifest_root (str): The S3 prefix under which to write the manifest.
+            objects (List[Dict[str, Any]]): The staged objects' keys, sizes, and rows.
+
+        Returns:
+            str: The S3 key of the manifest.
+        """
+        database_name, table_name = timestream_target(job_prefix) or (None, None)
+        key = f"{manifest_root.rstrip('/')}/{MANIFEST_NAME}"
+        client = self._bucket.meta.client
+        for _ in range(MANIFEST_WRITE_ATTEMPTS):
+            now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+            try:
+                response = client.get_object(Bucket=self.bucket_name, Key=key)
+            except ClientError as e:
+                if e.response["Error"]["Code"] not in ("NoSuchKey", "404"):
+                    raise
+                previous: Dict[str, Any] = dict(created=now, objects=[])
+                condition = dict(IfNoneMatch="*")
+            else:
+                previous = json.loads(response["Body"].read())
+                condition = dict(IfMatch=response["ETag"])
+            # re-staging an input overwrites its object, so keep each key once
+            merged = {obj["key"]: obj for obj in previous["objects"] + objects}
+            manifest = dict(
+                version=1,
+                created=previous["created"],
+                updated=now,
+                prefix=job_prefix,
+                database=database_name,
+                table=table_name,
+                data_model=self.data_model,
+                objects=list(merged.values()),
+            )
+            try:
+                client.put_object(
+                    Bucket=self.bucket_name,
+                    Key=key,
+                    Body=json.dumps(manifest).encode("utf-8"),
+                    ContentType="application/json",
+                    **condition,
+                )
+            except ClientError as e:
+                code = e.response["Error"]["Code"]
+                if code not in ("PreconditionFailed", "ConditionalRequestConflict"):
+                    raise
+                logger.info("Manifest %s changed while merging; retrying", key)
+                continue
+            return key
+        raise RuntimeError(
+            f"Could not merge into manifest {key} after {MANIFEST_WRITE_ATTEMPTS} "
+            "attempts"
+        )